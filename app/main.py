@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import json
 import tempfile
 import os
 import sys
@@ -9,24 +8,29 @@ import traceback
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.validation import validar_csv_completo, carregar_csv, gerar_relatorio_divergencias
-from src.ai_handler import gerar_script_correcao
-from src.db_handler import calcular_hash_estrutura, buscar_script_por_hash, salvar_script, registrar_log, ingestar_transacoes
-from src.db_handler import conexao_banco
+from src.validation import validar_csv_completo, carregar_csv, gerar_relatorio_divergencias, dtypes_template
+from src.dialeto import detectar_dialeto
+from src.template import TEMPLATE_PATH, carregar_template
+from src.normalizacao import normalizar_dataframe
+from src.contexto_prompt import montar_contexto_prompt
+from src.arquivos import gravar_com_hash
+from src.cache_memoria import CacheLimitadoPorBytes
+from src.ai_handler import ErroLLM, gerar_script_correcao
+from src.db_handler import calcular_fingerprint_estrutura, calcular_hash_legado, buscar_script_por_hash, salvar_script, registrar_log, registrar_uso_script
+from src.rastreamento import etapa, rastrear
+from src.executor import detectar_contrato
+from src.sandbox import executar_isolado
+from src.db_handler import carregar_metricas, buscar_arquivo_ingerido, ingestar_idempotente
 
 st.set_page_config(page_title="Validador Financeiro AI", layout="wide")
 
-def carregar_metricas():
-    conn = conexao_banco()
-    total_processado = conn.execute("SELECT SUM(registros_sucesso) FROM log_ingestao").fetchone()[0] or 0
-    total_arquivos = conn.execute("SELECT COUNT(*) FROM log_ingestao").fetchone()[0] or 0
-    scripts_cache = conn.execute("SELECT COUNT(*) FROM scripts_transformacao").fetchone()[0] or 0
-    uso_ia = conn.execute("SELECT COUNT(*) FROM log_ingestao WHERE usou_ia = 1").fetchone()[0] or 0
-    uso_cache = conn.execute("SELECT COUNT(*) FROM log_ingestao WHERE usou_ia = 0").fetchone()[0] or 0
-    conn.close()
-    return total_processado, total_arquivos, scripts_cache, uso_ia, uso_cache
 
-total_proc, total_arq, total_scripts, ia_runs, cache_runs = carregar_metricas()
+@st.cache_data(ttl=10)
+def metricas_sidebar():
+    return carregar_metricas()
+
+
+total_proc, total_arq, total_scripts, ia_runs, cache_runs = metricas_sidebar()
 
 with st.sidebar:
     st.header("Métricas do Pipeline")
@@ -51,52 +55,171 @@ if "fonte_script" not in st.session_state:
     st.session_state["fonte_script"] = ""
 
 try:
-    with open("database/template.json", "r", encoding="utf-8") as f:
-        template = json.load(f)
+    template = carregar_template()
 except FileNotFoundError:
     st.error("Template não encontrado.")
     st.stop()
 
+PASTA_UPLOADS = os.path.join(tempfile.gettempdir(), "pipeline_uploads")
+
+
+def arquivo_do_upload(uploaded_file):
+    # Um arquivo por conteudo, com o sha256 calculado durante a gravacao; reruns do mesmo upload nao regravam.
+    atual = st.session_state.get("arquivo_upload")
+    if atual and st.session_state.get("upload_id") == uploaded_file.file_id and os.path.exists(atual):
+        return atual, st.session_state["hash_upload"]
+    uploaded_file.seek(0)
+    caminho, hash_conteudo = gravar_com_hash(uploaded_file, PASTA_UPLOADS)
+    descartar_upload_anterior(manter=caminho)
+    st.session_state["upload_id"] = uploaded_file.file_id
+    st.session_state["hash_upload"] = hash_conteudo
+    return caminho, hash_conteudo
+
+
+def descartar_upload_anterior(manter=None):
+    anterior = st.session_state.get("arquivo_upload")
+    if anterior and anterior != manter and os.path.exists(anterior):
+        os.remove(anterior)
+    st.session_state["arquivo_upload"] = manter
+
+
+LIMITE_CACHE_ANALISES_MB = int(os.getenv("PIPELINE_CACHE_ANALISES_MB", 512))
+
+
+def analisar_upload(caminho, versao_template):
+    # Chave = caminho (hash do conteudo) + versao do template: reruns nao releem nem revalidam.
+    # O cache e da sessao e limitado em bytes; os frames voltam por referencia, sem pickle a cada rerun.
+    cache = st.session_state.setdefault("cache_analises", CacheLimitadoPorBytes(LIMITE_CACHE_ANALISES_MB * 1024 * 1024))
+    chave = (caminho, versao_template)
+    analise = cache.obter(chave)
+    if analise is None:
+        with st.spinner("Analisando arquivo..."):
+            analise = cache.guardar(chave, _analisar_arquivo(caminho))
+    return analise
+
+
+def _analisar_arquivo(caminho):
+    template = carregar_template()
+    with rastrear(os.path.basename(caminho)) as rastreador:
+        with etapa("deteccao_dialeto"):
+            dialeto = detectar_dialeto(caminho)
+        df_raw = carregar_csv(caminho, dtype=dtypes_template(template), dialeto=dialeto)
+        with etapa("validacao", linhas=len(df_raw)):
+            resultado = validar_csv_completo(df_raw, template)
+        analise = {
+            "dialeto": dialeto,
+            "df_raw": df_raw,
+            "resultado": resultado,
+            "erros_texto": gerar_relatorio_divergencias(resultado),
+        }
+        if not resultado["valido"]:
+            with etapa("normalizacao", linhas=len(df_raw)):
+                df_normalizado, correcoes = normalizar_dataframe(df_raw, template)
+                resultado_normalizado = validar_csv_completo(df_normalizado, template)
+            analise.update(df_normalizado=df_normalizado, correcoes=correcoes, resultado_normalizado=resultado_normalizado)
+        # Scripts (IA ou cache) recebem o frame ja normalizado: a chave do cache e calculada sobre ele.
+        analise["file_hash"] = calcular_fingerprint_estrutura(analise.get("df_normalizado", df_raw), template, dialeto)
+        analise["hash_legado"] = calcular_hash_legado(df_raw)
+    analise["etapas"] = rastreador.etapas
+    return analise
+
+
+def ingestar_com_log(
+    df, template, nome, hash_conteudo, etapas_previas=(), usou_ia=False, script_id=None, duracao=None, metricas_script=None
+):
+    # Junta as etapas da analise (e da IA/script, se houver) com a ingestao num unico registro de log.
+    with rastrear(nome) as rastreador:
+        for etapas in etapas_previas:
+            rastreador.anexar(etapas)
+        with etapa("ingestao", linhas=len(df)) as span:
+            resumo = ingestar_idempotente(df, template, hash_conteudo, nome)
+    if resumo["ja_ingerido"]:
+        return resumo
+    metricas_script = metricas_script or {}
+    registrar_log(
+        nome, resumo["total"], resumo["sucesso"], resumo["erro"], usou_ia, script_id,
+        duracao if duracao is not None else span["duracao_segundos"],
+        metricas_script.get("cpu_segundos"), metricas_script.get("pico_memoria_mb"), rastreador.etapas,
+        hash_conteudo,
+    )
+    metricas_sidebar.clear()
+    return resumo
+
+
 uploaded_file = st.file_uploader("Arraste seu CSV", type=["csv"])
 
-if uploaded_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-        tmp.write(uploaded_file.getbuffer())
-        input_path = tmp.name
+if not uploaded_file:
+    descartar_upload_anterior()
+else:
+    input_path, hash_conteudo = arquivo_do_upload(uploaded_file)
+    ja_ingerido = buscar_arquivo_ingerido(hash_conteudo)
+    if ja_ingerido and ja_ingerido["status"] == "concluido":
+        st.success(
+            f"Este arquivo já foi ingerido em {ja_ingerido['ingerido_em']} (log #{ja_ingerido['log_id']}): "
+            f"{ja_ingerido['registros_sucesso']} transações salvas, {ja_ingerido['registros_erro']} com erro."
+        )
+        st.stop()
+    if ja_ingerido and ja_ingerido["linhas_concluidas"]:
+        st.info(f"Ingestão anterior interrompida: a próxima retoma da linha {ja_ingerido['linhas_concluidas']}.")
 
     col1, col2 = st.columns(2)
     try:
-        df_raw, encoding = carregar_csv(input_path)
-        file_hash = calcular_hash_estrutura(df_raw)
+        analise = analisar_upload(input_path, os.stat(TEMPLATE_PATH).st_mtime_ns)
+        dialeto, df_raw, file_hash = analise["dialeto"], analise["df_raw"], analise["file_hash"]
         with col1:
             st.subheader("Arquivo Original")
             st.dataframe(df_raw.head())
-            st.info(f"Encoding: {encoding} | Linhas: {len(df_raw)} | Hash: {file_hash[:8]}...")
+            st.info(
+                f"Encoding: {dialeto.encoding} | Delimitador: {dialeto.delimitador!r} | Leitor: {df_raw.attrs['backend_leitura']} | "
+                f"Linhas: {len(df_raw)} | Hash: {file_hash[:8]}..."
+            )
     except Exception as e:
         st.error(f"Erro ao ler arquivo: {e}")
         st.stop()
 
-    resultado = validar_csv_completo(input_path, template)
+    resultado = analise["resultado"]
     with col2:
         st.subheader("Diagnóstico")
         if resultado["valido"]:
             st.success("Arquivo Perfeito! Pronto para ingestão.")
             if st.button("💾 Ingestar no Banco de Dados"):
                 try:
-                    ingestar_transacoes(df_raw)
-                    st.success(f"Sucesso! {len(df_raw)} transações salvas no banco.")
+                    resumo = ingestar_com_log(df_raw, template, uploaded_file.name, hash_conteudo, [analise["etapas"]])
+                    st.success(f"Sucesso! {resumo['sucesso']} transações salvas no banco.")
+                    if resumo["quarentena"]:
+                        st.warning(f"{resumo['quarentena']} linhas enviadas para quarentena: {resumo['motivos']}")
                     st.balloons()
                 except Exception as e:
                     st.error(f"Erro ao salvar no banco: {e}")
             st.session_state["script_atual"] = ""
         else:
             st.error(f"{resultado['total_erros']} problemas detectados.")
-            erros_texto = gerar_relatorio_divergencias(input_path, template)
+            erros_texto = analise["erros_texto"]
             with st.expander("Ver detalhes dos erros"):
                 st.text(erros_texto)
 
+            df_normalizado, correcoes = analise["df_normalizado"], analise["correcoes"]
+            resultado_normalizado = analise["resultado_normalizado"]
+            if resultado_normalizado["valido"]:
+                st.success("Normalizador do template corrigiu o arquivo, sem precisar da IA.")
+                with st.expander("Ver correções aplicadas"):
+                    st.json(correcoes)
+                st.dataframe(df_normalizado.head())
+                if st.button("💾 Ingestar arquivo normalizado"):
+                    try:
+                        resumo = ingestar_com_log(df_normalizado, template, uploaded_file.name, hash_conteudo, [analise["etapas"]])
+                        st.success(f"Sucesso! {resumo['sucesso']} transações salvas no banco.")
+                        if resumo["quarentena"]:
+                            st.warning(f"{resumo['quarentena']} linhas enviadas para quarentena: {resumo['motivos']}")
+                        st.balloons()
+                    except Exception as e:
+                        st.error(f"Erro ao salvar no banco: {e}")
+                st.session_state["script_atual"] = ""
+                st.stop()
+
             st.subheader("Motor de Correção")
-            script_db = buscar_script_por_hash(file_hash)
+            st.caption(f"Erros que o normalizador não resolveu: {gerar_relatorio_divergencias(resultado_normalizado)}")
+            script_db = buscar_script_por_hash(file_hash, analise["hash_legado"])
             if script_db:
                 if st.session_state["script_atual"] == "" or st.session_state["fonte_script"] != "cache":
                      st.session_state["script_atual"] = script_db["script_python"]
@@ -106,15 +229,19 @@ if uploaded_file:
                 st.warning("Estrutura desconhecida. Acionando IA...")
                 if st.button("Gerar Script de Correção"):
                     with st.spinner("A IA está trabalhando..."):
-                        with open(input_path, "r", encoding=encoding) as f:
-                            amostra = "".join(f.readlines()[:5])
-                        novo_script = gerar_script_correcao(erros_texto, amostra, template)
-                        if novo_script:
-                            st.session_state["script_atual"] = novo_script
-                            st.session_state["fonte_script"] = "ia"
-                            st.rerun()
-                        else:
-                            st.error("Falha ao gerar script.")
+                        resumo_erros, amostra = montar_contexto_prompt(
+                            df_normalizado, template, resultado_normalizado, dialeto
+                        )
+                        try:
+                            with rastrear(uploaded_file.name) as rastreador_ia:
+                                novo_script = gerar_script_correcao(resumo_erros, amostra, template, fingerprint=file_hash)
+                            st.session_state["etapas_ia"] = rastreador_ia.etapas
+                        except ErroLLM as e:
+                            st.error(f"Falha ao gerar script: {e}")
+                            st.stop()
+                        st.session_state["script_atual"] = novo_script
+                        st.session_state["fonte_script"] = "ia"
+                        st.rerun()
 
             if st.session_state["script_atual"]:
                 st.markdown("### Editor de Script")
@@ -127,37 +254,45 @@ if uploaded_file:
                 st.session_state["script_atual"] = script_editado
 
                 if st.button("Executar e Validar Correção"):
-                    output_path = input_path.replace(".csv", "_fixed.csv")
                     try:
                         start_time = time.time()
-                        local_scope = {}
-                        exec(script_editado, local_scope)
-                        if "processar_csv" not in local_scope:
-                            st.error("ERRO: A IA não criou a função 'processar_csv'. Gere novamente.")
+                        if detectar_contrato(script_editado) is None:
+                            st.error("ERRO: A IA não criou a função 'transformar' (ou 'processar_csv'). Gere novamente.")
                             st.stop()
-                        processar_csv = local_scope["processar_csv"]
-                        processar_csv(input_path, output_path)
-                        duration = time.time() - start_time
+                        with rastrear(uploaded_file.name) as rastreador_script:
+                            with etapa("transformacao", linhas=len(df_normalizado)):
+                                df_fixed, metricas_script = executar_isolado(script_editado, df_normalizado, input_path)
+                            duration = time.time() - start_time
+                            with etapa("revalidacao", linhas=len(df_fixed)):
+                                novo_resultado = validar_csv_completo(df_fixed, template)
                         st.markdown("---")
                         st.subheader("Resultado da Correção")
-                        if not os.path.exists(output_path):
-                            st.error("O script rodou mas não criou o arquivo de saída.")
-                            st.stop()
-
-                        df_fixed, _ = carregar_csv(output_path)
                         st.dataframe(df_fixed.head())
-                        novo_resultado = validar_csv_completo(output_path, template)
+                        st.caption(
+                            f"CPU do script: {metricas_script['cpu_segundos']:.2f}s | "
+                            f"Pico de memória: {metricas_script['pico_memoria_mb'] or 0:.0f} MB"
+                        )
                         if novo_resultado["valido"]:
                             st.success(f"Validado em {duration:.2f}s. Salvando no banco...")
                             if st.session_state["fonte_script"] == "ia":
                                 salvar_script(file_hash, script_editado)
-                            registrar_log(uploaded_file.name, len(df_fixed), len(df_fixed), 0, st.session_state["fonte_script"]=="ia", 1, duration)
-                            ingestar_transacoes(df_fixed)
-                            st.toast("Dados salvos na tabela transacoes_financeiras!", icon="🏦")
+                            script_salvo = buscar_script_por_hash(file_hash, analise["hash_legado"])
+                            etapas_ia = st.session_state.get("etapas_ia", []) if st.session_state["fonte_script"] == "ia" else []
+                            resumo = ingestar_com_log(
+                                df_fixed, template, uploaded_file.name, hash_conteudo, [analise["etapas"], etapas_ia, rastreador_script.etapas],
+                                usou_ia=st.session_state["fonte_script"] == "ia",
+                                script_id=script_salvo["id"] if script_salvo else None,
+                                duracao=duration, metricas_script=metricas_script,
+                            )
+                            if st.session_state["fonte_script"] == "cache" and script_salvo:
+                                registrar_uso_script(script_salvo["id"])
+                            if resumo["quarentena"]:
+                                st.warning(f"{resumo['quarentena']} linhas enviadas para quarentena: {resumo['motivos']}")
+                            st.toast(f"{resumo['sucesso']} linhas salvas na tabela transacoes_financeiras!", icon="🏦")
                             st.balloons()
                         else:
                             st.warning(f"O script rodou, mas sobraram {novo_resultado['total_erros']} erros.")
-                            st.text(gerar_relatorio_divergencias(output_path, template))
+                            st.text(gerar_relatorio_divergencias(novo_resultado))
                     except Exception as e:
                         st.error(f"Erro fatal na execução: {str(e)}")
                         st.code(traceback.format_exc())
\ No newline at end of file
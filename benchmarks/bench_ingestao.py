@@ -0,0 +1,81 @@
+"""
+Compara a ingestao via DataFrame.to_sql com o carregador em lote (executemany).
+
+Execute com: python -m benchmarks.bench_ingestao --linhas 200000 --tamanho-lote 5000
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import db_handler
+
+
+def gerar_transacoes(linhas: int, seed: int = 42) -> pd.DataFrame:
+    rnd = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id_transacao": [f"TXN-{i:08d}" for i in range(linhas)],
+        "data_transacao": pd.to_datetime("2024-01-01") + pd.to_timedelta(rnd.integers(0, 365, linhas), unit="D"),
+        "valor": rnd.integers(1, 10_000_000, linhas) / 100,
+        "tipo": rnd.choice(["CREDITO", "DEBITO"], linhas),
+        "categoria": rnd.choice(["SALARIO", "ALIMENTACAO", "LAZER"], linhas),
+        "descricao": "Transacao de teste",
+        "conta_origem": "CC-1234",
+        "conta_destino": None,
+        "status": rnd.choice(["PENDENTE", "CONFIRMADO"], linhas),
+    })
+
+
+def _to_sql(df: pd.DataFrame) -> None:
+    # Caminho antigo: datas para date e de volta para str, e to_sql com o batching padrao do pandas.
+    df = df.copy()
+    df["data_transacao"] = pd.to_datetime(df["data_transacao"], errors="coerce").dt.date.astype(str)
+    db_handler.conexao_banco()
+    # Conexao nova com o isolation_level padrao, como o ingestar_transacoes original.
+    conn = sqlite3.connect(db_handler.DB_PATH)
+    df.to_sql("transacoes_financeiras", conn, if_exists="append", index=False)
+    conn.close()
+
+
+def medir(nome: str, funcao, df: pd.DataFrame, diretorio: Path) -> dict:
+    db_handler.configurar_banco(str(diretorio / f"{nome}.db"))
+    inicio = time.perf_counter()
+    funcao(df)
+    segundos = time.perf_counter() - inicio
+    db_handler.fechar_conexao()
+    return {
+        "caminho": nome,
+        "linhas": len(df),
+        "segundos": round(segundos, 4),
+        "linhas_por_segundo": round(len(df) / segundos),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--tamanho-lote", type=int, default=db_handler.TAMANHO_LOTE_PADRAO)
+    args = parser.parse_args(argv)
+
+    df = gerar_transacoes(args.linhas)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        resultados = [
+            medir("to_sql", _to_sql, df, Path(tmpdir)),
+            medir("executemany_ignorar",
+                  lambda d: db_handler.inserir_transacoes_em_lote(d, "ignorar", args.tamanho_lote), df, Path(tmpdir)),
+            medir("executemany_atualizar",
+                  lambda d: db_handler.inserir_transacoes_em_lote(d, "atualizar", args.tamanho_lote), df, Path(tmpdir)),
+        ]
+    json.dump(resultados, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
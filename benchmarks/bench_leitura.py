@@ -0,0 +1,53 @@
+"""
+Compara os backends de leitura de CSV (pyarrow, c, python).
+
+Gera arquivos sinteticos (benchmarks.geradores) com as classes do sample_data
+e mede o tempo de cada backend. Execute com: python -m benchmarks.bench_leitura --linhas 200000
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.geradores import CLASSES, gerar_csv
+from src.dialeto import Dialeto
+from src.leitura import backends_disponiveis, ler_csv
+
+def medir(caminho: Path, encoding: str, delimitador: str, backend: str) -> float:
+    inicio = time.perf_counter()
+    dialeto = Dialeto(encoding=encoding, delimitador=delimitador)
+    ler_csv(caminho, dialeto, dtype={"id_transacao": str}, backends=(backend,))
+    return time.perf_counter() - inicio
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--formatos", nargs="+", choices=list(CLASSES),
+                        default=["perfeito", "valor_br", "delimitador_pv", "encoding_latin1"])
+    args = parser.parse_args(argv)
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for formato in args.formatos:
+            caminho = Path(tmpdir) / f"{formato}.csv"
+            dialeto = gerar_csv(caminho, formato, args.linhas)
+            for backend in backends_disponiveis():
+                segundos = medir(caminho, dialeto["encoding"], dialeto["delimitador"], backend)
+                resultados.append({
+                    "formato": formato,
+                    "backend": backend,
+                    "linhas": args.linhas,
+                    "segundos": round(segundos, 4),
+                    "linhas_por_segundo": round(args.linhas / segundos),
+                })
+
+    json.dump(resultados, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Geradores sinteticos e deterministicos de CSV para cada classe de problema do sample_data.
+
+Cada classe combina "defeitos" (data BR, valor em R$, ';', latin-1, aliases,
+variantes de enum); o conteudo depende so de (classe, linhas, seed, tamanho_bloco), e o arquivo
+e escrito em blocos para gerar milhoes de linhas sem segurar tudo em memoria.
+"""
+from pathlib import Path
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+ALIASES = {
+    "id_transacao": "id", "data_transacao": "date", "valor": "amount", "tipo": "type",
+    "categoria": "category", "descricao": "description", "conta_origem": "source_account",
+    "conta_destino": "target_account", "status": "state",
+}
+TIPOS = ["CREDITO", "DEBITO"]
+CATEGORIAS = ["SALARIO", "ALIMENTACAO", "TRANSPORTE", "MORADIA", "SAUDE", "LAZER", "OUTROS"]
+STATUS = ["PENDENTE", "CONFIRMADO", "CANCELADO"]
+# Variantes que o mapeamento do template resolve.
+TIPOS_VARIANTES = ["C", "D", "credit", "debit", "entrada", "saida"]
+CATEGORIAS_VARIANTES = ["food", "transport", "housing", "health", "leisure", "other", "salary"]
+STATUS_VARIANTES = ["pending", "confirmed", "P", "C", "X"]
+
+DEFEITOS = ("data_br", "valor_br", "delimitador_pv", "encoding_latin1", "aliases", "enum_variantes")
+CLASSES: Dict[str, frozenset] = {
+    "perfeito": frozenset(),
+    **{defeito: frozenset({defeito}) for defeito in DEFEITOS},
+    "misto": frozenset(DEFEITOS),
+}
+TAMANHO_BLOCO = 200_000
+
+
+def _valores(centavos: np.ndarray, brasileiro: bool) -> pd.Series:
+    inteiro = pd.Series(centavos // 100).astype(str)
+    decimal = pd.Series(centavos % 100).astype(str).str.zfill(2)
+    if not brasileiro:
+        return inteiro + "." + decimal
+    milhar = inteiro.str.replace(r"\B(?=(\d{3})+(?!\d))", ".", regex=True)
+    return "R$ " + milhar + "," + decimal
+
+
+def gerar_bloco(inicio: int, linhas: int, classe: str, rng: np.random.Generator) -> pd.DataFrame:
+    defeitos = CLASSES[classe]
+    ids = pd.Series(np.arange(inicio, inicio + linhas)).astype(str).str.zfill(8)
+    datas = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 366, linhas), unit="D")
+    enum = "enum_variantes" in defeitos
+    df = pd.DataFrame({
+        "id_transacao": "TXN-" + ids,
+        "data_transacao": datas.strftime("%d/%m/%Y" if "data_br" in defeitos else "%Y-%m-%d"),
+        "valor": _valores(rng.integers(1, 100_000_000, linhas), "valor_br" in defeitos),
+        "tipo": rng.choice(TIPOS_VARIANTES if enum else TIPOS, linhas),
+        "categoria": rng.choice(CATEGORIAS_VARIANTES if enum else CATEGORIAS, linhas),
+        "descricao": rng.choice(["Transação de teste", "Pagamento João", "Café"], linhas),
+        "conta_origem": "CC-" + pd.Series(rng.integers(1000, 10000, linhas)).astype(str),
+        "conta_destino": np.where(rng.random(linhas) < 0.2, "CC-9999", ""),
+        "status": rng.choice(STATUS_VARIANTES if enum else STATUS, linhas),
+    })
+    if "aliases" in defeitos:
+        df = df.rename(columns=ALIASES)
+    return df
+
+
+def dialeto_classe(classe: str) -> dict:
+    defeitos = CLASSES[classe]
+    return {
+        "encoding": "latin-1" if "encoding_latin1" in defeitos else "utf-8",
+        # Valores em R$ tem virgula decimal: o arquivo BR usa ';', como os extratos reais.
+        "delimitador": ";" if defeitos & {"delimitador_pv", "valor_br"} else ",",
+    }
+
+
+def gerar_csv(
+    destino: Union[Path, str], classe: str, linhas: int, seed: int = 42, tamanho_bloco: int = TAMANHO_BLOCO
+) -> dict:
+    if classe not in CLASSES:
+        raise ValueError(f"Classe desconhecida: {classe}. Use {sorted(CLASSES)}.")
+    dialeto = dialeto_classe(classe)
+    rng = np.random.default_rng(seed)
+    with open(destino, "w", encoding=dialeto["encoding"], newline="") as f:
+        for inicio in range(0, linhas, tamanho_bloco):
+            gerar_bloco(inicio, min(tamanho_bloco, linhas - inicio), classe, rng).to_csv(
+                f, sep=dialeto["delimitador"], index=False, header=inicio == 0, lineterminator="\n"
+            )
+    return dialeto
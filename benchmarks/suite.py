@@ -0,0 +1,102 @@
+"""
+Suite de throughput do pipeline: leitura, validacao, transformacao e ingestao
+para cada classe de problema, em varios tamanhos.
+
+Emite JSON com linhas/segundo e pico de RSS por etapa, para comparar em review.
+Execute com: python -m benchmarks.suite --linhas 10000 1000000 10000000 --saida bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.geradores import CLASSES, gerar_csv
+from src import db_handler
+from src.leitura import PYARROW_DISPONIVEL
+from src.normalizacao import normalizar_dataframe
+from src.rastreamento import pico_memoria_mb, resetar_pico_memoria
+from src.template import carregar_template
+from src.validation import carregar_csv, dtypes_template, validar_csv_completo
+
+TAMANHOS_PADRAO = [10_000]
+
+
+def _medir(etapa: str, linhas: int, funcao):
+    resetar_pico_memoria()
+    inicio = time.perf_counter()
+    retorno = funcao()
+    segundos = time.perf_counter() - inicio
+    return retorno, {
+        "etapa": etapa,
+        "segundos": round(segundos, 4),
+        "linhas_por_segundo": round(linhas / segundos) if segundos else None,
+        "pico_memoria_mb": round(pico_memoria_mb() or 0, 1),
+    }
+
+
+def executar_classe(classe: str, linhas: int, diretorio: Path, template, seed: int) -> list:
+    caminho = diretorio / f"{classe}_{linhas}.csv"
+    gerar_csv(caminho, classe, linhas, seed)
+    medidas = []
+
+    df, medida = _medir("carregar_csv", linhas, lambda: carregar_csv(caminho, dtype=dtypes_template(template)))
+    medidas.append(medida)
+    _, medida = _medir("validar_csv_completo", linhas, lambda: validar_csv_completo(df, template))
+    medidas.append(medida)
+    (df_normalizado, _), medida = _medir("transformacao", linhas, lambda: normalizar_dataframe(df, template))
+    medidas.append(medida)
+
+    db_handler.configurar_banco(str(diretorio / f"{classe}_{linhas}.db"))
+    _, medida = _medir("ingestar_transacoes", linhas, lambda: db_handler.ingestar_transacoes(df_normalizado, "ignorar"))
+    medidas.append(medida)
+    db_handler.fechar_conexao()
+
+    caminho.unlink()
+    return [{"classe": classe, "linhas": linhas, **m} for m in medidas]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS_PADRAO)
+    parser.add_argument("--classes", nargs="+", default=list(CLASSES), choices=list(CLASSES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", help="Arquivo JSON de saida (padrao: stdout)")
+    args = parser.parse_args(argv)
+
+    template = carregar_template()
+    caminho_banco = db_handler.DB_PATH
+    resultados = []
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for linhas in args.linhas:
+                for classe in args.classes:
+                    print(f"{classe} ({linhas} linhas)...", file=sys.stderr)
+                    resultados.extend(executar_classe(classe, linhas, Path(tmpdir), template, args.seed))
+    finally:
+        db_handler.configurar_banco(caminho_banco)
+
+    relatorio = {
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "pyarrow": PYARROW_DISPONIVEL,
+            "plataforma": platform.platform(),
+        },
+        "seed": args.seed,
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2)
+    if args.saida:
+        Path(args.saida).write_text(texto, encoding="utf-8")
+    else:
+        print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,5 +38,105 @@ CREATE TABLE IF NOT EXISTS log_ingestao (
     usou_ia BOOLEAN DEFAULT FALSE,
     script_id INTEGER REFERENCES scripts_transformacao(id),
     duracao_segundos REAL,
+    cpu_segundos REAL,
+    pico_memoria_mb REAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS log_etapas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    log_id INTEGER NOT NULL REFERENCES log_ingestao(id),
+    ordem INTEGER NOT NULL,
+    pai INTEGER,
+    etapa TEXT NOT NULL,
+    inicio_segundos REAL,
+    duracao_segundos REAL,
+    linhas INTEGER,
+    rss_amostrado_mb REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_etapas_log ON log_etapas(log_id);
+
+CREATE TABLE IF NOT EXISTS transacoes_quarentena (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    arquivo_nome TEXT,
+    linha INTEGER,
+    motivo TEXT NOT NULL,
+    dados TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_quarentena_arquivo ON transacoes_quarentena(arquivo_nome);
+
+CREATE TABLE IF NOT EXISTS respostas_llm (
+    hash_prompt TEXT PRIMARY KEY,
+    provedor TEXT NOT NULL,
+    resposta TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Um registro por conteudo de arquivo (sha256): reenvios do mesmo export sao
+-- reconhecidos e ingestoes interrompidas retomam do ultimo checkpoint gravado.
+CREATE TABLE IF NOT EXISTS arquivos_ingeridos (
+    hash_conteudo TEXT PRIMARY KEY,
+    arquivo_nome TEXT,
+    status TEXT NOT NULL DEFAULT 'parcial' CHECK (status IN ('parcial', 'concluido')),
+    linhas_concluidas INTEGER NOT NULL DEFAULT 0,
+    -- Byte logo apos a ultima linha gravada (0 quando a ingestao nao e por arquivo).
+    offset_bytes INTEGER NOT NULL DEFAULT 0,
+    registros_sucesso INTEGER NOT NULL DEFAULT 0,
+    registros_erro INTEGER NOT NULL DEFAULT 0,
+    log_id INTEGER REFERENCES log_ingestao(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Contadores da barra lateral mantidos por triggers: uma leitura por chave primaria
+-- em vez de agregacoes sobre log_ingestao a cada renderizacao.
+CREATE TABLE IF NOT EXISTS metricas_pipeline (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_processado INTEGER NOT NULL DEFAULT 0,
+    total_arquivos INTEGER NOT NULL DEFAULT 0,
+    scripts_cache INTEGER NOT NULL DEFAULT 0,
+    uso_ia INTEGER NOT NULL DEFAULT 0,
+    uso_cache INTEGER NOT NULL DEFAULT 0
+);
+
+-- Bancos antigos: preenche a partir do historico na primeira aplicacao do schema.
+INSERT OR IGNORE INTO metricas_pipeline (id, total_processado, total_arquivos, scripts_cache, uso_ia, uso_cache)
+SELECT 1,
+    (SELECT COALESCE(SUM(registros_sucesso), 0) FROM log_ingestao),
+    (SELECT COUNT(*) FROM log_ingestao),
+    (SELECT COUNT(*) FROM scripts_transformacao),
+    (SELECT COUNT(*) FROM log_ingestao WHERE usou_ia = 1),
+    (SELECT COUNT(*) FROM log_ingestao WHERE usou_ia = 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_metricas_log_insert AFTER INSERT ON log_ingestao
+BEGIN
+    UPDATE metricas_pipeline SET
+        total_processado = total_processado + COALESCE(NEW.registros_sucesso, 0),
+        total_arquivos = total_arquivos + 1,
+        uso_ia = uso_ia + COALESCE(NEW.usou_ia = 1, 0),
+        uso_cache = uso_cache + COALESCE(NEW.usou_ia = 0, 0)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metricas_log_delete AFTER DELETE ON log_ingestao
+BEGIN
+    UPDATE metricas_pipeline SET
+        total_processado = total_processado - COALESCE(OLD.registros_sucesso, 0),
+        total_arquivos = total_arquivos - 1,
+        uso_ia = uso_ia - COALESCE(OLD.usou_ia = 1, 0),
+        uso_cache = uso_cache - COALESCE(OLD.usou_ia = 0, 0)
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metricas_script_insert AFTER INSERT ON scripts_transformacao
+BEGIN
+    UPDATE metricas_pipeline SET scripts_cache = scripts_cache + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metricas_script_delete AFTER DELETE ON scripts_transformacao
+BEGIN
+    UPDATE metricas_pipeline SET scripts_cache = scripts_cache - 1 WHERE id = 1;
+END;
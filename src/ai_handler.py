@@ -1,48 +1,311 @@
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import random
+import threading
+import time
 
-load_dotenv()
+from src.db_handler import buscar_resposta_llm, salvar_resposta_llm
+from src.rastreamento import etapa
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+REGRAS_CONTRATO = {
+    "transformar": """
+    OBJETIVO:
+    Gerar uma função Python chamada `transformar(df)` que recebe um pandas.DataFrame já carregado e pré-normalizado
+    pelo template (encoding e delimitador resolvidos; nomes de colunas, datas, valores e enums conhecidos já convertidos)
+    e RETORNA um novo DataFrame no formato padrão. Corrija apenas os problemas listados abaixo.
+    """,
+    "processar_csv": """
+    OBJETIVO:
+    Gerar uma função Python chamada `processar_csv(input_path, output_path)` que transforma um CSV sujo para o formato padrão.
+    """,
+}
 
-def gerar_script_correcao(erros_texto, amostra_csv, template):
+PASSOS_CONTRATO = {
+    "transformar": """
+    2. NÃO leia nem grave arquivos: trabalhe só sobre o DataFrame recebido e retorne o resultado com `return df`.
+    3. Renomeie as colunas para bater com o SCHEMA ALVO. Exemplo: se vier 'Date', renomeie para 'data_transacao'.
+    4. Trate datas: converta para YYYY-MM-DD. Se a data for inválida, transforme em NaT.
+    5. Trate valores numéricos (R$): remova 'R$', converta vírgula decimal para ponto. Transforme em float.
+    6. Use operações vetorizadas do pandas (nada de loops linha a linha).
+    """,
+    "processar_csv": """
+    2. Leia o CSV detectando o encoding correto (tente 'utf-8', se falhar 'latin-1') e o delimitador correto (',' ou ';').
+    3. Renomeie as colunas para bater com o SCHEMA ALVO. Exemplo: se vier 'Date', renomeie para 'data_transacao'.
+    4. Trate datas: converta para YYYY-MM-DD. Se a data for inválida, transforme em NaT.
+    5. Trate valores numéricos (R$): remova 'R$', converta vírgula decimal para ponto. Transforme em float.
+    6. Salve o arquivo final em `output_path` com encoding='utf-8' e index=False.
+    """,
+}
+
+MODELO_PADRAO = "gemini-1.5-flash"
+CONCORRENCIA_PADRAO = 4
+TEMPO_LIMITE_PADRAO = 60.0
+TENTATIVAS_PADRAO = 3
+ESPERA_BASE_PADRAO = 1.0
+
+
+class ErroLLM(RuntimeError):
+    pass
+
+
+def montar_prompt(erros_texto, amostra_csv, template, contrato="transformar"):
     colunas_alvo = ", ".join(template['colunas'].keys())
-    
-    prompt = f"""
+
+    return f"""
     Atue como um Engenheiro de Dados Sênior Especialista em Pandas.
-    
-    OBJETIVO:
-    Gerar uma função Python chamada `processar_csv(input_path, output_path)` que transforma um CSV sujo para o formato padrão.
-    
+    {REGRAS_CONTRATO[contrato]}
     O SCHEMA ALVO (Obrigatório) deve ter estas colunas exatas:
     [{colunas_alvo}]
-    
-    PROBLEMAS DETECTADOS NO ARQUIVO:
+
+    PROBLEMAS DETECTADOS NO ARQUIVO (JSON):
     {erros_texto}
-    
-    AMOSTRA DOS DADOS (Primeiras 5 linhas):
+
+    AMOSTRA DOS DADOS (uma linha representativa de cada tipo de erro):
     {amostra_csv}
-    
+
     REGRAS RÍGIDAS:
-    1. Importe pandas as pd.
-    2. Leia o CSV detectando o encoding correto (tente 'utf-8', se falhar 'latin-1') e o delimitador correto (',' ou ';').
-    3. Renomeie as colunas para bater com o SCHEMA ALVO. Exemplo: se vier 'Date', renomeie para 'data_transacao'.
-    4. Trate datas: converta para YYYY-MM-DD. Se a data for inválida, transforme em NaT.
-    5. Trate valores numéricos (R$): remova 'R$', converta vírgula decimal para ponto. Transforme em float.
-    6. Salve o arquivo final em `output_path` com encoding='utf-8' e index=False.
+    1. Importe pandas as pd.{PASSOS_CONTRATO[contrato]}
     7. NÃO use blocos de código markdown (```python). Retorne APENAS o código puro.
     8. A função deve ser robusta: use try/except onde necessário.
-    
+
     Retorne APENAS o código Python, nada mais.
     """
-    
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    
-    try:
-        response = model.generate_content(prompt)
-        codigo = response.text.replace("```python", "").replace("```", "").strip()
-        return codigo
-    except Exception as e:
-        print(f"Erro na IA: {e}")
-        return None
\ No newline at end of file
+
+
+def limpar_codigo(texto: str) -> str:
+    return texto.replace("```python", "").replace("```", "").strip()
+
+
+class ProvedorGemini:
+    """Gemini via google-generativeai; a lib e a chave so sao carregadas na primeira chamada."""
+
+    nome = "gemini"
+
+    def __init__(self, modelo: str = MODELO_PADRAO):
+        self.modelo = modelo
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _carregar(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                self._model = genai.GenerativeModel(self.modelo)
+        return self._model
+
+    async def gerar(self, prompt: str) -> str:
+        model = self._carregar()
+        response = await model.generate_content_async(prompt)
+        return response.text
+
+
+SCRIPT_STUB = '''import pandas as pd
+from src.normalizacao import normalizar_dataframe
+from src.template import carregar_template
+
+
+def transformar(df):
+    df, _ = normalizar_dataframe(df, carregar_template())
+    return df
+'''
+
+
+class ProvedorStub:
+    """Provedor local e deterministico: devolve sempre o mesmo script, sem rede.
+
+    `atraso` simula a latencia da API e `falhas_iniciais` faz as primeiras chamadas
+    falharem, para testar carga, retry e prazo sem gastar tokens.
+    """
+
+    nome = "stub"
+
+    def __init__(self, script: str = SCRIPT_STUB, atraso: float = 0.0, falhas_iniciais: int = 0):
+        self.script = script
+        self.atraso = atraso
+        self.falhas_restantes = falhas_iniciais
+        self.chamadas = 0
+
+    async def gerar(self, prompt: str) -> str:
+        self.chamadas += 1
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+        if self.falhas_restantes > 0:
+            self.falhas_restantes -= 1
+            raise ConnectionError("falha simulada do provedor stub")
+        return self.script
+
+
+PROVEDORES = {"gemini": ProvedorGemini, "stub": ProvedorStub}
+
+
+class VagasEntreLoops:
+    """Semaforo assincrono valido para todos os event loops do processo.
+
+    asyncio.Semaphore fica preso ao loop que o usou primeiro, e cada asyncio.run (sessoes do
+    Streamlit, threads do lote) cria um loop novo. Aqui quem espera aguarda um Future do
+    proprio loop, sem ocupar thread, e o prazo vale via asyncio.wait_for.
+    """
+
+    def __init__(self, limite: int):
+        self.limite = limite
+        self._livres = limite
+        self._fila = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def livres(self) -> int:
+        return self._livres
+
+    async def adquirir(self, espera: float) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._livres and not self._fila:
+                self._livres -= 1
+                return True
+            futuro = loop.create_future()
+            self._fila.append((loop, futuro))
+        try:
+            await asyncio.wait_for(futuro, max(espera, 0))
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                entregue = (loop, futuro) not in self._fila
+                if not entregue:
+                    self._fila.remove((loop, futuro))
+            if entregue:
+                # A vaga foi entregue junto com o prazo ou o cancelamento: passa adiante.
+                self.liberar()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def liberar(self):
+        with self._lock:
+            if self._fila:
+                loop, futuro = self._fila.popleft()
+                loop.call_soon_threadsafe(self._entregar, futuro)
+                return
+            if self._livres >= self.limite:
+                raise ValueError("Vaga liberada mais vezes do que foi adquirida.")
+            self._livres += 1
+
+    @staticmethod
+    def _entregar(futuro):
+        if not futuro.done():
+            futuro.set_result(True)
+
+
+class ClienteLLM:
+    """Limita chamadas simultaneas, aplica prazo total e repete com backoff exponencial.
+
+    Pedidos iguais (mesma estrutura e mesmo prompt) em paralelo compartilham uma unica
+    geracao; com `cache_persistente`, respostas ficam na tabela respostas_llm.
+    """
+
+    def __init__(
+        self,
+        provedor=None,
+        concorrencia: int = CONCORRENCIA_PADRAO,
+        tempo_limite: float = TEMPO_LIMITE_PADRAO,
+        tentativas: int = TENTATIVAS_PADRAO,
+        espera_base: float = ESPERA_BASE_PADRAO,
+        cache_persistente: bool = False,
+    ):
+        self.provedor = provedor or PROVEDORES[os.getenv("PIPELINE_LLM_PROVIDER", "gemini")]()
+        self.concorrencia = concorrencia
+        self.tempo_limite = tempo_limite
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.cache_persistente = cache_persistente
+        self._vagas = VagasEntreLoops(concorrencia)
+        # concurrent.futures em vez de asyncio.Future: sessoes do Streamlit rodam em threads
+        # diferentes, cada uma com o proprio event loop.
+        self._em_voo = {}
+        self._lock_voo = threading.Lock()
+
+    def _hash_prompt(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.provedor.nome}\0{prompt}".encode("utf-8")).hexdigest()
+
+    async def gerar(self, prompt: str, fingerprint: str = None) -> str:
+        hash_prompt = self._hash_prompt(prompt)
+        if self.cache_persistente:
+            resposta = buscar_resposta_llm(hash_prompt)
+            if resposta is not None:
+                return resposta
+
+        chave = (fingerprint, hash_prompt)
+        with self._lock_voo:
+            futuro = self._em_voo.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_voo[chave] = concurrent.futures.Future()
+        if not lider:
+            return await asyncio.wrap_future(futuro)
+
+        try:
+            with etapa(f"llm:{self.provedor.nome}"):
+                codigo = await self._gerar_com_retry(prompt)
+            if self.cache_persistente:
+                salvar_resposta_llm(hash_prompt, self.provedor.nome, codigo)
+            futuro.set_result(codigo)
+            return codigo
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock_voo:
+                self._em_voo.pop(chave, None)
+
+    async def _gerar_com_retry(self, prompt: str) -> str:
+        prazo = time.monotonic() + self.tempo_limite
+        ultimo_erro = None
+        if not await self._vagas.adquirir(prazo - time.monotonic()):
+            raise ErroLLM(f"Prazo de {self.tempo_limite:.0f}s esgotado aguardando vaga no provedor.")
+        try:
+            for tentativa in range(self.tentativas):
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    texto = await asyncio.wait_for(self.provedor.gerar(prompt), restante)
+                    codigo = limpar_codigo(texto or "")
+                    if codigo:
+                        return codigo
+                    ultimo_erro = ErroLLM("Resposta vazia do provedor.")
+                except asyncio.TimeoutError:
+                    ultimo_erro = ErroLLM(f"Prazo de {self.tempo_limite:.0f}s esgotado.")
+                    break
+                except Exception as e:
+                    ultimo_erro = e
+                if tentativa + 1 < self.tentativas:
+                    espera = self.espera_base * 2 ** tentativa * random.uniform(0.5, 1.0)
+                    await asyncio.sleep(min(espera, max(prazo - time.monotonic(), 0)))
+        finally:
+            self._vagas.liberar()
+        raise ErroLLM(f"Falha ao gerar script ({self.provedor.nome}): {ultimo_erro}") from ultimo_erro
+
+    async def gerar_script(self, erros_texto, amostra_csv, template, contrato="transformar", fingerprint=None) -> str:
+        return await self.gerar(montar_prompt(erros_texto, amostra_csv, template, contrato), fingerprint)
+
+
+_cliente_padrao = None
+_lock_cliente = threading.Lock()
+
+
+def cliente_padrao() -> ClienteLLM:
+    global _cliente_padrao
+    with _lock_cliente:
+        if _cliente_padrao is None:
+            _cliente_padrao = ClienteLLM(cache_persistente=True)
+    return _cliente_padrao
+
+
+def gerar_script_correcao(erros_texto, amostra_csv, template, contrato="transformar", fingerprint=None):
+    return asyncio.run(cliente_padrao().gerar_script(erros_texto, amostra_csv, template, contrato, fingerprint))
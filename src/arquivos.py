@@ -0,0 +1,53 @@
+"""
+Hash de conteudo dos arquivos recebidos, calculado em streaming.
+
+O upload e gravado em blocos e cada bloco passa pelo sha256 no caminho para o
+disco: o hash sai pronto ao fim da gravacao, sem reler o arquivo.
+"""
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Tuple, Union
+
+TAMANHO_BLOCO_HASH = 1 << 20
+
+
+def _blocos(origem: Union[bytes, bytearray, memoryview, BinaryIO]):
+    if hasattr(origem, "read"):
+        while True:
+            bloco = origem.read(TAMANHO_BLOCO_HASH)
+            if not bloco:
+                return
+            yield bloco
+    else:
+        visao = memoryview(origem)
+        for inicio in range(0, len(visao), TAMANHO_BLOCO_HASH):
+            yield visao[inicio:inicio + TAMANHO_BLOCO_HASH]
+
+
+def gravar_com_hash(origem, pasta: str, sufixo: str = ".csv") -> Tuple[str, str]:
+    # Grava num temporario e renomeia para <sha256><sufixo>: conteudo igual cai no mesmo arquivo.
+    os.makedirs(pasta, exist_ok=True)
+    sha = hashlib.sha256()
+    descritor, parcial = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            for bloco in _blocos(origem):
+                sha.update(bloco)
+                f.write(bloco)
+        hash_conteudo = sha.hexdigest()
+        caminho = os.path.join(pasta, f"{hash_conteudo}{sufixo}")
+        os.replace(parcial, caminho)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    return caminho, hash_conteudo
+
+
+def hash_arquivo(caminho: str) -> str:
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in _blocos(f):
+            sha.update(bloco)
+    return sha.hexdigest()
@@ -0,0 +1,225 @@
+"""
+Ingestao em lote de arquivos CSV, sem interface.
+
+Uso: python -m src.batch "dados/*.csv" --workers 4 --saida resumo.json
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+from src.arquivos import hash_arquivo
+from src.db_handler import (
+    buscar_arquivo_ingerido, buscar_script_por_hash, calcular_fingerprint_estrutura, calcular_hash_legado,
+    descarregar_usos_scripts, ingestar_idempotente, registrar_log, registrar_uso_script,
+)
+from src.dialeto import detectar_dialeto
+from src.ingestao_incremental import ingestar_arquivo
+from src.normalizacao import normalizar_dataframe
+from src.rastreamento import etapa, rastrear
+from src.sandbox import executar_isolado
+from src.template import TEMPLATE_PATH, carregar_template
+from src.validacao_streaming import validar_csv_streaming
+from src.validation import carregar_csv, dtypes_template, gerar_relatorio_divergencias, validar_csv_completo
+
+TAMANHO_FILA_ESCRITA = 8
+# Acima deste tamanho o arquivo e validado em chunks antes de ser carregado inteiro.
+LIMITE_STREAMING_MB = int(os.getenv("PIPELINE_LIMITE_STREAMING_MB", 256))
+
+
+def listar_arquivos(entradas: List[str]) -> List[str]:
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos.extend(sorted(glob.glob(os.path.join(entrada, "*.csv"))))
+        else:
+            arquivos.extend(sorted(glob.glob(entrada)))
+    return list(dict.fromkeys(arquivos))
+
+
+def processar_arquivo(caminho: str, template_path: str = TEMPLATE_PATH) -> dict:
+    # Roda no processo worker: le, valida e transforma. A escrita fica com o processo principal.
+    template = carregar_template(template_path)
+    saida = {"arquivo": caminho, "status": None, "tempos": {}, "df": None}
+
+    with rastrear(os.path.basename(caminho)) as rastreador:
+        try:
+            with etapa("hash_conteudo"):
+                saida["hash_conteudo"] = hash_arquivo(caminho)
+                registro = buscar_arquivo_ingerido(saida["hash_conteudo"])
+            if registro and registro["status"] == "concluido":
+                saida.update(status="ja_ingerido", log_id=registro["log_id"])
+                return saida
+
+            dialeto = detectar_dialeto(caminho)
+            if os.path.getsize(caminho) > LIMITE_STREAMING_MB * 1024 ** 2:
+                with etapa("validacao_streaming"):
+                    resultado = validar_csv_streaming(caminho, template, dialeto=dialeto)
+                if resultado["valido"]:
+                    # O escritor grava em fatias direto do arquivo; so arquivos com problemas sao carregados inteiros.
+                    saida.update(status="valido_streaming", dialeto=dialeto)
+                    return saida
+
+            with etapa("leitura"):
+                df = carregar_csv(caminho, dtype=dtypes_template(template), dialeto=dialeto)
+
+            with etapa("validacao", linhas=len(df)):
+                resultado = validar_csv_completo(df, template)
+            if resultado["valido"]:
+                saida.update(status="valido", df=df)
+                return saida
+
+            with etapa("normalizacao", linhas=len(df)):
+                df_normalizado, _ = normalizar_dataframe(df, template)
+                resultado = validar_csv_completo(df_normalizado, template)
+            if resultado["valido"]:
+                saida.update(status="normalizado", df=df_normalizado)
+                return saida
+
+            with etapa("busca_script"):
+                script = buscar_script_por_hash(
+                    calcular_fingerprint_estrutura(df_normalizado, template, dialeto), calcular_hash_legado(df)
+                )
+            if script is None:
+                saida.update(status="sem_script", erros=gerar_relatorio_divergencias(resultado))
+                return saida
+
+            with etapa("transformacao", linhas=len(df_normalizado)):
+                df_corrigido, saida["metricas_script"] = executar_isolado(script["script_python"], df_normalizado, caminho)
+                resultado = validar_csv_completo(df_corrigido, template)
+            saida["script_id"] = script["id"]
+            if not resultado["valido"]:
+                saida.update(status="script_invalido", erros=gerar_relatorio_divergencias(resultado))
+                return saida
+            saida.update(status="script_cache", df=df_corrigido)
+            return saida
+        except Exception as e:
+            saida.update(status="erro", erros=str(e))
+            return saida
+        finally:
+            saida["etapas"] = rastreador.etapas
+            saida["tempos"] = {e["etapa"]: e["duracao_segundos"] for e in rastreador.etapas if e["pai"] is None}
+            saida["tempos"]["total_worker"] = time.perf_counter() - rastreador.inicio
+
+
+def _ingestar_em_fatias(item: dict, template, dialeto) -> None:
+    inicio = time.perf_counter()
+    contagens = ingestar_arquivo(
+        item["arquivo"], template, hash_conteudo=item["hash_conteudo"],
+        arquivo_nome=os.path.basename(item["arquivo"]), dialeto=dialeto,
+    )
+    item["tempos"]["ingestao"] = time.perf_counter() - inicio
+    item["registros"] = {k: contagens[k] for k in ("total", "sucesso", "erro", "quarentena")}
+    item["log_id"] = contagens["log_id"]
+    if contagens["ja_ingerido"]:
+        item["status"] = "ja_ingerido"
+    elif contagens["retomado_de"]:
+        item["retomado_de"] = contagens["retomado_de"]
+
+
+def _escritor(fila: "queue.Queue", resumo: List[dict], template) -> None:
+    # Unico ponto de escrita no SQLite: evita disputa de lock entre processos.
+    while True:
+        item = fila.get()
+        if item is None:
+            break
+        df = item.pop("df")
+        etapas = item.pop("etapas", [])
+        dialeto = item.pop("dialeto", None)
+        if item["status"] == "valido_streaming":
+            try:
+                _ingestar_em_fatias(item, template, dialeto)
+            except Exception as e:
+                item["status"] = "erro_ingestao"
+                item["erros"] = str(e)
+        elif df is not None:
+            try:
+                nome = os.path.basename(item["arquivo"])
+                with rastrear(nome) as rastreador:
+                    rastreador.anexar(etapas)
+                    with etapa("ingestao", linhas=len(df)) as span:
+                        contagens = ingestar_idempotente(df, template, item["hash_conteudo"], nome)
+                item["tempos"]["ingestao"] = span["duracao_segundos"]
+                item["registros"] = {k: contagens[k] for k in ("total", "sucesso", "erro", "quarentena")}
+                if contagens["ja_ingerido"]:
+                    # Mesmo conteudo repetido no lote: o primeiro ja foi concluido pelo escritor.
+                    item.update(status="ja_ingerido", log_id=contagens["log_id"])
+                else:
+                    metricas_script = item.get("metricas_script", {})
+                    item["log_id"] = registrar_log(
+                        nome, contagens["total"], contagens["sucesso"], contagens["erro"],
+                        False, item.get("script_id"), item["tempos"]["total_worker"] + item["tempos"]["ingestao"],
+                        metricas_script.get("cpu_segundos"), metricas_script.get("pico_memoria_mb"), rastreador.etapas,
+                        item["hash_conteudo"],
+                    )
+                    if contagens["retomado_de"]:
+                        item["retomado_de"] = contagens["retomado_de"]
+                    if item.get("script_id") is not None:
+                        registrar_uso_script(item["script_id"])
+            except Exception as e:
+                item["status"] = "erro_ingestao"
+                item["erros"] = str(e)
+        item["tempos"] = {k: round(v, 4) for k, v in item["tempos"].items()}
+        resumo.append(item)
+
+
+def executar_lote(arquivos: List[str], workers: Optional[int] = None, template_path: str = TEMPLATE_PATH) -> dict:
+    inicio = time.perf_counter()
+    resumo: List[dict] = []
+    fila: "queue.Queue" = queue.Queue(maxsize=TAMANHO_FILA_ESCRITA)
+    escritor = threading.Thread(target=_escritor, args=(fila, resumo, carregar_template(template_path)), daemon=True)
+    escritor.start()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {pool.submit(processar_arquivo, caminho, template_path): caminho for caminho in arquivos}
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            item = futuro.result()
+            print(f"[{i}/{len(arquivos)}] {item['arquivo']}: {item['status']}", file=sys.stderr)
+            fila.put(item)
+
+    fila.put(None)
+    escritor.join()
+    descarregar_usos_scripts()
+
+    contagem = {}
+    for item in resumo:
+        contagem[item["status"]] = contagem.get(item["status"], 0) + 1
+    return {
+        "arquivos": len(arquivos),
+        "duracao_segundos": round(time.perf_counter() - inicio, 4),
+        "status": contagem,
+        "resultados": sorted(resumo, key=lambda item: item["arquivo"]),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingestao em lote de arquivos CSV.")
+    parser.add_argument("entradas", nargs="+", help="Diretorios ou globs de arquivos CSV")
+    parser.add_argument("--workers", type=int, default=None, help="Processos paralelos (padrao: numero de CPUs)")
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--saida", help="Arquivo JSON com o resumo (padrao: stdout)")
+    args = parser.parse_args(argv)
+
+    arquivos = listar_arquivos(args.entradas)
+    if not arquivos:
+        print("Nenhum arquivo CSV encontrado.", file=sys.stderr)
+        return 1
+
+    resumo = executar_lote(arquivos, args.workers, args.template)
+    texto = json.dumps(resumo, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto, encoding="utf-8")
+    else:
+        print(texto)
+    return 0 if all(item["status"] not in ("erro", "erro_ingestao") for item in resumo["resultados"]) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
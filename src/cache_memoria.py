@@ -0,0 +1,56 @@
+"""
+Cache LRU limitado pelo tamanho em bytes dos DataFrames guardados, nao pelo numero de entradas.
+
+Os valores sao devolvidos por referencia (sem pickle nem copia): quem le nao deve altera-los.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import pandas as pd
+
+
+def tamanho_bytes(valor: Any) -> int:
+    # So os frames pesam; resultados de validacao, dialeto e textos curtos ficam de fora da conta.
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, dict):
+        return sum(tamanho_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamanho_bytes(v) for v in valor)
+    return 0
+
+
+class CacheLimitadoPorBytes:
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        self.bytes_usados = 0
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: Hashable) -> Optional[Any]:
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[0]
+
+    def guardar(self, chave: Hashable, valor: Any) -> Any:
+        tamanho = tamanho_bytes(valor)
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self.bytes_usados -= anterior[1]
+            # Um valor maior que o limite inteiro nao e guardado: esvaziaria o cache sem caber nele.
+            if tamanho > self.limite_bytes:
+                return valor
+            while self._entradas and self.bytes_usados + tamanho > self.limite_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self.bytes_usados -= liberado
+            self._entradas[chave] = (valor, tamanho)
+            self.bytes_usados += tamanho
+        return valor
+
+    def __len__(self) -> int:
+        return len(self._entradas)
@@ -0,0 +1,77 @@
+"""
+Contexto compacto para o prompt de correcao: resumo estruturado dos erros e
+uma amostra com uma linha representativa por classe de erro.
+"""
+import json
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.dialeto import Dialeto
+from src.regras import avaliar_restricoes
+from src.template import CompiledTemplate, como_compilado
+
+MAX_LINHAS_AMOSTRA = 6
+MAX_VALORES_RESUMO = 5
+
+
+def _com_nomes_canonicos(df: pd.DataFrame, tpl: CompiledTemplate) -> pd.DataFrame:
+    renomear = {}
+    for col in df.columns:
+        canonico = tpl.canonico(col)
+        if canonico and canonico != col and canonico not in df.columns and canonico not in renomear.values():
+            renomear[col] = canonico
+    return df.rename(columns=renomear)
+
+
+def linhas_representativas(restricoes: dict, max_linhas: int = MAX_LINHAS_AMOSTRA) -> List[int]:
+    # Primeira linha + a primeira ocorrencia de cada violacao "coluna:regra", em posicoes.
+    if len(restricoes["bitmap"]) == 0:
+        return []
+    posicoes = [0]
+    for regra in restricoes["regras"]:
+        if len(posicoes) >= max_linhas:
+            break
+        marcadas = np.flatnonzero(restricoes["bitmap"] & np.uint64(1 << regra["bit"]))
+        if len(marcadas) and int(marcadas[0]) not in posicoes:
+            posicoes.append(int(marcadas[0]))
+    return sorted(posicoes)
+
+
+def resumir_erros(resultado: dict, restricoes: Optional[dict] = None) -> str:
+    resumo = {}
+    for erro in resultado.get("detalhes", []):
+        tipo = erro["tipo"]
+        if tipo == "colunas_faltando":
+            resumo["colunas_faltando"] = erro["colunas"]
+        elif tipo == "nomes_colunas":
+            resumo["renomear"] = erro["mapeamento"]
+        elif tipo == "erro_leitura":
+            resumo["erro_leitura"] = erro["mensagem"]
+        elif tipo in ("formato_data", "formato_valor"):
+            resumo.setdefault("formatos", {})[erro["coluna"]] = erro["detectado"]
+        elif tipo == "valor_invalido":
+            resumo.setdefault("valores_invalidos", {})[erro["coluna"]] = [str(v) for v in erro["valores"][:MAX_VALORES_RESUMO]]
+        elif tipo == "restricoes_linhas":
+            resumo["violacoes_linhas"] = erro["violacoes"]
+    if restricoes is not None and "violacoes_linhas" not in resumo:
+        violacoes = {chave: n for chave, n in restricoes["contagens"].items() if n}
+        if violacoes:
+            resumo["violacoes_linhas"] = violacoes
+    return json.dumps(resumo, ensure_ascii=False, separators=(",", ":"))
+
+
+def montar_contexto_prompt(
+    df: pd.DataFrame,
+    template: Union[dict, CompiledTemplate],
+    resultado: dict,
+    dialeto: Optional[Dialeto] = None,
+    max_linhas: int = MAX_LINHAS_AMOSTRA,
+) -> Tuple[str, str]:
+    tpl = como_compilado(template)
+    dialeto = dialeto or df.attrs.get("dialeto") or Dialeto()
+    restricoes = avaliar_restricoes(_com_nomes_canonicos(df, tpl), tpl)
+    amostra = df.iloc[linhas_representativas(restricoes, max_linhas)]
+    texto_amostra = amostra.to_csv(index=False, sep=dialeto.delimitador, lineterminator="\n")
+    return resumir_erros(resultado, restricoes), texto_amostra
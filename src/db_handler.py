@@ -1,78 +1,628 @@
+import atexit
 import sqlite3
 import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
 import os
 
+from src.rastreamento import etapa
+from src.regras import avaliar_restricoes, motivos_violacao
+from src.template import como_compilado
+from src.validation import validar_formato_data, validar_formato_valor
+
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "..", "database", "data_pipeline.db")
+DB_PATH = os.getenv("PIPELINE_DB_PATH", os.path.join(BASE_DIR, "..", "database", "data_pipeline.db"))
+SCHEMA_PATH = os.path.join(BASE_DIR, "..", "database", "schema.sql")
 
-def conexao_banco():
-    conn = sqlite3.connect(DB_PATH)
+# WAL deixa leitores e o escritor trabalharem ao mesmo tempo; NORMAL so faz fsync no checkpoint.
+PRAGMAS_PADRAO = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+COLUNAS_MIGRADAS = {
+    "log_ingestao": {"cpu_segundos": "REAL", "pico_memoria_mb": "REAL"},
+    "arquivos_ingeridos": {"offset_bytes": "INTEGER NOT NULL DEFAULT 0"},
+    # Bancos antigos mantem a coluna pico_memoria_mb de log_etapas, que deixa de ser preenchida.
+    "log_etapas": {"rss_amostrado_mb": "REAL"},
+}
+
+_pragmas = dict(PRAGMAS_PADRAO)
+_local = threading.local()
+_schemas_aplicados = set()
+_lock_schema = threading.Lock()
+
+LIMITE_CACHE_SCRIPTS = 256
+_cache_scripts = OrderedDict()
+_lock_cache_scripts = threading.Lock()
+
+LIMITE_USOS_PENDENTES = 50
+INTERVALO_GRAVACAO_USOS = 30.0
+_usos_pendentes = Counter()
+_ultima_gravacao_usos = [time.monotonic()]
+_lock_usos = threading.Lock()
+
+
+def configurar_banco(caminho: str = None, **pragmas):
+    global DB_PATH
+    if caminho is not None:
+        descarregar_usos_scripts()
+        DB_PATH = caminho
+        invalidar_cache_scripts()
+    _pragmas.update(pragmas)
+    fechar_conexao()
+
+
+def _aplicar_schema(conn, caminho):
+    with _lock_schema:
+        if caminho in _schemas_aplicados:
+            return
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        _migrar_colunas(conn)
+        _schemas_aplicados.add(caminho)
+
+
+def _migrar_colunas(conn):
+    # CREATE TABLE IF NOT EXISTS nao altera bancos antigos: colunas novas entram via ALTER.
+    for tabela, colunas in COLUNAS_MIGRADAS.items():
+        existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+        for nome, tipo in colunas.items():
+            if nome not in existentes:
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+
+
+def _abrir_conexao(caminho):
+    # isolation_level=None: cada comando faz autocommit, transacoes explicitas via transacao().
+    conn = sqlite3.connect(caminho, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    for nome, valor in _pragmas.items():
+        conn.execute(f"PRAGMA {nome} = {valor}")
+    _aplicar_schema(conn, caminho)
     return conn
 
 
-def calcular_hash_estrutura(df: pd.DataFrame) -> str:
-    colunas = sorted(list(df.columns))
-    assinatura = ",".join(colunas)
-    return hashlib.md5(assinatura.encode()).hexdigest()
+def conexao_banco():
+    # Uma conexao por thread (e por processo), reaproveitada entre chamadas.
+    chave = (os.getpid(), DB_PATH)
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "chave", None) != chave:
+        conn = _abrir_conexao(DB_PATH)
+        _local.conn = conn
+        _local.chave = chave
+        _local.profundidade = 0
+    return conn
+
 
+def fechar_conexao():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "chave", (None,))[0] == os.getpid():
+        conn.close()
+    _local.conn = None
+    _local.chave = None
+    _local.profundidade = 0
 
-def buscar_script_por_hash(hash_estrutura: str):
+
+@contextmanager
+def transacao():
     conn = conexao_banco()
-    script = conn.execute(
-        "SELECT * FROM scripts_transformacao WHERE hash_estrutura = ?", 
-        (hash_estrutura,)
-    ).fetchone()
-    conn.close()
+    profundidade = _local.profundidade
+    savepoint = f"sp_{profundidade}"
+    conn.execute("BEGIN IMMEDIATE" if profundidade == 0 else f"SAVEPOINT {savepoint}")
+    _local.profundidade = profundidade + 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK" if profundidade == 0 else f"ROLLBACK TO {savepoint}")
+        if profundidade > 0:
+            conn.execute(f"RELEASE {savepoint}")
+        raise
+    else:
+        conn.execute("COMMIT" if profundidade == 0 else f"RELEASE {savepoint}")
+    finally:
+        _local.profundidade = profundidade
+
+
+def _classes_formato(df: pd.DataFrame, template) -> dict:
+    tpl = como_compilado(template)
+    classes = {}
+    for col in df.columns:
+        canonico = tpl.canonico(col)
+        if canonico is None:
+            continue
+        tipo = tpl.colunas[canonico].tipo
+        if tipo == "DATE":
+            classes[col] = validar_formato_data(df, col, tpl)["formato_detectado"]
+        elif tipo == "DECIMAL":
+            classes[col] = validar_formato_valor(df, col, tpl)["formato_detectado"]
+    return classes
+
+
+# O nome que o chardet devolve depende de a amostra ter ou nao bytes acentuados (ascii vs utf-8,
+# ISO-8859-1 vs Windows-1252); no fingerprint entra so a familia.
+FAMILIAS_ENCODING = {
+    "ascii": "utf-8", "utf-8": "utf-8", "utf8": "utf-8", "utf-8-sig": "utf-8",
+    "iso-8859-1": "latin-1", "latin-1": "latin-1", "latin1": "latin-1", "windows-1252": "latin-1",
+    "cp1252": "latin-1", "iso-8859-15": "latin-1",
+}
+
+
+def familia_encoding(encoding: str) -> str:
+    nome = encoding.lower().replace("_", "-")
+    return FAMILIAS_ENCODING.get(nome, nome)
+
+
+def calcular_fingerprint_estrutura(df: pd.DataFrame, template, dialeto=None) -> str:
+    # Colunas + dialeto + classe de formato por coluna: mesmos cabecalhos com
+    # delimitador ou formato de data/valor diferentes geram fingerprints diferentes.
+    if dialeto is None:
+        dialeto = df.attrs.get("dialeto")
+    partes = {
+        "colunas": sorted(str(c) for c in df.columns),
+        "dialeto": [familia_encoding(dialeto.encoding), dialeto.delimitador, dialeto.quotechar] if dialeto else None,
+        "formatos": _classes_formato(df, template),
+    }
+    assinatura = json.dumps(partes, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(assinatura.encode()).hexdigest()
+
+
+def _guardar_no_cache(hash_estrutura, script):
+    with _lock_cache_scripts:
+        _cache_scripts[hash_estrutura] = script
+        _cache_scripts.move_to_end(hash_estrutura)
+        while len(_cache_scripts) > LIMITE_CACHE_SCRIPTS:
+            _cache_scripts.popitem(last=False)
+
+
+def invalidar_cache_scripts(hash_estrutura: str = None):
+    with _lock_cache_scripts:
+        if hash_estrutura is None:
+            _cache_scripts.clear()
+        else:
+            _cache_scripts.pop(hash_estrutura, None)
+
+
+def calcular_hash_legado(df: pd.DataFrame) -> str:
+    # Chave usada antes do fingerprint com dialeto e formatos: so os nomes das colunas do arquivo bruto.
+    return hashlib.md5(",".join(sorted(str(c) for c in df.columns)).encode()).hexdigest()
+
+
+def buscar_script_por_hash(hash_estrutura: str, hash_legado: str = None):
+    # LRU em memoria na frente da tabela: acertos nao tocam o disco.
+    # `hash_legado` acha scripts salvos com a chave antiga, que nao tem como ser recalculada no banco.
+    with _lock_cache_scripts:
+        script = _cache_scripts.get(hash_estrutura)
+        if script is not None:
+            _cache_scripts.move_to_end(hash_estrutura)
+            return script
+    with etapa("busca_script_banco"):
+        linha = conexao_banco().execute(
+            "SELECT * FROM scripts_transformacao WHERE hash_estrutura = ?",
+            (hash_estrutura,)
+        ).fetchone()
+    if linha is None:
+        script = buscar_script_por_hash(hash_legado) if hash_legado else None
+        if script is not None:
+            _guardar_no_cache(hash_estrutura, script)
+        return script
+    script = dict(linha)
+    _guardar_no_cache(hash_estrutura, script)
     return script
 
 def salvar_script(hash_estrutura: str, script_python: str):
-    conn = conexao_banco()
-    try:
-        conn.execute(
-            "INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES (?, ?)",
-            (hash_estrutura, script_python)
+    with transacao() as conn:
+        anterior = conn.execute(
+            "SELECT script_python FROM scripts_transformacao WHERE hash_estrutura = ?",
+            (hash_estrutura,)
+        ).fetchone()
+        if anterior is None:
+            conn.execute(
+                "INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES (?, ?)",
+                (hash_estrutura, script_python)
+            )
+        else:
+            conn.execute(
+                "UPDATE scripts_transformacao SET script_python = ?, updated_at = ? WHERE hash_estrutura = ?",
+                (script_python, datetime.now(), hash_estrutura)
+            )
+    invalidar_cache_scripts(hash_estrutura)
+
+
+def registrar_uso_script(script_id: int):
+    # Acumula em memoria e grava em lote: replays de cache nao pagam um UPDATE cada.
+    with _lock_usos:
+        _usos_pendentes[script_id] += 1
+        pendentes = sum(_usos_pendentes.values())
+        vencido = time.monotonic() - _ultima_gravacao_usos[0] >= INTERVALO_GRAVACAO_USOS
+    if pendentes >= LIMITE_USOS_PENDENTES or vencido:
+        descarregar_usos_scripts()
+
+
+def descarregar_usos_scripts():
+    with _lock_usos:
+        usos = [(n, script_id) for script_id, n in _usos_pendentes.items()]
+        _usos_pendentes.clear()
+        _ultima_gravacao_usos[0] = time.monotonic()
+    if not usos:
+        return
+    with transacao() as conn:
+        conn.executemany(
+            "UPDATE scripts_transformacao SET vezes_utilizado = vezes_utilizado + ? WHERE id = ?",
+            usos
         )
-    except sqlite3.IntegrityError:
+
+
+atexit.register(descarregar_usos_scripts)
+
+
+def registrar_log(
+    arquivo_nome, total, sucesso, erro, usou_ia, script_id, duracao, cpu_segundos=None, pico_memoria_mb=None, etapas=None,
+    hash_conteudo=None,
+):
+    with transacao() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO log_ingestao
+            (arquivo_nome, registros_total, registros_sucesso, registros_erro, usou_ia, script_id, duracao_segundos,
+             cpu_segundos, pico_memoria_mb)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (arquivo_nome, total, sucesso, erro, usou_ia, script_id, duracao, cpu_segundos, pico_memoria_mb)
+        )
+        log_id = cursor.lastrowid
+        if etapas:
+            conn.executemany(
+                """
+                INSERT INTO log_etapas
+                (log_id, ordem, pai, etapa, inicio_segundos, duracao_segundos, linhas, rss_amostrado_mb)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (log_id, e["ordem"], e["pai"], e["etapa"], e["inicio_segundos"], e["duracao_segundos"],
+                     e["linhas"], e["rss_amostrado_mb"])
+                    for e in etapas
+                ]
+            )
+        if hash_conteudo is not None:
+            # Fecha o registro do arquivo no mesmo commit do log: reenvios passam a devolver este resultado.
+            conn.execute(
+                "UPDATE arquivos_ingeridos SET status = 'concluido', log_id = ?, updated_at = CURRENT_TIMESTAMP "
+                "WHERE hash_conteudo = ?",
+                (log_id, hash_conteudo)
+            )
+    return log_id
+
+
+def buscar_resposta_llm(hash_prompt: str):
+    linha = conexao_banco().execute(
+        "SELECT resposta FROM respostas_llm WHERE hash_prompt = ?", (hash_prompt,)
+    ).fetchone()
+    return linha["resposta"] if linha else None
+
+
+def salvar_resposta_llm(hash_prompt: str, provedor: str, resposta: str):
+    with transacao() as conn:
         conn.execute(
-            "UPDATE scripts_transformacao SET script_python = ?, updated_at = ? WHERE hash_estrutura = ?",
-            (script_python, datetime.now(), hash_estrutura)
+            "INSERT OR REPLACE INTO respostas_llm (hash_prompt, provedor, resposta) VALUES (?, ?, ?)",
+            (hash_prompt, provedor, resposta)
+        )
+
+
+def carregar_metricas():
+    # Contadores mantidos por triggers (schema.sql): uma leitura pela chave primaria.
+    linha = conexao_banco().execute(
+        "SELECT total_processado, total_arquivos, scripts_cache, uso_ia, uso_cache FROM metricas_pipeline WHERE id = 1"
+    ).fetchone()
+    return tuple(linha) if linha else (0, 0, 0, 0, 0)
+
+TAMANHO_LOTE_PADRAO = 5000
+# Limite de parametros por consulta IN (...) ao checar ids ja existentes.
+LIMITE_PARAMETROS = 900
+MODOS_INSERCAO = {
+    "abortar": "INSERT INTO",
+    "ignorar": "INSERT OR IGNORE INTO",
+    "atualizar": "INSERT OR IGNORE INTO",
+}
+
+
+def _colunas_tabela(conn, tabela):
+    return [r["name"] for r in conn.execute(f"PRAGMA table_info({tabela})")]
+
+
+def _preparar_colunas(df: pd.DataFrame, colunas):
+    arrays = []
+    for col in colunas:
+        serie = df[col]
+        if col == "data_transacao":
+            serie = pd.to_datetime(serie, errors="coerce").dt.strftime("%Y-%m-%d")
+        elif col == "valor":
+            serie = pd.to_numeric(serie, errors="coerce")
+        valores = serie.to_numpy(dtype=object)
+        valores[pd.isna(valores)] = None
+        arrays.append(valores)
+    return arrays
+
+
+def _ids_existentes(conn, ids):
+    existentes = set()
+    for i in range(0, len(ids), LIMITE_PARAMETROS):
+        parte = ids[i:i + LIMITE_PARAMETROS]
+        marcadores = ",".join("?" * len(parte))
+        existentes.update(
+            r[0] for r in conn.execute(
+                f"SELECT id_transacao FROM transacoes_financeiras WHERE id_transacao IN ({marcadores})", parte
+            )
         )
-    conn.commit()
-    conn.close()
+    return existentes
 
-def registrar_log(arquivo_nome, total, sucesso, erro, usou_ia, script_id, duracao):
+
+def _motivo_banco(erro: sqlite3.Error) -> str:
+    mensagem = str(erro)
+    if mensagem.startswith("NOT NULL constraint failed:"):
+        return "banco:nulo:" + mensagem.rsplit(".", 1)[-1]
+    if mensagem.startswith("CHECK constraint failed:"):
+        return "banco:check:" + mensagem.split(":", 1)[1].strip()
+    if mensagem.startswith("UNIQUE constraint failed:"):
+        return "banco:duplicado"
+    return "banco:" + mensagem
+
+
+def _rejeitadas_por_restricao(conn, colunas, arrays, ids, fatia, conflitos, upsert: str = ""):
+    # O OR IGNORE descarta linhas que violam CHECK/NOT NULL sem dizer quais: as ausentes do banco
+    # sao reexecutadas sem o IGNORE, num savepoint desfeito em seguida, so para obter o motivo.
+    # Com `upsert` (modo atualizar) os conflitos tambem sao reexecutados: o UPDATE depende so dos
+    # valores da propria linha, entao o que foi barrado falha de novo e o que passou passa de novo.
+    ids_lote = ids[fatia].tolist()
+    presentes = _ids_existentes(conn, [v for v in ids_lote if v is not None])
+    pular = set(conflitos)
+    sql = f"INSERT INTO transacoes_financeiras ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    rejeitadas = []
+    for posicao, v in enumerate(ids_lote, start=fatia.start):
+        if posicao in pular:
+            if not upsert:
+                continue
+            comando = sql + upsert
+        elif v is None or v in presentes:
+            continue
+        else:
+            comando = sql
+        conn.execute("SAVEPOINT sp_rejeicao")
+        try:
+            conn.execute(comando, [col[posicao] for col in arrays])
+            motivo = None if posicao in pular else "banco:ignorado"
+        except sqlite3.Error as e:
+            motivo = _motivo_banco(e)
+        finally:
+            conn.execute("ROLLBACK TO sp_rejeicao")
+            conn.execute("RELEASE sp_rejeicao")
+        if motivo is not None:
+            rejeitadas.append((posicao, motivo))
+    return rejeitadas
+
+
+def inserir_transacoes_em_lote(df: pd.DataFrame, modo: str = "ignorar", tamanho_lote: int = TAMANHO_LOTE_PADRAO):
+    if modo not in MODOS_INSERCAO:
+        raise ValueError(f"Modo de insercao invalido: {modo}. Use {sorted(MODOS_INSERCAO)}.")
+
+    inicio = time.perf_counter()
     conn = conexao_banco()
-    conn.execute(
+    colunas = [c for c in _colunas_tabela(conn, "transacoes_financeiras") if c in df.columns]
+    sql = f"{MODOS_INSERCAO[modo]} transacoes_financeiras ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    upsert = ""
+    if modo == "atualizar":
+        atualizar = [c for c in colunas if c != "id_transacao"]
+        upsert = " ON CONFLICT(id_transacao) DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in atualizar)
+        sql += upsert
+
+    arrays = _preparar_colunas(df, colunas)
+    ids = arrays[colunas.index("id_transacao")] if "id_transacao" in colunas else None
+    resumo = {"total": len(df), "inseridos": 0, "atualizados": 0, "ignorados": 0, "conflitos": 0, "rejeitadas": []}
+
+    with transacao() as conn:
+        for i in range(0, len(df), tamanho_lote):
+            fatia = slice(i, i + tamanho_lote)
+            tamanho = len(arrays[0][fatia]) if arrays else 0
+            conflitos = []
+            if ids is not None and modo != "abortar":
+                ids_lote = ids[fatia].tolist()
+                # Lotes anteriores ja estao visiveis dentro da mesma transacao.
+                vistos = _ids_existentes(conn, [v for v in ids_lote if v is not None])
+                for posicao, v in enumerate(ids_lote, start=i):
+                    if v is None:
+                        continue
+                    if v in vistos:
+                        conflitos.append(posicao)
+                    vistos.add(v)
+
+            antes = conn.total_changes
+            conn.executemany(sql, zip(*(col[fatia].tolist() for col in arrays)))
+            alterados = conn.total_changes - antes
+
+            rejeitadas = []
+            esperados = tamanho - (len(conflitos) if modo == "ignorar" else 0)
+            if modo != "abortar" and ids is not None and alterados < esperados:
+                rejeitadas = _rejeitadas_por_restricao(conn, colunas, arrays, ids, fatia, conflitos, upsert)
+            resumo["rejeitadas"].extend(rejeitadas)
+
+            if modo == "atualizar":
+                # Cada linha gera no maximo uma mudanca: conflitos sem UPDATE barrado foram atualizados.
+                atualizados = len(set(conflitos) - {posicao for posicao, _ in rejeitadas})
+                resumo["atualizados"] += atualizados
+                resumo["inseridos"] += alterados - atualizados
+            else:
+                resumo["inseridos"] += alterados
+                resumo["rejeitadas"].extend((posicao, "banco:duplicado") for posicao in conflitos)
+            resumo["conflitos"] += len(conflitos)
+            resumo["ignorados"] += tamanho - alterados
+
+    segundos = time.perf_counter() - inicio
+    resumo["segundos"] = segundos
+    resumo["linhas_por_segundo"] = len(df) / segundos if segundos > 0 else None
+    return resumo
+
+def ingestar_transacoes(df: pd.DataFrame, modo: str = "abortar"):
+    df_clean = df.copy()
+    if 'data_transacao' in df_clean.columns:
+        df_clean['data_transacao'] = pd.to_datetime(df_clean['data_transacao'], errors='coerce')
+    if 'valor' in df_clean.columns:
+        df_clean['valor'] = pd.to_numeric(df_clean['valor'], errors='coerce')
+    colunas_criticas = ['data_transacao', 'valor', 'conta_origem']
+    cols_existentes = [c for c in colunas_criticas if c in df_clean.columns]
+    df_final = df_clean.dropna(subset=cols_existentes)
+    if not df_final.empty:
+        resumo = inserir_transacoes_em_lote(df_final, modo=modo)
+        return resumo["inseridos"] + resumo["atualizados"]
+    return len(df_final)
+
+
+def _enums_em_maiusculas(df: pd.DataFrame, template) -> pd.DataFrame:
+    # As restricoes aceitam enum em qualquer caixa; os CHECKs do SQLite so aceitam o valor canonico.
+    colunas = [col for col, config in como_compilado(template).colunas.items()
+               if config.valores_permitidos is not None and col in df.columns]
+    if not colunas or df.empty:
+        return df
+    df = df.copy()
+    for col in colunas:
+        df[col] = df[col].where(df[col].isna(), df[col].astype("string").str.upper()).astype(object)
+    return df
+
+
+def ingestar_com_quarentena(
+    df: pd.DataFrame, template, arquivo_nome: str = None, modo: str = "ignorar", restricoes: dict = None
+):
+    # Separa linhas boas e ruins com as mascaras do template antes de chegar no SQLite.
+    # `restricoes` ja avaliadas (por um worker do pipeline) poupam esse trabalho na thread de escrita.
+    with etapa("restricoes_linhas", linhas=len(df)):
+        if restricoes is None:
+            restricoes = avaliar_restricoes(df, template)
+        validas = restricoes["linhas_validas"]
+        df_bom = _enums_em_maiusculas(df[validas], template)
+        df_ruim = df[~validas]
+
+    with transacao() as conn:
+        with etapa("insercao_lote", linhas=len(df_bom)):
+            resumo_lote = inserir_transacoes_em_lote(df_bom, modo=modo)
+        motivos = motivos_violacao(restricoes, df.index)[~validas] if not df_ruim.empty else pd.Series(dtype=object)
+        contagens = {k: v for k, v in restricoes["contagens"].items() if v}
+        if resumo_lote["rejeitadas"]:
+            # Linhas que passaram pelo template mas o SQLite recusou (id duplicado, CHECKs do schema).
+            posicoes, motivos_banco = zip(*sorted(resumo_lote["rejeitadas"]))
+            df_ruim = pd.concat([df_ruim, df_bom.iloc[list(posicoes)]])
+            motivos = pd.concat([motivos, pd.Series(motivos_banco, index=df_bom.index[list(posicoes)])])
+            for motivo in motivos_banco:
+                contagens[motivo] = contagens.get(motivo, 0) + 1
+        if not df_ruim.empty:
+            with etapa("quarentena", linhas=len(df_ruim)):
+                dados = df_ruim.to_json(orient="records", lines=True, date_format="iso", force_ascii=False).splitlines()
+                conn.executemany(
+                    "INSERT INTO transacoes_quarentena (arquivo_nome, linha, motivo, dados) VALUES (?, ?, ?, ?)",
+                    zip([arquivo_nome] * len(df_ruim), df_ruim.index.tolist(), motivos.tolist(), dados)
+                )
+
+    sucesso = resumo_lote["inseridos"] + resumo_lote["atualizados"]
+    return {
+        "total": len(df),
+        "sucesso": sucesso,
+        "erro": len(df) - sucesso,
+        "quarentena": len(df_ruim),
+        "ignorados_banco": resumo_lote["ignorados"],
+        "motivos": contagens,
+    }
+
+
+TAMANHO_CHUNK_INGESTAO = 50_000
+
+
+def buscar_arquivo_ingerido(hash_conteudo: str):
+    linha = conexao_banco().execute(
         """
-        INSERT INTO log_ingestao 
-        (arquivo_nome, registros_total, registros_sucesso, registros_erro, usou_ia, script_id, duracao_segundos)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        SELECT a.*, l.registros_total, l.duracao_segundos, l.usou_ia, l.created_at AS ingerido_em
+        FROM arquivos_ingeridos a LEFT JOIN log_ingestao l ON l.id = a.log_id
+        WHERE a.hash_conteudo = ?
         """,
-        (arquivo_nome, total, sucesso, erro, usou_ia, script_id, duracao)
-    )
-    conn.commit()
-    conn.close()
+        (hash_conteudo,)
+    ).fetchone()
+    return dict(linha) if linha else None
 
-def ingestar_transacoes(df: pd.DataFrame):
-    conn = conexao_banco()
-    try:
-        df_clean = df.copy()
-        if 'data_transacao' in df_clean.columns:
-            df_clean['data_transacao'] = pd.to_datetime(df_clean['data_transacao'], errors='coerce')
-            df_clean['data_transacao'] = df_clean['data_transacao'].dt.date
-        if 'valor' in df_clean.columns:
-            df_clean['valor'] = pd.to_numeric(df_clean['valor'], errors='coerce')
-        colunas_criticas = ['data_transacao', 'valor', 'conta_origem']
-        cols_existentes = [c for c in colunas_criticas if c in df_clean.columns]
-        df_final = df_clean.dropna(subset=cols_existentes)
-        if not df_final.empty:
-            df_final['data_transacao'] = df_final['data_transacao'].astype(str)
-            df_final.to_sql("transacoes_financeiras", conn, if_exists="append", index=False)
-            print(f"DEBUG: {len(df_final)} linhas inseridas com sucesso.")
-        return len(df_final)
-    finally:
-        conn.close()
\ No newline at end of file
+
+def iniciar_arquivo_ingerido(hash_conteudo: str, arquivo_nome: str = None) -> dict:
+    registro = buscar_arquivo_ingerido(hash_conteudo)
+    if registro is None:
+        with transacao() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO arquivos_ingeridos (hash_conteudo, arquivo_nome) VALUES (?, ?)",
+                (hash_conteudo, arquivo_nome)
+            )
+        registro = buscar_arquivo_ingerido(hash_conteudo)
+    return registro
+
+
+def resumo_arquivo_ingerido(registro: dict, total: int = None) -> dict:
+    # Ponto de partida do resumo: o resultado anterior (concluido) ou o acumulado ate o checkpoint.
+    concluido = registro["status"] == "concluido"
+    return {
+        "ja_ingerido": concluido,
+        "log_id": registro["log_id"],
+        "total": registro["registros_total"] if concluido else total,
+        "sucesso": registro["registros_sucesso"],
+        "erro": registro["registros_erro"],
+        "quarentena": 0,
+        "ignorados_banco": 0,
+        "motivos": {},
+        "retomado_de": None if concluido else registro["linhas_concluidas"],
+    }
+
+
+def gravar_chunk_com_checkpoint(
+    chunk: pd.DataFrame, template, hash_conteudo: str, linhas_concluidas: int, offset_bytes: int = 0,
+    arquivo_nome: str = None, modo: str = "ignorar", restricoes: dict = None,
+):
+    # A fatia e o checkpoint entram no mesmo commit: depois de uma queda, nada e gravado duas vezes.
+    with transacao() as conn:
+        parcial = ingestar_com_quarentena(chunk, template, arquivo_nome, modo, restricoes)
+        conn.execute(
+            """
+            UPDATE arquivos_ingeridos SET linhas_concluidas = ?, offset_bytes = ?,
+                registros_sucesso = registros_sucesso + ?, registros_erro = registros_erro + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE hash_conteudo = ?
+            """,
+            (linhas_concluidas, offset_bytes, parcial["sucesso"], parcial["erro"], hash_conteudo)
+        )
+    return parcial
+
+
+def acumular_resumo(resumo: dict, parcial: dict):
+    for chave in ("sucesso", "erro", "quarentena", "ignorados_banco"):
+        resumo[chave] += parcial[chave]
+    motivos = Counter(resumo["motivos"])
+    motivos.update(parcial["motivos"])
+    resumo["motivos"] = dict(motivos)
+
+
+def ingestar_idempotente(
+    df: pd.DataFrame, template, hash_conteudo: str, arquivo_nome: str = None, modo: str = "ignorar",
+    tamanho_chunk: int = TAMANHO_CHUNK_INGESTAO,
+):
+    # Cada fatia commita junto com o avanco de linhas_concluidas; uma nova chamada pula o que ja entrou.
+    registro = iniciar_arquivo_ingerido(hash_conteudo, arquivo_nome)
+    resumo = resumo_arquivo_ingerido(registro, len(df))
+    if resumo["ja_ingerido"]:
+        return resumo
+    for posicao in range(registro["linhas_concluidas"], len(df), tamanho_chunk):
+        chunk = df.iloc[posicao:posicao + tamanho_chunk]
+        parcial = gravar_chunk_com_checkpoint(
+            chunk, template, hash_conteudo, posicao + len(chunk), arquivo_nome=arquivo_nome, modo=modo
+        )
+        acumular_resumo(resumo, parcial)
+    return resumo
@@ -0,0 +1,117 @@
+import csv
+import io
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Sequence, Tuple, Union
+
+from chardet.universaldetector import UniversalDetector
+
+DELIMITADORES_CANDIDATOS = (",", ";", "\t", "|")
+LINHAS_AMOSTRA = 50
+TAMANHO_BLOCO = 4096
+# Teto de bytes lidos pelo sniffer; o custo nao cresce com o tamanho do arquivo.
+LIMITE_BYTES = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Dialeto:
+    encoding: str = "utf-8"
+    delimitador: str = ","
+    quotechar: str = '"'
+    cabecalho: bool = True
+    # Menor entre a confianca do encoding e a consistencia do delimitador (0 a 1).
+    confianca: float = 0.0
+
+
+def _ler_amostra(filepath: Union[Path, str], linhas: int, limite_bytes: int) -> Tuple[bytes, str, float, bool]:
+    detector = UniversalDetector()
+    blocos = []
+    total = quebras = 0
+    fim_arquivo = False
+    with open(filepath, "rb") as f:
+        while total < limite_bytes:
+            bloco = f.read(TAMANHO_BLOCO)
+            if not bloco:
+                fim_arquivo = True
+                break
+            blocos.append(bloco)
+            total += len(bloco)
+            quebras += bloco.count(b"\n")
+            if not detector.done:
+                detector.feed(bloco)
+            # Para assim que o detector atingir seu limiar e houver linhas suficientes.
+            if detector.done and quebras > linhas:
+                break
+    detector.close()
+    resultado = detector.result
+    return b"".join(blocos), resultado["encoding"] or "utf-8", resultado["confidence"] or 0.0, fim_arquivo
+
+
+def _linhas_amostra(amostra: bytes, encoding: str, linhas: int, fim_arquivo: bool) -> List[str]:
+    texto = amostra.decode(encoding, errors="replace")
+    partes = texto.splitlines(keepends=True)
+    if not fim_arquivo and len(partes) > 1:
+        # A ultima linha pode ter sido cortada no meio do bloco.
+        partes = partes[:-1]
+    return [p for p in partes if p.strip()][:linhas + 1]
+
+
+def _pontuar(linhas: List[str], delimitador: str, quotechar: str) -> Tuple[float, int]:
+    leitor = csv.reader(io.StringIO("".join(linhas)), delimiter=delimitador, quotechar=quotechar)
+    try:
+        contagens = [len(campos) for campos in leitor]
+    except csv.Error:
+        return 0.0, 0
+    if not contagens:
+        return 0.0, 0
+    campos, frequencia = Counter(contagens).most_common(1)[0]
+    if campos < 2:
+        return 0.0, campos
+    return frequencia / len(contagens), campos
+
+
+def _escolher_delimitador(linhas: List[str], candidatos: Sequence[str]) -> Tuple[str, str, float]:
+    texto = "".join(linhas)
+    quotes = ['"'] if '"' in texto or "'" not in texto else ["'", '"']
+    melhor = (",", '"', 0.0, 0)
+    for quotechar in quotes:
+        for delimitador in candidatos:
+            consistencia, campos = _pontuar(linhas, delimitador, quotechar)
+            if (consistencia, campos) > (melhor[2], melhor[3]):
+                melhor = (delimitador, quotechar, consistencia, campos)
+    return melhor[0], melhor[1], melhor[2]
+
+
+def _parece_numero(valor: str) -> bool:
+    try:
+        float(valor.replace(",", "."))
+        return True
+    except ValueError:
+        return False
+
+
+def _tem_cabecalho(linhas: List[str], delimitador: str, quotechar: str) -> bool:
+    if not linhas:
+        return True
+    primeira = next(csv.reader([linhas[0]], delimiter=delimitador, quotechar=quotechar), [])
+    return not any(_parece_numero(campo) for campo in primeira if campo.strip())
+
+
+def detectar_dialeto(
+    filepath: Union[Path, str],
+    linhas: int = LINHAS_AMOSTRA,
+    limite_bytes: int = LIMITE_BYTES,
+    candidatos: Sequence[str] = DELIMITADORES_CANDIDATOS
+) -> Dialeto:
+    amostra, encoding, confianca_encoding, fim_arquivo = _ler_amostra(filepath, linhas, limite_bytes)
+    linhas_amostra = _linhas_amostra(amostra, encoding, linhas, fim_arquivo)
+    delimitador, quotechar, consistencia = _escolher_delimitador(linhas_amostra, candidatos)
+
+    return Dialeto(
+        encoding=encoding,
+        delimitador=delimitador,
+        quotechar=quotechar,
+        cabecalho=_tem_cabecalho(linhas_amostra, delimitador, quotechar),
+        confianca=min(confianca_encoding, consistencia),
+    )
@@ -0,0 +1,74 @@
+import ast
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+import pandas as pd
+
+from src.validation import carregar_csv
+
+LIMITE_CACHE_FUNCOES = 64
+# transformar(df) -> df roda sobre o DataFrame ja carregado; processar_csv(input, output)
+# continua aceito para scripts antigos do cache.
+CONTRATOS = ("transformar", "processar_csv")
+_cache_funcoes = OrderedDict()
+_lock_funcoes = threading.Lock()
+
+
+def hash_script(script_python: str) -> str:
+    return hashlib.sha256(script_python.encode("utf-8")).hexdigest()
+
+
+def detectar_contrato(script_python: str) -> Optional[str]:
+    # Sem executar o codigo: so olha as funcoes definidas no topo do modulo.
+    definidas = {no.name for no in ast.parse(script_python).body if isinstance(no, ast.FunctionDef)}
+    return next((nome for nome in CONTRATOS if nome in definidas), None)
+
+
+def compilar_script(script_python: str) -> Tuple[str, Callable]:
+    # Executa o modulo do script: so deve ser chamado dentro do worker do src.sandbox.
+    # LRU de funcoes ja resolvidas: o mesmo script replicado nao e recompilado a cada execucao.
+    chave = hash_script(script_python)
+    with _lock_funcoes:
+        compilado = _cache_funcoes.get(chave)
+        if compilado is not None:
+            _cache_funcoes.move_to_end(chave)
+            return compilado
+
+    codigo = compile(script_python, f"<script {chave[:8]}>", "exec")
+    escopo = {}
+    exec(codigo, escopo)
+    contrato = next((nome for nome in CONTRATOS if callable(escopo.get(nome))), None)
+    if contrato is None:
+        raise ValueError("O script nao define a funcao 'transformar' nem 'processar_csv'.")
+    compilado = (contrato, escopo[contrato])
+
+    with _lock_funcoes:
+        _cache_funcoes[chave] = compilado
+        while len(_cache_funcoes) > LIMITE_CACHE_FUNCOES:
+            _cache_funcoes.popitem(last=False)
+    return compilado
+
+
+def descartar_script_compilado(script_python: str = None):
+    with _lock_funcoes:
+        if script_python is None:
+            _cache_funcoes.clear()
+        else:
+            _cache_funcoes.pop(hash_script(script_python), None)
+
+
+def _executar_por_arquivo(processar_csv: Callable, input_path: Union[Path, str]) -> pd.DataFrame:
+    fd, output_path = tempfile.mkstemp(suffix="_fixed.csv")
+    os.close(fd)
+    try:
+        processar_csv(str(input_path), output_path)
+        if os.path.getsize(output_path) == 0:
+            raise ValueError("O script rodou mas nao gerou o arquivo de saida.")
+        return carregar_csv(output_path)
+    finally:
+        os.remove(output_path)
@@ -0,0 +1,299 @@
+"""
+Ingestao de arquivos grandes em fatias, com checkpoint por fatia.
+
+Cada fatia de N linhas e lida, normalizada e gravada numa transacao propria junto
+com o checkpoint (hash do conteudo, byte final, linhas concluidas) em
+arquivos_ingeridos. Uma nova execucao reposiciona o arquivo no byte do checkpoint;
+a memoria fica limitada ao tamanho da fatia.
+
+Com mais de um worker, as etapas se sobrepoem: uma thread le as fatias, um pool
+normaliza e valida, e uma unica thread grava no SQLite. As filas entre elas sao
+limitadas (backpressure) e o resumo traz a profundidade da fila e a utilizacao
+de cada etapa.
+
+Uso: python -m src.ingestao_incremental dados/grande.csv --chunk 50000 --workers 4
+"""
+import argparse
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from src.arquivos import hash_arquivo
+from src.db_handler import (
+    TAMANHO_CHUNK_INGESTAO, acumular_resumo, gravar_chunk_com_checkpoint, iniciar_arquivo_ingerido, registrar_log,
+    resumo_arquivo_ingerido,
+)
+from src.dialeto import Dialeto, detectar_dialeto
+from src.leitura import ler_csv
+from src.normalizacao import normalizar_dataframe
+from src.regras import avaliar_restricoes
+from src.template import carregar_template, como_compilado
+from src.validation import dtypes_template
+
+PROFUNDIDADE_FILA_POR_WORKER = 2
+INTERVALO_VERIFICACAO = 0.1
+
+
+def _ler_registros(f: BinaryIO, linhas: int, aspas: bytes) -> bytes:
+    bloco = b"".join(itertools.islice(f, linhas))
+    # Aspas em numero impar: o ultimo registro tem quebra de linha dentro de um campo.
+    while aspas and bloco.count(aspas) % 2:
+        linha = f.readline()
+        if not linha:
+            break
+        bloco += linha
+    return bloco
+
+
+def iterar_fatias(
+    caminho: str, dialeto: Dialeto, tamanho_chunk: int = TAMANHO_CHUNK_INGESTAO, offset_bytes: int = 0, dtype=None
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    # Devolve (fatia, byte logo apos ela); cada fatia e parseada com o cabecalho do arquivo.
+    aspas = dialeto.quotechar.encode(dialeto.encoding) if dialeto.quotechar else b""
+    with open(caminho, "rb") as f:
+        cabecalho = _ler_registros(f, 1, aspas) if dialeto.cabecalho else b""
+        if offset_bytes:
+            f.seek(offset_bytes)
+        while True:
+            bloco = _ler_registros(f, tamanho_chunk, aspas)
+            if not bloco.strip():
+                return
+            df, _ = ler_csv(io.BytesIO(cabecalho + bloco), dialeto, dtype)
+            yield df, f.tell()
+
+
+def _fatias_pendentes(
+    caminho: str, registro: dict, dialeto: Dialeto, tamanho_chunk: int, dtype
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    # Checkpoint sem byte (gravado pela ingestao em memoria): le do inicio e descarta as linhas ja gravadas.
+    pular = registro["linhas_concluidas"] if not registro["offset_bytes"] else 0
+    base = registro["linhas_concluidas"] - pular
+    for df, offset in iterar_fatias(caminho, dialeto, tamanho_chunk, registro["offset_bytes"], dtype):
+        df.index = pd.RangeIndex(base, base + len(df))
+        base += len(df)
+        if pular:
+            descartadas = min(pular, len(df))
+            df, pular = df.iloc[descartadas:], pular - descartadas
+        if not df.empty:
+            yield df, offset
+
+
+def _transformar_fatia(df: pd.DataFrame, template) -> Tuple[pd.DataFrame, dict, float]:
+    # Roda no pool: normalizacao e mascaras de restricao ficam fora da thread de escrita.
+    inicio = time.perf_counter()
+    df, _ = normalizar_dataframe(df, template)
+    restricoes = avaliar_restricoes(df, template)
+    return df, restricoes, time.perf_counter() - inicio
+
+
+class FilaMedida(queue.Queue):
+    """Fila limitada que amostra a propria profundidade a cada insercao."""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.profundidade_max = 0
+        self._soma_profundidade = 0
+        self._amostras = 0
+
+    def _put(self, item):
+        super()._put(item)
+        profundidade = self._qsize()
+        self.profundidade_max = max(self.profundidade_max, profundidade)
+        self._soma_profundidade += profundidade
+        self._amostras += 1
+
+    def metricas(self) -> dict:
+        return {
+            "capacidade": self.maxsize,
+            "profundidade_max": self.profundidade_max,
+            "profundidade_media": round(self._soma_profundidade / self._amostras, 2) if self._amostras else 0.0,
+        }
+
+
+class _Estagio:
+    def __init__(self, paralelismo: int = 1):
+        self.paralelismo = paralelismo
+        self.itens = 0
+        self.ocupado = 0.0
+        self.bloqueado = 0.0
+
+    def metricas(self, duracao: float) -> dict:
+        # Utilizacao = tempo trabalhando / (tempo total x threads ou processos do estagio).
+        return {
+            "itens": self.itens,
+            "paralelismo": self.paralelismo,
+            "ocupado_segundos": round(self.ocupado, 4),
+            "bloqueado_segundos": round(self.bloqueado, 4),
+            "utilizacao": round(self.ocupado / (duracao * self.paralelismo), 4) if duracao else 0.0,
+        }
+
+
+def _leitor(fatias, pool, template, fila: FilaMedida, estagio: _Estagio, parar: threading.Event, erros: list):
+    try:
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            item = next(fatias, None)
+            if item is None:
+                break
+            estagio.ocupado += time.perf_counter() - inicio
+            estagio.itens += 1
+            df, offset = item
+            futuro = pool.submit(_transformar_fatia, df, template)
+            inicio = time.perf_counter()
+            # Fila cheia = backpressure: o leitor espera a escrita em vez de acumular fatias na memoria.
+            while not parar.is_set():
+                try:
+                    fila.put((futuro, offset), timeout=INTERVALO_VERIFICACAO)
+                    break
+                except queue.Full:
+                    continue
+            estagio.bloqueado += time.perf_counter() - inicio
+    except BaseException as e:
+        erros.append(e)
+        parar.set()
+    finally:
+        fila.put(None)
+
+
+def _escritor(
+    fila: FilaMedida, gravar, resumo: dict, linhas: list, estagios: dict, parar: threading.Event, erros: list
+):
+    # Unica thread que escreve no SQLite; as fatias chegam na ordem de leitura, entao o checkpoint so avanca.
+    while True:
+        inicio = time.perf_counter()
+        item = fila.get()
+        if item is None:
+            return
+        futuro, offset = item
+        if parar.is_set():
+            futuro.cancel()
+            continue
+        try:
+            df, restricoes, duracao = futuro.result()
+            estagios["transformacao"].ocupado += duracao
+            estagios["transformacao"].itens += 1
+            estagios["escrita"].bloqueado += time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            linhas[0] += len(df)
+            acumular_resumo(resumo, gravar(df, linhas[0], offset, restricoes))
+            estagios["escrita"].ocupado += time.perf_counter() - inicio
+            estagios["escrita"].itens += 1
+        except BaseException as e:
+            erros.append(e)
+            parar.set()
+
+
+def _gravar_em_pipeline(fatias, tpl, gravar, resumo: dict, linhas_iniciais: int, workers: int,
+                        profundidade_fila: int, usar_processos: bool) -> Tuple[int, dict]:
+    inicio = time.perf_counter()
+    fila = FilaMedida(profundidade_fila)
+    estagios = {"leitura": _Estagio(), "transformacao": _Estagio(workers), "escrita": _Estagio()}
+    parar = threading.Event()
+    erros: list = []
+    linhas = [linhas_iniciais]
+    if usar_processos:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool:
+        leitor = threading.Thread(
+            target=_leitor, args=(fatias, pool, tpl, fila, estagios["leitura"], parar, erros), daemon=True
+        )
+        escritor = threading.Thread(
+            target=_escritor, args=(fila, gravar, resumo, linhas, estagios, parar, erros), daemon=True
+        )
+        leitor.start()
+        escritor.start()
+        leitor.join()
+        escritor.join()
+        if erros:
+            pool.shutdown(cancel_futures=True)
+            raise erros[0]
+
+    duracao = time.perf_counter() - inicio
+    metricas = {
+        "workers": workers,
+        "duracao_segundos": round(duracao, 4),
+        "fila": fila.metricas(),
+        "estagios": {nome: estagio.metricas(duracao) for nome, estagio in estagios.items()},
+    }
+    return linhas[0], metricas
+
+
+def ingestar_arquivo(
+    caminho: str,
+    template=None,
+    tamanho_chunk: int = TAMANHO_CHUNK_INGESTAO,
+    hash_conteudo: Optional[str] = None,
+    arquivo_nome: Optional[str] = None,
+    dialeto: Optional[Dialeto] = None,
+    modo: str = "ignorar",
+    workers: int = 1,
+    profundidade_fila: Optional[int] = None,
+    usar_processos: bool = True,
+) -> dict:
+    inicio = time.perf_counter()
+    tpl = como_compilado(template if template is not None else carregar_template())
+    arquivo_nome = arquivo_nome or os.path.basename(caminho)
+    hash_conteudo = hash_conteudo or hash_arquivo(caminho)
+
+    registro = iniciar_arquivo_ingerido(hash_conteudo, arquivo_nome)
+    resumo = resumo_arquivo_ingerido(registro)
+    if resumo["ja_ingerido"]:
+        return resumo
+
+    dialeto = dialeto or detectar_dialeto(caminho)
+    fatias = _fatias_pendentes(caminho, registro, dialeto, tamanho_chunk, dtypes_template(tpl))
+
+    def gravar(df, linhas, offset, restricoes=None):
+        return gravar_chunk_com_checkpoint(df, tpl, hash_conteudo, linhas, offset, arquivo_nome, modo, restricoes)
+
+    if workers > 1:
+        linhas, resumo["pipeline"] = _gravar_em_pipeline(
+            fatias, tpl, gravar, resumo, registro["linhas_concluidas"], workers,
+            profundidade_fila or PROFUNDIDADE_FILA_POR_WORKER * workers, usar_processos,
+        )
+    else:
+        linhas = registro["linhas_concluidas"]
+        for df, offset in fatias:
+            df, _ = normalizar_dataframe(df, tpl)
+            linhas += len(df)
+            acumular_resumo(resumo, gravar(df, linhas, offset))
+
+    resumo["total"] = linhas
+    resumo["log_id"] = registrar_log(
+        arquivo_nome, linhas, resumo["sucesso"], resumo["erro"], False, None, time.perf_counter() - inicio,
+        hash_conteudo=hash_conteudo,
+    )
+    return resumo
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ingestao de um CSV grande em fatias, com checkpoint.")
+    parser.add_argument("arquivo")
+    parser.add_argument("--chunk", type=int, default=TAMANHO_CHUNK_INGESTAO, help="Linhas por fatia/transacao")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processos de normalizacao/validacao; acima de 1 leitura, transformacao e escrita se sobrepoem")
+    parser.add_argument("--fila", type=int, default=None,
+                        help=f"Fatias em espera antes de o leitor parar (padrao: {PROFUNDIDADE_FILA_POR_WORKER} x workers)")
+    parser.add_argument("--template", default=None)
+    args = parser.parse_args(argv)
+
+    template = carregar_template(args.template) if args.template else None
+    resumo = ingestar_arquivo(args.arquivo, template, args.chunk, workers=args.workers, profundidade_fila=args.fila)
+    print(json.dumps(resumo, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import importlib.util
+from pathlib import Path
+from dataclasses import replace
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.dialeto import Dialeto
+
+PYARROW_DISPONIVEL = importlib.util.find_spec("pyarrow") is not None
+
+# Ordem de tentativa: os parsers nativos primeiro, o engine python so como ultimo recurso.
+BACKENDS_PADRAO: Tuple[str, ...] = ("pyarrow", "c", "python")
+ENCODINGS_COM_FALLBACK = {"utf-8", "utf8", "ascii"}
+
+
+def _ler_pyarrow(filepath, dialeto: Dialeto, dtype: Optional[Dict]) -> pd.DataFrame:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    tipos = {col: pa.string() for col, t in (dtype or {}).items() if t in (str, "str", "string", object)}
+    tabela = pa_csv.read_csv(
+        filepath,
+        read_options=pa_csv.ReadOptions(
+            encoding=dialeto.encoding,
+            autogenerate_column_names=not dialeto.cabecalho,
+        ),
+        parse_options=pa_csv.ParseOptions(delimiter=dialeto.delimitador, quote_char=dialeto.quotechar),
+        convert_options=pa_csv.ConvertOptions(column_types=tipos, strings_can_be_null=True),
+    )
+    # Mantem a mesma semantica dos parsers do pandas: datas ficam como texto
+    # e colunas totalmente vazias viram float com NaN.
+    for i, campo in enumerate(tabela.schema):
+        if pa.types.is_binary(campo.type):
+            # O pyarrow devolve binario quando o texto nao decodifica no encoding informado.
+            raise UnicodeDecodeError(dialeto.encoding, b"", 0, 1, f"coluna '{campo.name}' nao decodifica")
+        if pa.types.is_date(campo.type) or pa.types.is_timestamp(campo.type):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(pa.string()))
+        elif pa.types.is_null(campo.type):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(pa.float64()))
+    df = tabela.to_pandas()
+    for col in df.columns[df.dtypes == object]:
+        # pyarrow devolve None em colunas de texto; os parsers do pandas usam NaN.
+        valores = df[col].to_numpy(dtype=object)
+        valores[pd.isna(valores)] = np.nan
+        df[col] = valores
+    if not dialeto.cabecalho:
+        df.columns = range(len(df.columns))
+    return df
+
+
+def _ler_pandas(filepath, dialeto: Dialeto, dtype: Optional[Dict], engine: str) -> pd.DataFrame:
+    return pd.read_csv(
+        filepath,
+        encoding=dialeto.encoding,
+        sep=dialeto.delimitador,
+        quotechar=dialeto.quotechar,
+        header=0 if dialeto.cabecalho else None,
+        dtype=dtype,
+        engine=engine,
+    )
+
+
+def _erro_de_encoding(erro: Exception) -> bool:
+    # O pyarrow sinaliza UTF-8 invalido com ArrowInvalid, nao com UnicodeDecodeError.
+    return isinstance(erro, UnicodeDecodeError) or (type(erro).__name__ == "ArrowInvalid" and "UTF8" in str(erro))
+
+
+def backends_disponiveis(backends: Sequence[str] = BACKENDS_PADRAO) -> Tuple[str, ...]:
+    return tuple(b for b in backends if b != "pyarrow" or PYARROW_DISPONIVEL)
+
+
+def tentativas_encoding(dialeto: Dialeto) -> Tuple[Dialeto, ...]:
+    # O sniffer so ve o inicio do arquivo: "ascii"/"utf-8" pode esconder um byte latin-1 mais adiante.
+    if dialeto.encoding.lower() in ENCODINGS_COM_FALLBACK:
+        return dialeto, replace(dialeto, encoding="latin-1")
+    return (dialeto,)
+
+
+def ler_csv(
+    filepath: Union[Path, str],
+    dialeto: Dialeto,
+    dtype: Optional[Dict] = None,
+    backends: Sequence[str] = BACKENDS_PADRAO
+) -> Tuple[pd.DataFrame, str]:
+    erros = []
+    erro_encoding = None
+    for tentativa in tentativas_encoding(dialeto):
+        erro_encoding = None
+        for backend in backends_disponiveis(backends):
+            if hasattr(filepath, "seek"):
+                # Buffers em memoria (fatias da ingestao por chunks) sao relidos do inicio a cada tentativa.
+                filepath.seek(0)
+            try:
+                if backend == "pyarrow":
+                    df = _ler_pyarrow(filepath, tentativa, dtype)
+                else:
+                    df = _ler_pandas(filepath, tentativa, dtype, backend)
+                return df, backend
+            except Exception as e:
+                if _erro_de_encoding(e):
+                    # Encoding errado falha em qualquer backend: pula direto para o proximo encoding.
+                    erro_encoding = e
+                    break
+                erros.append(e)
+        if erro_encoding is None:
+            # Falha de estrutura nao se resolve trocando o encoding: devolve a primeira causa.
+            break
+    raise erros[0] if erros else erro_encoding
@@ -0,0 +1,119 @@
+from typing import Tuple, Union
+
+import pandas as pd
+
+from src.template import ColunaCompilada, CompiledTemplate, como_compilado, normalizar_chave
+
+FORMATOS_DATA = {
+    "YYYY-MM-DD": "%Y-%m-%d",
+    "DD/MM/YYYY": "%d/%m/%Y",
+    "DD-MM-YYYY": "%d-%m-%Y",
+    "MM/DD/YYYY": "%m/%d/%Y",
+}
+FORMATO_DATA_SAIDA = "%Y-%m-%d"
+
+
+def _normalizar_datas(serie: pd.Series, config: ColunaCompilada) -> Tuple[pd.Series, int]:
+    texto = serie.astype("string").str.strip()
+    formatos = [f for f in (config.formatos_aceitos or ("YYYY-MM-DD",)) if f in FORMATOS_DATA]
+    datas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    if "YYYY-MM-DD" in formatos:
+        formatos.remove("YYYY-MM-DD")
+        datas = pd.to_datetime(texto, format=FORMATOS_DATA["YYYY-MM-DD"], errors="coerce")
+    pendentes = datas.isna() & texto.notna()
+    if formatos and pendentes.any():
+        # Um unico formato para a coluna (o que converte mais linhas; empate fica com a ordem do template):
+        # misturar DD/MM e MM/DD no mesmo arquivo gravaria datas trocadas sem erro.
+        tentativas = {f: pd.to_datetime(texto[pendentes], format=FORMATOS_DATA[f], errors="coerce") for f in formatos}
+        escolhido = max(formatos, key=lambda f: tentativas[f].notna().sum())
+        datas[pendentes] = tentativas[escolhido]
+    convertidas = datas.notna()
+    saida = serie.where(~convertidas, datas.dt.strftime(FORMATO_DATA_SAIDA))
+    alteradas = int((convertidas & (saida != serie)).sum())
+    return saida, alteradas
+
+
+REGEX_MILHAR_PONTO = r"^-?\d{1,3}(\.\d{3})+$"
+
+
+def _normalizar_valores(serie: pd.Series) -> Tuple[pd.Series, int]:
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie, 0
+    bruto = serie.astype("string")
+    texto = bruto.str.replace("R$", "", regex=False).str.replace(r"\s+", "", regex=True)
+    ultima_virgula = texto.str.rfind(",")
+    ultimo_ponto = texto.str.rfind(".")
+    # Virgula depois do ultimo ponto indica formato brasileiro (1.234,56). Pontos so agrupando
+    # milhares (1.234.567) ou valores com R$ sem virgula (R$ 1.500) tambem sao brasileiros; o resto e 1,234.56.
+    brasileiro = (
+        (ultima_virgula > ultimo_ponto)
+        | texto.str.match(REGEX_MILHAR_PONTO)
+        | (bruto.str.contains("R$", regex=False) & (ultima_virgula == -1))
+    ).fillna(False)
+    texto = texto.where(
+        ~brasileiro,
+        texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+    )
+    texto = texto.where(brasileiro, texto.str.replace(",", "", regex=False))
+    numeros = pd.to_numeric(texto, errors="coerce")
+    convertidos = numeros.notna()
+    if convertidos.all():
+        return numeros.astype(float), int(serie.notna().sum())
+    return serie.where(~convertidos, numeros), int(convertidos.sum())
+
+
+def _normalizar_enum(serie: pd.Series, config: ColunaCompilada) -> Tuple[pd.Series, int, int]:
+    # Poucos valores distintos por coluna: normalizar_chave roda uma vez por valor unico.
+    chaves = {v: config.mapeamento.get(normalizar_chave(v)) for v in serie.dropna().unique()}
+    mapeados = serie.map(chaves)
+    saida = serie.where(mapeados.isna(), mapeados)
+    alterados = int((mapeados.notna() & (saida != serie)).sum())
+    preenchidos = 0
+    if config.default is not None:
+        nulos = saida.isna()
+        preenchidos = int(nulos.sum())
+        saida = saida.where(~nulos, config.default)
+    return saida.astype(object), alterados, preenchidos
+
+
+def normalizar_dataframe(df: pd.DataFrame, template: Union[dict, CompiledTemplate]) -> Tuple[pd.DataFrame, dict]:
+    tpl = como_compilado(template)
+    relatorio = {
+        "colunas_renomeadas": {},
+        "colunas_desconhecidas": [],
+        "datas_convertidas": {},
+        "valores_convertidos": {},
+        "enums_mapeados": {},
+        "defaults_aplicados": {},
+    }
+
+    renomear = {}
+    for col in df.columns:
+        canonico = tpl.canonico(col)
+        if col not in tpl.colunas and canonico and canonico not in df.columns and canonico not in renomear.values():
+            renomear[col] = canonico
+    df = df.rename(columns=renomear)
+    relatorio["colunas_renomeadas"] = renomear
+
+    # Colunas sem alias ficam no frame: a IA ou um script do cache ainda podem renomea-las.
+    relatorio["colunas_desconhecidas"] = [col for col in df.columns if col not in tpl.colunas]
+
+    for col, config in tpl.colunas.items():
+        if col not in df.columns:
+            continue
+        if config.tipo == "DATE":
+            df[col], n = _normalizar_datas(df[col], config)
+            if n:
+                relatorio["datas_convertidas"][col] = n
+        elif config.tipo == "DECIMAL":
+            df[col], n = _normalizar_valores(df[col])
+            if n:
+                relatorio["valores_convertidos"][col] = n
+        elif config.mapeamento:
+            df[col], n, preenchidos = _normalizar_enum(df[col], config)
+            if n:
+                relatorio["enums_mapeados"][col] = n
+            if preenchidos:
+                relatorio["defaults_aplicados"][col] = preenchidos
+
+    return df, relatorio
@@ -0,0 +1,150 @@
+"""
+Spans leves por etapa do pipeline (tempo, linhas e RSS amostrado).
+
+Sem um rastreamento ativo, `etapa()` nao mede nada: o custo fica perto de zero
+fora da ingestao. Com PIPELINE_PERFIL_DIR definido, `rastrear()` tambem grava um
+dump do cProfile e do tracemalloc para arquivos lentos.
+"""
+import contextvars
+import cProfile
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import List, Optional
+
+LIMIAR_PERFIL_PADRAO = 5.0
+TOP_ALOCACOES = 25
+
+_rastreador_atual: contextvars.ContextVar = contextvars.ContextVar("rastreador_atual", default=None)
+
+
+def resetar_pico_memoria():
+    # Zera o VmHWM do processo (Linux >= 4.0) para medir o pico de cada trecho.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def memoria_residente_mb() -> Optional[float]:
+    # So le o VmRSS: nao mexe em estado do processo, entao sessoes e threads concorrentes nao se atrapalham.
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def pico_memoria_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+class Rastreador:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas: List[dict] = []
+        self._pilha: List[dict] = []
+
+    @contextmanager
+    def etapa(self, nome: str, linhas: Optional[int] = None):
+        pai = self._pilha[-1] if self._pilha else None
+        span = {
+            "ordem": len(self.etapas),
+            "pai": pai["ordem"] if pai else None,
+            "etapa": nome,
+            "inicio_segundos": time.perf_counter() - self.inicio,
+            "duracao_segundos": None,
+            "linhas": linhas,
+            "rss_amostrado_mb": None,
+        }
+        self.etapas.append(span)
+        self._pilha.append(span)
+        # Sem resetar o VmHWM (que e do processo inteiro): vale o maior RSS amostrado na entrada e
+        # na saida desta etapa e das filhas. Nao e o pico: alocacoes liberadas entre amostras escapam.
+        memoria_inicio = memoria_residente_mb() or 0
+        inicio = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["duracao_segundos"] = time.perf_counter() - inicio
+            filhos = [e["rss_amostrado_mb"] or 0 for e in self.etapas[span["ordem"] + 1:] if e["pai"] == span["ordem"]]
+            span["rss_amostrado_mb"] = max([memoria_inicio, memoria_residente_mb() or 0] + filhos)
+            self._pilha.pop()
+
+    def anexar(self, etapas: List[dict]):
+        # Junta spans vindos de outro processo/rerun, renumerando ordem e pai.
+        deslocamento = len(self.etapas)
+        for span in etapas:
+            novo = dict(span)
+            novo["ordem"] += deslocamento
+            if novo["pai"] is not None:
+                novo["pai"] += deslocamento
+            self.etapas.append(novo)
+
+
+def rastreador_atual() -> Optional[Rastreador]:
+    return _rastreador_atual.get()
+
+
+@contextmanager
+def etapa(nome: str, linhas: Optional[int] = None):
+    rastreador = _rastreador_atual.get()
+    if rastreador is None:
+        yield {}
+        return
+    with rastreador.etapa(nome, linhas) as span:
+        yield span
+
+
+def _dump_perfil(pasta: str, nome: str, perfil: cProfile.Profile, memoria):
+    os.makedirs(pasta, exist_ok=True)
+    nome_seguro = re.sub(r"[^\w.-]", "_", nome)
+    base = os.path.join(pasta, f"{time.strftime('%Y%m%d-%H%M%S')}_{nome_seguro}")
+    perfil.dump_stats(base + ".prof")
+    with open(base + "_memoria.txt", "w", encoding="utf-8") as f:
+        for estatistica in memoria.statistics("lineno")[:TOP_ALOCACOES]:
+            f.write(f"{estatistica}\n")
+
+
+@contextmanager
+def rastrear(nome: str = "ingestao", pasta_perfil: Optional[str] = None, limiar_perfil: Optional[float] = None):
+    pasta_perfil = pasta_perfil or os.getenv("PIPELINE_PERFIL_DIR")
+    if limiar_perfil is None:
+        limiar_perfil = float(os.getenv("PIPELINE_PERFIL_LIMIAR", LIMIAR_PERFIL_PADRAO))
+    rastreador = Rastreador()
+    token = _rastreador_atual.set(rastreador)
+    perfil = None
+    iniciou_tracemalloc = False
+    if pasta_perfil:
+        perfil = cProfile.Profile()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            iniciou_tracemalloc = True
+        perfil.enable()
+    try:
+        yield rastreador
+    finally:
+        _rastreador_atual.reset(token)
+        if perfil is not None:
+            perfil.disable()
+            if time.perf_counter() - rastreador.inicio >= limiar_perfil:
+                _dump_perfil(pasta_perfil, nome, perfil, tracemalloc.take_snapshot())
+            if iniciou_tracemalloc:
+                tracemalloc.stop()
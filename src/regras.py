@@ -0,0 +1,110 @@
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.template import ColunaCompilada, CompiledTemplate, como_compilado
+
+MAX_REGRAS = 64
+
+
+def _mascaras_coluna(serie: pd.Series, config: ColunaCompilada) -> List[Tuple[str, pd.Series]]:
+    presentes = serie.notna()
+    mascaras = []
+
+    if config.obrigatorio:
+        mascaras.append(("nulo", ~presentes))
+
+    if config.tipo == "DECIMAL":
+        numeros = pd.to_numeric(serie, errors="coerce")
+        mascaras.append(("numerico", presentes & numeros.isna()))
+        if config.minimo is not None or config.maximo is not None:
+            minimo = config.minimo if config.minimo is not None else -np.inf
+            maximo = config.maximo if config.maximo is not None else np.inf
+            mascaras.append(("faixa", numeros.notna() & ~numeros.between(minimo, maximo)))
+        if config.casas_decimais is not None:
+            # Tolerancia absoluta: com a relativa padrao do isclose, 99999.999 passaria como 2 casas.
+            arredondados = numeros.round(config.casas_decimais)
+            mascaras.append(("casas_decimais", numeros.notna() & ~np.isclose(numeros, arredondados, rtol=0, atol=1e-6)))
+        return mascaras
+
+    if config.tipo == "DATE":
+        if not pd.api.types.is_datetime64_any_dtype(serie):
+            datas = pd.to_datetime(serie, format="%Y-%m-%d", errors="coerce")
+            mascaras.append(("data", presentes & datas.isna()))
+        return mascaras
+
+    if config.valores_permitidos is not None:
+        # Mesma regra do validar_enum: a caixa nao importa ("pix" vale como "PIX").
+        maiusculas = serie.astype("string").str.upper()
+        mascaras.append(("enum", presentes & ~maiusculas.isin(config.valores_permitidos).fillna(False)))
+
+    if config.pattern is not None or config.min_length is not None or config.max_length is not None:
+        texto = serie.astype(str)
+        if config.pattern is not None:
+            mascaras.append(("pattern", presentes & ~texto.str.fullmatch(config.pattern)))
+        if config.min_length is not None or config.max_length is not None:
+            tamanho = texto.str.len()
+            fora = pd.Series(False, index=serie.index)
+            if config.min_length is not None:
+                fora |= tamanho < config.min_length
+            if config.max_length is not None:
+                fora |= tamanho > config.max_length
+            mascaras.append(("tamanho", presentes & fora))
+
+    return mascaras
+
+
+def avaliar_restricoes(df: pd.DataFrame, template: Union[dict, CompiledTemplate]) -> dict:
+    tpl = como_compilado(template)
+    bitmap = np.zeros(len(df), dtype=np.uint64)
+    regras = []
+    contagens = {}
+
+    for col, config in tpl.colunas.items():
+        if col not in df.columns:
+            continue
+        for regra, mascara in _mascaras_coluna(df[col], config):
+            bit = len(regras)
+            if bit >= MAX_REGRAS:
+                raise ValueError(f"Template tem mais de {MAX_REGRAS} restricoes de linha.")
+            valores = mascara.to_numpy(dtype=bool)
+            bitmap[valores] |= np.uint64(1 << bit)
+            regras.append({"bit": bit, "coluna": col, "regra": regra})
+            contagens[f"{col}:{regra}"] = int(valores.sum())
+
+    linhas_validas = bitmap == 0
+    return {
+        "valido": bool(linhas_validas.all()),
+        "bitmap": bitmap,
+        "regras": regras,
+        "contagens": contagens,
+        "linhas_validas": linhas_validas,
+        "total_linhas_invalidas": int((~linhas_validas).sum()),
+    }
+
+
+def motivos_violacao(resultado: dict, index: pd.Index = None) -> pd.Series:
+    # Codigos "coluna:regra" separados por ';' para cada linha (vazio se a linha e valida).
+    bitmap = resultado["bitmap"]
+    motivos = pd.Series("", index=index if index is not None else pd.RangeIndex(len(bitmap)), dtype=object)
+    for regra in resultado["regras"]:
+        marcadas = (bitmap & np.uint64(1 << regra["bit"])) != 0
+        if not marcadas.any():
+            continue
+        codigo = f"{regra['coluna']}:{regra['regra']}"
+        atuais = motivos[marcadas]
+        motivos[marcadas] = np.where(atuais == "", codigo, atuais + ";" + codigo)
+    return motivos
+
+
+def regra_restricoes_linhas(df: pd.DataFrame, template: CompiledTemplate) -> List[dict]:
+    resultado = avaliar_restricoes(df, template)
+    if resultado["valido"]:
+        return []
+    violacoes: Dict[str, int] = {k: v for k, v in resultado["contagens"].items() if v}
+    return [{
+        "tipo": "restricoes_linhas",
+        "linhas": resultado["total_linhas_invalidas"],
+        "violacoes": violacoes
+    }]
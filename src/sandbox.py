@@ -0,0 +1,280 @@
+"""
+Execucao isolada dos scripts de transformacao em processos pre-aquecidos.
+
+Cada job roda num worker com pandas ja importado, limite de memoria (RLIMIT_AS)
+e tempo limite de parede; o DataFrame vai e volta por memoria compartilhada
+serializado em Arrow IPC, sem CSV temporario.
+"""
+import atexit
+import builtins
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import pandas as pd
+
+from src.executor import detectar_contrato
+from src.leitura import PYARROW_DISPONIVEL
+from src.rastreamento import pico_memoria_mb, resetar_pico_memoria
+
+TEMPO_LIMITE_PADRAO = 60.0
+LIMITE_MEMORIA_PADRAO = 2 * 1024 ** 3
+WORKERS_PADRAO = 2
+
+
+def _serializar(df: pd.DataFrame) -> Tuple[str, bytes]:
+    if PYARROW_DISPONIVEL:
+        import pyarrow as pa
+        # attrs (o Dialeto do carregar_csv) nao cabe no metadata JSON do Arrow e geraria um aviso por job.
+        sem_attrs = df.copy(deep=False)
+        sem_attrs.attrs = {}
+        try:
+            tabela = pa.Table.from_pandas(sem_attrs)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+            return "arrow", sink.getvalue().to_pybytes()
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # Colunas object com tipos misturados nao viram Arrow; cai no pickle.
+            pass
+    return "pickle", pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _desserializar(formato: str, dados) -> pd.DataFrame:
+    if formato == "arrow":
+        import pyarrow as pa
+        df = pa.ipc.open_stream(pa.py_buffer(dados)).read_pandas()
+        for col in df.columns[df.dtypes == object]:
+            # Mesma semantica dos parsers do pandas: faltantes em texto sao NaN, nao None.
+            df[col] = df[col].where(df[col].notna(), float("nan"))
+        return df
+    return pickle.loads(dados)
+
+
+def _escrever_compartilhado(df: pd.DataFrame) -> Tuple[str, str, int]:
+    formato, dados = _serializar(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(dados), 1))
+    shm.buf[:len(dados)] = dados
+    nome = shm.name
+    shm.close()
+    return nome, formato, len(dados)
+
+
+def _ler_compartilhado(nome: str, formato: str, tamanho: int) -> pd.DataFrame:
+    shm = shared_memory.SharedMemory(name=nome)
+    try:
+        return _desserializar(formato, bytes(shm.buf[:tamanho]))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _loop_worker(conexao, limite_memoria: Optional[int]):
+    if limite_memoria:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (limite_memoria, limite_memoria))
+        except (ImportError, ValueError, OSError):
+            pass
+    # Pre-aquece: o primeiro job nao paga a importacao do executor/pandas/pyarrow.
+    from src.executor import _executar_por_arquivo, compilar_script
+    if PYARROW_DISPONIVEL:
+        import pyarrow  # noqa: F401
+
+    while True:
+        try:
+            job = conexao.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        script_python, entrada, input_path = job
+        resetar_pico_memoria()
+        cpu_inicio = time.process_time()
+        try:
+            contrato, funcao = compilar_script(script_python)
+            if contrato == "transformar":
+                df = _ler_compartilhado(*entrada) if entrada else None
+                if df is None:
+                    from src.validation import carregar_csv
+                    df = carregar_csv(input_path)
+                saida = funcao(df)
+                if not isinstance(saida, pd.DataFrame):
+                    raise ValueError("A funcao 'transformar' deve retornar um DataFrame.")
+            else:
+                if input_path is None:
+                    raise ValueError("Scripts com 'processar_csv' precisam do caminho do arquivo de entrada.")
+                saida = _executar_por_arquivo(funcao, input_path)
+            resultado = _escrever_compartilhado(saida)
+            metricas = {"cpu_segundos": time.process_time() - cpu_inicio, "pico_memoria_mb": pico_memoria_mb()}
+            conexao.send(("ok", resultado, metricas))
+        except BaseException as e:
+            conexao.send(("erro", type(e).__name__, str(e), traceback.format_exc()))
+
+
+class _Worker:
+    def __init__(self, contexto, limite_memoria):
+        self.conexao, filho = contexto.Pipe()
+        self.processo = contexto.Process(target=_loop_worker, args=(filho, limite_memoria), daemon=True)
+        self.processo.start()
+        filho.close()
+
+    def encerrar(self, forcar: bool = False):
+        if not forcar and self.processo.is_alive():
+            try:
+                self.conexao.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.processo.join(1)
+        if self.processo.is_alive():
+            self.processo.kill()
+            self.processo.join()
+        self.conexao.close()
+
+
+class PoolSandbox:
+    """Pool de processos que executa scripts de transformacao com tempo e memoria limitados."""
+
+    def __init__(
+        self,
+        workers: int = WORKERS_PADRAO,
+        tempo_limite: float = TEMPO_LIMITE_PADRAO,
+        limite_memoria: Optional[int] = LIMITE_MEMORIA_PADRAO,
+    ):
+        self.tempo_limite = tempo_limite
+        self.limite_memoria = limite_memoria
+        self._contexto = multiprocessing.get_context("spawn")
+        self._livres: "queue.Queue[_Worker]" = queue.Queue()
+        self._todos = []
+        self._lock = threading.Lock()
+        self._fechado = False
+        for _ in range(workers):
+            self._devolver(self._novo_worker())
+
+    def _novo_worker(self) -> _Worker:
+        worker = _Worker(self._contexto, self.limite_memoria)
+        with self._lock:
+            self._todos.append(worker)
+        return worker
+
+    def _descartar(self, worker: _Worker):
+        with self._lock:
+            self._todos.remove(worker)
+        worker.encerrar(forcar=True)
+
+    def _devolver(self, worker: _Worker):
+        self._livres.put(worker)
+
+    def executar(
+        self,
+        script_python: str,
+        df: Optional[pd.DataFrame] = None,
+        input_path: Optional[Union[Path, str]] = None,
+        tempo_limite: Optional[float] = None,
+    ) -> Tuple[pd.DataFrame, dict]:
+        if self._fechado:
+            raise RuntimeError("Pool de execucao encerrado.")
+        tempo_limite = tempo_limite or self.tempo_limite
+        contrato = detectar_contrato(script_python)
+        if contrato is None:
+            raise ValueError("O script nao define a funcao 'transformar' nem 'processar_csv'.")
+        # So o contrato em memoria precisa do DataFrame; processar_csv le o proprio arquivo.
+        entrada = _escrever_compartilhado(df) if df is not None and contrato == "transformar" else None
+        worker = self._livres.get()
+        inicio = time.perf_counter()
+        try:
+            worker.conexao.send((script_python, entrada, str(input_path) if input_path is not None else None))
+            if not worker.conexao.poll(tempo_limite):
+                self._descartar(worker)
+                worker = None
+                raise TimeoutError(f"O script excedeu o tempo limite de {tempo_limite:.0f}s.")
+            resposta = worker.conexao.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            # Worker morreu (estouro de memoria, segfault...): troca por um novo.
+            self._descartar(worker)
+            worker = None
+            raise RuntimeError("O processo do script foi encerrado inesperadamente.")
+        finally:
+            if entrada is not None:
+                _liberar_compartilhado(entrada[0])
+            if worker is None and not self._fechado:
+                self._devolver(self._novo_worker())
+            elif worker is not None:
+                self._devolver(worker)
+
+        if resposta[0] == "erro":
+            _, tipo, mensagem, detalhe = resposta
+            excecao = getattr(builtins, tipo, None)
+            if not (isinstance(excecao, type) and issubclass(excecao, Exception)):
+                excecao = RuntimeError
+                mensagem = f"{tipo}: {mensagem}"
+            erro = excecao(mensagem)
+            erro.traceback_script = detalhe
+            raise erro
+
+        _, resultado, metricas = resposta
+        metricas["duracao_segundos"] = time.perf_counter() - inicio
+        return _ler_compartilhado(*resultado), metricas
+
+    def fechar(self):
+        self._fechado = True
+        with self._lock:
+            workers, self._todos = self._todos, []
+        for worker in workers:
+            worker.encerrar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def _liberar_compartilhado(nome: str):
+    # O worker normalmente ja leu e liberou; em timeout/erro o bloco ainda existe.
+    try:
+        shm = shared_memory.SharedMemory(name=nome)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+_pool_padrao: Optional[PoolSandbox] = None
+_lock_pool = threading.Lock()
+
+
+def pool_padrao() -> PoolSandbox:
+    global _pool_padrao
+    with _lock_pool:
+        if _pool_padrao is None or _pool_padrao._fechado:
+            # 0 desliga o RLIMIT_AS (plataformas sem resource ou cargas que precisam de mais de 2 GiB).
+            memoria_mb = int(os.getenv("PIPELINE_SANDBOX_MEMORIA_MB", LIMITE_MEMORIA_PADRAO // 1024 ** 2))
+            _pool_padrao = PoolSandbox(
+                workers=int(os.getenv("PIPELINE_SANDBOX_WORKERS", WORKERS_PADRAO)),
+                tempo_limite=float(os.getenv("PIPELINE_SANDBOX_TIMEOUT", TEMPO_LIMITE_PADRAO)),
+                limite_memoria=memoria_mb * 1024 ** 2 or None,
+            )
+        return _pool_padrao
+
+
+def executar_isolado(
+    script_python: str,
+    df: Optional[pd.DataFrame] = None,
+    input_path: Optional[Union[Path, str]] = None,
+    tempo_limite: Optional[float] = None,
+) -> Tuple[pd.DataFrame, dict]:
+    return pool_padrao().executar(script_python, df, input_path, tempo_limite)
+
+
+@atexit.register
+def _encerrar_pool_padrao():
+    if _pool_padrao is not None:
+        _pool_padrao.fechar()
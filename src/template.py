@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional, Pattern, Tuple, Union
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_PATH = os.path.join(BASE_DIR, "..", "database", "template.json")
+
+# Quantos templates em formato dict ficam compilados em memoria.
+LIMITE_CACHE_DICTS = 8
+
+
+def normalizar_chave(valor: Any) -> str:
+    # Sem caixa nem acentos: "Data", "DATA" e "dáta" caem na mesma chave.
+    texto = unicodedata.normalize("NFKD", str(valor).strip().casefold())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+@dataclass(frozen=True)
+class ColunaCompilada:
+    nome: str
+    tipo: str
+    obrigatorio: bool = False
+    aliases: Tuple[str, ...] = ()
+    pattern: Optional[Pattern] = None
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    casas_decimais: Optional[int] = None
+    formatos_aceitos: Tuple[str, ...] = ()
+    valores_permitidos: Optional[FrozenSet[str]] = None
+    # Chaves normalizadas com normalizar_chave; inclui os proprios valores permitidos.
+    mapeamento: Dict[str, str] = field(default_factory=dict)
+    default: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    bruto: dict
+    colunas: Dict[str, ColunaCompilada]
+    alias_para_canonico: Dict[str, str]
+    obrigatorias: Tuple[str, ...]
+
+    # Mantem compatibilidade com o codigo que acessa o template como dict.
+    def __getitem__(self, chave: str) -> Any:
+        return self.bruto[chave]
+
+    def get(self, chave: str, default: Any = None) -> Any:
+        return self.bruto.get(chave, default)
+
+    def canonico(self, coluna: str) -> Optional[str]:
+        if coluna in self.colunas:
+            return coluna
+        return self.alias_para_canonico.get(normalizar_chave(coluna))
+
+
+def _compilar_coluna(nome: str, config: dict) -> ColunaCompilada:
+    validacao = config.get("validacao", {})
+    permitidos = validacao.get("valores_permitidos")
+    mapeamento = {}
+    if permitidos is not None:
+        mapeamento.update({normalizar_chave(v): v for v in permitidos})
+    for origem, destino in validacao.get("mapeamento", {}).items():
+        mapeamento.setdefault(normalizar_chave(origem), destino)
+
+    pattern = validacao.get("pattern")
+    return ColunaCompilada(
+        nome=nome,
+        tipo=str(config.get("tipo_dado", config.get("tipo", ""))).upper(),
+        obrigatorio=bool(config.get("obrigatorio", False)),
+        aliases=tuple(config.get("aliases", [])),
+        pattern=re.compile(pattern) if pattern else None,
+        min_length=validacao.get("min_length"),
+        max_length=validacao.get("max_length"),
+        minimo=validacao.get("min"),
+        maximo=validacao.get("max"),
+        casas_decimais=validacao.get("casas_decimais"),
+        formatos_aceitos=tuple(dict.fromkeys(
+            ([validacao["formato_esperado"]] if "formato_esperado" in validacao else [])
+            + validacao.get("formatos_aceitos", [])
+        )),
+        valores_permitidos=frozenset(permitidos) if permitidos is not None else None,
+        mapeamento=mapeamento,
+        default=validacao.get("default"),
+    )
+
+
+def compilar_template(template: dict) -> CompiledTemplate:
+    colunas = {nome: _compilar_coluna(nome, config) for nome, config in template["colunas"].items()}
+    alias_para_canonico = {}
+    for nome, coluna in colunas.items():
+        for alias in (nome,) + coluna.aliases:
+            # Chaves via normalizar_chave; em caso de alias repetido vale a primeira coluna do template.
+            alias_para_canonico.setdefault(normalizar_chave(alias), nome)
+    return CompiledTemplate(
+        bruto=template,
+        colunas=colunas,
+        alias_para_canonico=alias_para_canonico,
+        obrigatorias=tuple(nome for nome, c in colunas.items() if c.obrigatorio),
+    )
+
+
+_cache_dicts: "OrderedDict[int, Tuple[dict, CompiledTemplate]]" = OrderedDict()
+_cache_arquivos: Dict[str, Tuple[int, CompiledTemplate]] = {}
+
+
+def como_compilado(template: Union[dict, CompiledTemplate]) -> CompiledTemplate:
+    if isinstance(template, CompiledTemplate):
+        return template
+    # O dict fica referenciado no cache, entao o id nao e reaproveitado enquanto a entrada existir.
+    entrada = _cache_dicts.get(id(template))
+    if entrada is not None and entrada[0] is template:
+        _cache_dicts.move_to_end(id(template))
+        return entrada[1]
+    compilado = compilar_template(template)
+    _cache_dicts[id(template)] = (template, compilado)
+    if len(_cache_dicts) > LIMITE_CACHE_DICTS:
+        _cache_dicts.popitem(last=False)
+    return compilado
+
+
+def carregar_template(caminho: Union[Path, str] = TEMPLATE_PATH) -> CompiledTemplate:
+    caminho = os.path.abspath(caminho)
+    mtime = os.stat(caminho).st_mtime_ns
+    entrada = _cache_arquivos.get(caminho)
+    if entrada is not None and entrada[0] == mtime:
+        return entrada[1]
+    with open(caminho, "r", encoding="utf-8") as f:
+        compilado = compilar_template(json.load(f))
+    _cache_arquivos[caminho] = (mtime, compilado)
+    return compilado
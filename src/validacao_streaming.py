@@ -0,0 +1,226 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from src.dialeto import Dialeto, detectar_dialeto
+from src.leitura import tentativas_encoding
+from src.validation import (
+    _regra_colunas_obrigatorias,
+    _regra_nomes_colunas,
+    REGEX_DATA_BR,
+    REGEX_DATA_ISO,
+    _resultado,
+)
+from src.template import CompiledTemplate, como_compilado
+
+TAMANHO_CHUNK_PADRAO = 50_000
+# Limite de amostras guardadas por acumulador (offsets e valores invalidos),
+# para que a memoria nao cresca com o tamanho do arquivo.
+LIMITE_AMOSTRAS = 1_000
+
+
+@dataclass
+class AcumuladorData:
+    total: int = 0
+    matches_iso: int = 0
+    matches_br: int = 0
+    total_invalidas: int = 0
+    linhas_invalidas: List[int] = field(default_factory=list)
+
+    def atualizar(self, serie: pd.Series) -> None:
+        valores = serie.astype(str)
+        matches = valores.str.match(REGEX_DATA_ISO)
+        self.total += len(valores)
+        self.matches_iso += int(matches.sum())
+        self.matches_br += int(valores.str.match(REGEX_DATA_BR).sum())
+        invalidas = serie.index[~matches]
+        self.total_invalidas += len(invalidas)
+        espaco = LIMITE_AMOSTRAS - len(self.linhas_invalidas)
+        if espaco > 0:
+            self.linhas_invalidas.extend(invalidas[:espaco].tolist())
+
+    def mesclar(self, outro: "AcumuladorData") -> "AcumuladorData":
+        linhas = sorted(self.linhas_invalidas + outro.linhas_invalidas)
+        return AcumuladorData(
+            total=self.total + outro.total,
+            matches_iso=self.matches_iso + outro.matches_iso,
+            matches_br=self.matches_br + outro.matches_br,
+            total_invalidas=self.total_invalidas + outro.total_invalidas,
+            linhas_invalidas=linhas[:LIMITE_AMOSTRAS],
+        )
+
+    def resultado(self) -> dict:
+        valido = self.matches_iso > self.total * 0.8
+        formato = "YYYY-MM-DD" if valido else "Desconhecido"
+        if not valido and self.matches_br > self.total * 0.8:
+            formato = "DD/MM/YYYY"
+        return {
+            "valido": valido,
+            "formato_detectado": formato,
+            "linhas_invalidas": self.linhas_invalidas,
+            "total_invalidas": self.total_invalidas,
+        }
+
+
+@dataclass
+class AcumuladorValor:
+    total: int = 0
+    total_invalidos: int = 0
+    valores_invalidos: List = field(default_factory=list)
+
+    def atualizar(self, serie: pd.Series) -> None:
+        convertidos = pd.to_numeric(serie, errors="coerce")
+        invalidos = serie[convertidos.isna() & serie.notna()]
+        self.total += len(serie)
+        self.total_invalidos += len(invalidos)
+        espaco = LIMITE_AMOSTRAS - len(self.valores_invalidos)
+        if espaco > 0:
+            self.valores_invalidos.extend(invalidos[:espaco].tolist())
+
+    def mesclar(self, outro: "AcumuladorValor") -> "AcumuladorValor":
+        return AcumuladorValor(
+            total=self.total + outro.total,
+            total_invalidos=self.total_invalidos + outro.total_invalidos,
+            valores_invalidos=(self.valores_invalidos + outro.valores_invalidos)[:LIMITE_AMOSTRAS],
+        )
+
+    def resultado(self) -> dict:
+        if self.total_invalidos == 0:
+            return {"valido": True, "formato_detectado": "decimal"}
+        return {"valido": False, "formato_detectado": "texto_ou_brasileiro"}
+
+
+@dataclass
+class AcumuladorEnum:
+    valores_permitidos: frozenset = frozenset()
+    # dict preserva a ordem de primeira ocorrencia, como o unique() do pandas.
+    valores_invalidos: Dict = field(default_factory=dict)
+
+    def atualizar(self, serie: pd.Series) -> None:
+        for v in serie.dropna().unique():
+            if str(v).upper() in self.valores_permitidos:
+                continue
+            if len(self.valores_invalidos) < LIMITE_AMOSTRAS:
+                self.valores_invalidos.setdefault(v, None)
+
+    def mesclar(self, outro: "AcumuladorEnum") -> "AcumuladorEnum":
+        valores = dict(self.valores_invalidos)
+        for v in outro.valores_invalidos:
+            if len(valores) >= LIMITE_AMOSTRAS:
+                break
+            valores.setdefault(v, None)
+        return AcumuladorEnum(self.valores_permitidos, valores)
+
+    def resultado(self) -> dict:
+        return {
+            "valido": len(self.valores_invalidos) == 0,
+            "valores_invalidos": list(self.valores_invalidos),
+            "mapeamento_sugerido": {}
+        }
+
+
+def criar_acumuladores(colunas: List[str], template: Union[dict, CompiledTemplate]) -> Dict[str, dict]:
+    acumuladores = {}
+    for col, config in como_compilado(template).colunas.items():
+        if col not in colunas:
+            continue
+        por_coluna = {}
+        if config.tipo == "DATE":
+            por_coluna["formato_data"] = AcumuladorData()
+        elif config.tipo == "DECIMAL":
+            por_coluna["formato_valor"] = AcumuladorValor()
+        if config.valores_permitidos is not None:
+            por_coluna["valor_invalido"] = AcumuladorEnum(config.valores_permitidos)
+        if por_coluna:
+            acumuladores[col] = por_coluna
+    return acumuladores
+
+
+def mesclar_acumuladores(a: Dict[str, dict], b: Dict[str, dict]) -> Dict[str, dict]:
+    mesclado = {}
+    for col in a.keys() | b.keys():
+        if col not in a or col not in b:
+            mesclado[col] = a.get(col) or b.get(col)
+            continue
+        mesclado[col] = {tipo: acc.mesclar(b[col][tipo]) for tipo, acc in a[col].items()}
+    return mesclado
+
+
+def iterar_chunks(
+    filepath: Union[Path, str],
+    tamanho_chunk: int = TAMANHO_CHUNK_PADRAO,
+    dialeto: Optional[Dialeto] = None
+) -> Iterator[pd.DataFrame]:
+    if dialeto is None:
+        dialeto = detectar_dialeto(filepath)
+    yield from pd.read_csv(
+        filepath,
+        encoding=dialeto.encoding,
+        sep=dialeto.delimitador,
+        quotechar=dialeto.quotechar,
+        engine="c",
+        chunksize=tamanho_chunk,
+    )
+
+
+def _detalhes_acumuladores(acumuladores: Dict[str, dict], template: CompiledTemplate) -> List[dict]:
+    detalhes = []
+    for col in template.colunas:
+        for tipo, acc in acumuladores.get(col, {}).items():
+            res = acc.resultado()
+            if res["valido"]:
+                continue
+            if tipo == "valor_invalido":
+                detalhes.append({"tipo": tipo, "coluna": col, "valores": res["valores_invalidos"]})
+            else:
+                detalhes.append({"tipo": tipo, "coluna": col, "detectado": res["formato_detectado"]})
+    return detalhes
+
+
+def _validar_em_chunks(
+    filepath: Union[Path, str], template: CompiledTemplate, tamanho_chunk: int, dialeto: Dialeto
+) -> List[dict]:
+    cabecalho = pd.read_csv(
+        filepath,
+        encoding=dialeto.encoding,
+        sep=dialeto.delimitador,
+        quotechar=dialeto.quotechar,
+        engine="c",
+        nrows=0,
+    )
+
+    # Regras de cabecalho so precisam das colunas, nao das linhas.
+    detalhes = _regra_colunas_obrigatorias(cabecalho, template) + _regra_nomes_colunas(cabecalho, template)
+
+    acumuladores = criar_acumuladores(list(cabecalho.columns), template)
+    for chunk in iterar_chunks(filepath, tamanho_chunk, dialeto):
+        # Cada chunk gera acumuladores parciais que sao dobrados no total.
+        parciais = criar_acumuladores(list(chunk.columns), template)
+        for col, por_coluna in parciais.items():
+            for acc in por_coluna.values():
+                acc.atualizar(chunk[col])
+        acumuladores = mesclar_acumuladores(acumuladores, parciais)
+    return detalhes + _detalhes_acumuladores(acumuladores, template)
+
+
+def validar_csv_streaming(
+    filepath: Union[Path, str],
+    template: Union[dict, CompiledTemplate],
+    tamanho_chunk: int = TAMANHO_CHUNK_PADRAO,
+    dialeto: Optional[Dialeto] = None
+) -> dict:
+    template = como_compilado(template)
+    try:
+        if dialeto is None:
+            dialeto = detectar_dialeto(filepath)
+        # Mesmo fallback de encoding do ler_csv; um byte invalido no meio do arquivo refaz a passagem inteira.
+        for tentativa in tentativas_encoding(dialeto):
+            try:
+                return _resultado(_validar_em_chunks(filepath, template, tamanho_chunk, tentativa))
+            except UnicodeDecodeError as e:
+                erro = e
+        raise erro
+    except Exception as e:
+        return _resultado([{"tipo": "erro_leitura", "mensagem": str(e)}])
@@ -1,69 +1,58 @@
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
-import chardet
 import pandas as pd
 
+from src.dialeto import Dialeto, detectar_dialeto
+from src.leitura import BACKENDS_PADRAO, ler_csv
+from src.rastreamento import etapa
+from src.template import CompiledTemplate, como_compilado, normalizar_chave
 
-def detectar_encoding(filepath: Union[Path, str]) -> str:
-    with open(filepath, "rb") as f:
-        raw_data = f.read(10000)
-    result = chardet.detect(raw_data)
-    return result["encoding"] or "utf-8"
-
-
-def detectar_delimitador(filepath: Union[Path, str], encoding: str = None) -> str:
-    if encoding is None:
-        encoding = detectar_encoding(filepath)
-
-    with open(filepath, "r", encoding=encoding) as f:
-        primeira_linha = f.readline()
+REGEX_DATA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+REGEX_DATA_BR = re.compile(r"^\d{2}/\d{2}/\d{4}$")
 
-    delimitadores = [",", ";", "\t", "|"]
-    contagens = {d: primeira_linha.count(d) for d in delimitadores}
-    if not contagens:
-        return ","
 
-    return max(contagens, key=contagens.get)
-
-
-def carregar_csv(filepath: Union[Path, str]) -> pd.DataFrame:
-    encoding = detectar_encoding(filepath)
-    delimitador = detectar_delimitador(filepath, encoding)
+def detectar_encoding(filepath: Union[Path, str]) -> str:
+    return detectar_dialeto(filepath).encoding
 
-    try:
-        df = pd.read_csv(
-            filepath,
-            encoding=encoding,
-            sep=delimitador,
-            engine='python'
-        )
-        return df
-    except Exception as e:
-        if encoding.lower() == 'utf-8':
-            return pd.read_csv(
-                filepath,
-                encoding='latin-1',
-                sep=delimitador,
-                engine='python'
-            )
-        raise e
-
-
-def validar_colunas_obrigatorias(df: pd.DataFrame, template: dict) -> dict:
-    colunas_obrigatorias = [
-        nome for nome, config in template["colunas"].items()
-        if config.get("obrigatorio", False)
-    ]
-    colunas_presentes = set(df.columns)
-    colunas_faltando = []
 
-    for col in colunas_obrigatorias:
-        if col not in colunas_presentes:
-            aliases = template["colunas"][col].get("aliases", [])
-            if not any(alias in colunas_presentes for alias in aliases):
-                colunas_faltando.append(col)
+def detectar_delimitador(filepath: Union[Path, str], encoding: str = None) -> str:
+    return detectar_dialeto(filepath).delimitador
+
+
+def carregar_csv(
+    filepath: Union[Path, str],
+    dtype: Optional[Dict[str, Any]] = None,
+    backends: Sequence[str] = BACKENDS_PADRAO,
+    dialeto: Optional[Dialeto] = None
+) -> pd.DataFrame:
+    if dialeto is None:
+        with etapa("deteccao_dialeto"):
+            dialeto = detectar_dialeto(filepath)
+
+    with etapa("parse_csv") as span:
+        df, backend = ler_csv(filepath, dialeto, dtype, backends)
+        span["linhas"] = len(df)
+    df.attrs["backend_leitura"] = backend
+    df.attrs["dialeto"] = dialeto
+    return df
+
+
+def dtypes_template(template: Union[dict, CompiledTemplate]) -> Dict[str, Any]:
+    # Colunas textuais (e seus aliases) sao lidas como str, sem inferencia de tipo.
+    dtypes = {}
+    for nome, coluna in como_compilado(template).colunas.items():
+        if coluna.tipo in ("STRING", "ENUM"):
+            for col in (nome,) + coluna.aliases:
+                dtypes[col] = str
+    return dtypes
+
+
+def validar_colunas_obrigatorias(df: pd.DataFrame, template: Union[dict, CompiledTemplate]) -> dict:
+    tpl = como_compilado(template)
+    colunas_presentes = {tpl.canonico(col) for col in df.columns}
+    colunas_faltando = [col for col in tpl.obrigatorias if col not in colunas_presentes]
 
     return {
         "valido": len(colunas_faltando) == 0,
@@ -71,22 +60,18 @@ def validar_colunas_obrigatorias(df: pd.DataFrame, template: dict) -> dict:
     }
 
 
-def validar_nomes_colunas(df: pd.DataFrame, template: dict) -> dict:
-    colunas_presentes = set(df.columns)
-    colunas_template = set(template["colunas"].keys())
+def validar_nomes_colunas(df: pd.DataFrame, template: Union[dict, CompiledTemplate]) -> dict:
+    tpl = como_compilado(template)
     mapeamento_sugerido = {}
     colunas_desconhecidas = []
 
-    for col in colunas_presentes:
-        if col in colunas_template:
+    for col in df.columns:
+        if col in tpl.colunas:
             continue
-        encontrado = False
-        for nome_template, config in template["colunas"].items():
-            if col in config.get("aliases", []):
-                mapeamento_sugerido[col] = nome_template
-                encontrado = True
-                break
-        if not encontrado:
+        nome_template = tpl.canonico(col)
+        if nome_template is not None:
+            mapeamento_sugerido[col] = nome_template
+        else:
             colunas_desconhecidas.append(col)
 
     return {
@@ -96,16 +81,16 @@ def validar_nomes_colunas(df: pd.DataFrame, template: dict) -> dict:
     }
 
 
-def validar_formato_data(df: pd.DataFrame, coluna: str, template: dict) -> dict:
+def validar_formato_data(df: pd.DataFrame, coluna: str, template: Union[dict, CompiledTemplate]) -> dict:
     if coluna not in df.columns:
         return {"valido": False, "formato_detectado": None}
     valores = df[coluna].astype(str)
-    matches = valores.str.match(r"^\d{4}-\d{2}-\d{2}$")
+    matches = valores.str.match(REGEX_DATA_ISO)
     valido = matches.sum() > len(valores) * 0.8
 
     formato = "YYYY-MM-DD" if valido else "Desconhecido"
     if not valido:
-        br_match = valores.str.match(r"^\d{2}/\d{2}/\d{4}$")
+        br_match = valores.str.match(REGEX_DATA_BR)
         if br_match.sum() > len(valores) * 0.8:
             formato = "DD/MM/YYYY"
 
@@ -116,7 +101,7 @@ def validar_formato_data(df: pd.DataFrame, coluna: str, template: dict) -> dict:
     }
 
 
-def validar_formato_valor(df: pd.DataFrame, coluna: str, template: dict) -> dict:
+def validar_formato_valor(df: pd.DataFrame, coluna: str, template: Union[dict, CompiledTemplate]) -> dict:
     if coluna not in df.columns:
         return {"valido": False}
     try:
@@ -126,88 +111,96 @@ def validar_formato_valor(df: pd.DataFrame, coluna: str, template: dict) -> dict
         return {"valido": False, "formato_detectado": "texto_ou_brasileiro"}
 
 
-def validar_enum(df: pd.DataFrame, coluna: str, template: dict) -> dict:
+def validar_enum(df: pd.DataFrame, coluna: str, template: Union[dict, CompiledTemplate]) -> dict:
     if coluna not in df.columns:
         return {"valido": False, "valores_invalidos": []}
 
-    config = template["colunas"].get(coluna, {})
-    if "validacao" not in config:
-        return {"valido": True}
-    if "valores_permitidos" not in config["validacao"]:
+    config = como_compilado(template).colunas.get(coluna)
+    if config is None or config.valores_permitidos is None:
         return {"valido": True}
 
-    valores_permitidos = set(config["validacao"]["valores_permitidos"])
     valores_unicos = df[coluna].dropna().unique()
     valores_invalidos = [
         v for v in valores_unicos
-        if str(v).upper() not in valores_permitidos
+        if str(v).upper() not in config.valores_permitidos
     ]
+    mapeamento_sugerido = {
+        v: config.mapeamento[normalizar_chave(v)]
+        for v in valores_invalidos
+        if normalizar_chave(v) in config.mapeamento
+    }
 
     return {
         "valido": len(valores_invalidos) == 0,
         "valores_invalidos": valores_invalidos,
-        "mapeamento_sugerido": {}
+        "mapeamento_sugerido": mapeamento_sugerido
     }
 
 
-def validar_csv_completo(filepath: Union[Path, str], template: dict) -> dict:
-    try:
-        df = carregar_csv(filepath)
-    except Exception as e:
-        return {
-            "valido": False,
-            "total_erros": 1,
-            "detalhes": [{"tipo": "erro_leitura", "mensagem": str(e)}]
-        }
-
-    detalhes = []
-
+def _regra_colunas_obrigatorias(df: pd.DataFrame, template: CompiledTemplate) -> List[dict]:
     res_col = validar_colunas_obrigatorias(df, template)
-    if not res_col["valido"]:
-        detalhes.append({
-            "tipo": "colunas_faltando",
-            "colunas": res_col["colunas_faltando"]
-        })
+    if res_col["valido"]:
+        return []
+    return [{
+        "tipo": "colunas_faltando",
+        "colunas": res_col["colunas_faltando"]
+    }]
+
 
+def _regra_nomes_colunas(df: pd.DataFrame, template: CompiledTemplate) -> List[dict]:
     res_nom = validar_nomes_colunas(df, template)
-    if not res_nom["valido"]:
-        detalhes.append({
-            "tipo": "nomes_colunas",
-            "mapeamento": res_nom["mapeamento_sugerido"]
-        })
-
-    for col, config in template["colunas"].items():
-        if col in df.columns:
-            tipo_dado = config.get("tipo_dado")
-
-            if tipo_dado == "DATE":
-                res_data = validar_formato_data(df, col, template)
-                if not res_data["valido"]:
-                    detalhes.append({
-                        "tipo": "formato_data",
-                        "coluna": col,
-                        "detectado": res_data["formato_detectado"]
-                    })
-
-            elif tipo_dado == "DECIMAL":
-                res_valor = validar_formato_valor(df, col, template)
-                if not res_valor["valido"]:
-                    detalhes.append({
-                        "tipo": "formato_valor",
-                        "coluna": col,
-                        "detectado": res_valor["formato_detectado"]
-                    })
-
-            if "validacao" in config:
-                if "valores_permitidos" in config["validacao"]:
-                    res_enum = validar_enum(df, col, template)
-                    if not res_enum["valido"]:
-                        detalhes.append({
-                            "tipo": "valor_invalido",
-                            "coluna": col,
-                            "valores": res_enum["valores_invalidos"]
-                        })
+    if res_nom["valido"]:
+        return []
+    return [{
+        "tipo": "nomes_colunas",
+        "mapeamento": res_nom["mapeamento_sugerido"]
+    }]
+
 
+def _regra_formatos_colunas(df: pd.DataFrame, template: CompiledTemplate) -> List[dict]:
+    detalhes = []
+    for col, config in template.colunas.items():
+        if col not in df.columns:
+            continue
+
+        if config.tipo == "DATE":
+            res_data = validar_formato_data(df, col, template)
+            if not res_data["valido"]:
+                detalhes.append({
+                    "tipo": "formato_data",
+                    "coluna": col,
+                    "detectado": res_data["formato_detectado"]
+                })
+
+        elif config.tipo == "DECIMAL":
+            res_valor = validar_formato_valor(df, col, template)
+            if not res_valor["valido"]:
+                detalhes.append({
+                    "tipo": "formato_valor",
+                    "coluna": col,
+                    "detectado": res_valor["formato_detectado"]
+                })
+
+        if config.valores_permitidos is not None:
+            res_enum = validar_enum(df, col, template)
+            if not res_enum["valido"]:
+                detalhes.append({
+                    "tipo": "valor_invalido",
+                    "coluna": col,
+                    "valores": res_enum["valores_invalidos"]
+                })
+    return detalhes
+
+
+# Cada regra recebe (df, template compilado) e devolve a lista de divergencias encontradas.
+REGRAS_PADRAO: List[Callable[[pd.DataFrame, CompiledTemplate], List[dict]]] = [
+    _regra_colunas_obrigatorias,
+    _regra_nomes_colunas,
+    _regra_formatos_colunas,
+]
+
+
+def _resultado(detalhes: List[dict]) -> dict:
     return {
         "valido": len(detalhes) == 0,
         "total_erros": len(detalhes),
@@ -215,13 +208,34 @@ def validar_csv_completo(filepath: Union[Path, str], template: dict) -> dict:
     }
 
 
-def gerar_relatorio_divergencias(filepath: Union[Path, str], template: dict) -> str:
-    res = validar_csv_completo(filepath, template)
-    if res["valido"]:
+def validar_dataframe(df: pd.DataFrame, template: Union[dict, CompiledTemplate], regras=None) -> dict:
+    template = como_compilado(template)
+    detalhes = []
+    for regra in (regras if regras is not None else REGRAS_PADRAO):
+        nome = getattr(regra, "__name__", "regra").lstrip("_")
+        with etapa(f"validacao:{nome}", linhas=len(df)):
+            detalhes.extend(regra(df, template))
+    return _resultado(detalhes)
+
+
+def validar_csv_completo(origem: Union[Path, str, pd.DataFrame], template: Union[dict, CompiledTemplate]) -> dict:
+    if isinstance(origem, pd.DataFrame):
+        return validar_dataframe(origem, template)
+
+    try:
+        df = carregar_csv(origem)
+    except Exception as e:
+        return _resultado([{"tipo": "erro_leitura", "mensagem": str(e)}])
+
+    return validar_dataframe(df, template)
+
+
+def formatar_relatorio(resultado: dict) -> str:
+    if resultado["valido"]:
         return "Nenhuma divergencia."
 
     msg = []
-    for erro in res["detalhes"]:
+    for erro in resultado["detalhes"]:
         if erro["tipo"] == "colunas_faltando":
             cols = ', '.join(erro['colunas'])
             msg.append(f"Colunas faltando: {cols}")
@@ -237,5 +251,17 @@ def gerar_relatorio_divergencias(filepath: Union[Path, str], template: dict) ->
         elif erro["tipo"] == "valor_invalido":
             val = erro['valores']
             msg.append(f"Coluna '{erro['coluna']}' valores não permitidos: {val}")
+        elif erro["tipo"] == "restricoes_linhas":
+            msg.append(f"{erro['linhas']} linhas violam restrições do template: {erro['violacoes']}")
+
+    return "\n".join(msg)
+
 
-    return "\n".join(msg)
\ No newline at end of file
+def gerar_relatorio_divergencias(
+    origem: Union[Path, str, pd.DataFrame, dict],
+    template: Union[dict, CompiledTemplate] = None
+) -> str:
+    # Aceita um resultado ja calculado para nao reprocessar o arquivo.
+    if isinstance(origem, dict):
+        return formatar_relatorio(origem)
+    return formatar_relatorio(validar_csv_completo(origem, template))
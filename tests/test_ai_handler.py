@@ -0,0 +1,167 @@
+"""
+Testes do cliente LLM usando o provedor stub (sem rede).
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import db_handler
+from src.ai_handler import ClienteLLM, ErroLLM, ProvedorStub, montar_prompt
+
+TEMPLATE = {"colunas": {"id_transacao": {}, "valor": {}}}
+
+
+class TestClienteLLM:
+    """Concorrencia limitada, retry com backoff e prazo total."""
+
+    def test_prompt_pede_contrato_em_memoria(self):
+        prompt = montar_prompt("erros", "a,b", TEMPLATE)
+        assert "transformar(df)" in prompt and "id_transacao, valor" in prompt
+
+    def test_retry_ate_sucesso(self):
+        provedor = ProvedorStub(script="```python\ndef transformar(df):\n    return df\n```", falhas_iniciais=2)
+        cliente = ClienteLLM(provedor, tentativas=3, espera_base=0.01)
+        codigo = asyncio.run(cliente.gerar_script("erros", "a,b", TEMPLATE))
+        assert codigo.startswith("def transformar") and provedor.chamadas == 3
+
+    def test_esgota_tentativas(self):
+        cliente = ClienteLLM(ProvedorStub(falhas_iniciais=5), tentativas=2, espera_base=0.01)
+        with pytest.raises(ErroLLM):
+            asyncio.run(cliente.gerar("p"))
+
+    def test_prazo_total(self):
+        cliente = ClienteLLM(ProvedorStub(atraso=1.0), tempo_limite=0.1)
+        with pytest.raises(ErroLLM, match="Prazo"):
+            asyncio.run(cliente.gerar("p"))
+
+    def test_semaforo_limita_concorrencia(self):
+        provedor = ProvedorStub(atraso=0.05)
+        ativos, pico = 0, 0
+        original = provedor.gerar
+
+        async def medir(prompt):
+            nonlocal ativos, pico
+            ativos += 1
+            pico = max(pico, ativos)
+            try:
+                return await original(prompt)
+            finally:
+                ativos -= 1
+
+        provedor.gerar = medir
+        cliente = ClienteLLM(provedor, concorrencia=2)
+
+        async def varias():
+            return await asyncio.gather(*(cliente.gerar(str(i)) for i in range(6)))
+
+        assert len(asyncio.run(varias())) == 6
+        assert pico == 2
+
+    def test_limite_vale_entre_threads(self):
+        # Cada thread roda seu proprio asyncio.run, como sessoes do Streamlit e o lote.
+        provedor = ProvedorStub(atraso=0.05)
+        ativos, pico = 0, 0
+        lock = threading.Lock()
+        original = provedor.gerar
+
+        async def medir(prompt):
+            nonlocal ativos, pico
+            with lock:
+                ativos += 1
+                pico = max(pico, ativos)
+            try:
+                return await original(prompt)
+            finally:
+                with lock:
+                    ativos -= 1
+
+        provedor.gerar = medir
+        cliente = ClienteLLM(provedor, concorrencia=1)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            codigos = list(pool.map(lambda i: asyncio.run(cliente.gerar(str(i))), range(6)))
+        assert len(codigos) == 6
+        assert pico == 1
+
+    def test_prazo_aguardando_vaga(self):
+        cliente = ClienteLLM(ProvedorStub(atraso=0.3), concorrencia=1, tempo_limite=0.1)
+
+        async def duas():
+            return await asyncio.gather(cliente.gerar("a"), cliente.gerar("b"), return_exceptions=True)
+
+        erros = asyncio.run(duas())
+        assert all(isinstance(e, ErroLLM) for e in erros)
+        assert cliente._vagas.livres == 1
+
+    def test_fila_alem_do_limite_respeita_prazo_sem_threads(self):
+        cliente = ClienteLLM(ProvedorStub(atraso=2.0), concorrencia=2, tempo_limite=0.2)
+        threads_antes = threading.active_count()
+
+        async def muitas():
+            tarefas = [asyncio.ensure_future(cliente.gerar(str(i))) for i in range(20)]
+            await asyncio.sleep(0.05)
+            # Quem espera vaga fica num Future do loop, nao numa thread do executor padrao.
+            threads_esperando = threading.active_count()
+            inicio = time.monotonic()
+            erros = await asyncio.gather(*tarefas, return_exceptions=True)
+            return threads_esperando, time.monotonic() - inicio, erros
+
+        threads_esperando, duracao, erros = asyncio.run(muitas())
+        assert threads_esperando == threads_antes
+        assert duracao < 1.0
+        mensagens = [str(e) for e in erros]
+        assert sum("aguardando vaga" in m for m in mensagens) == 18
+        assert all(isinstance(e, ErroLLM) for e in erros)
+        assert cliente._vagas.livres == 2
+
+    def test_vaga_cancelada_nao_vaza(self):
+        cliente = ClienteLLM(ProvedorStub(atraso=0.1), concorrencia=1)
+
+        async def cancelar_quem_espera():
+            primeira = asyncio.ensure_future(cliente.gerar("a"))
+            segunda = asyncio.ensure_future(cliente.gerar("b"))
+            await asyncio.sleep(0.01)
+            segunda.cancel()
+            await asyncio.gather(primeira, segunda, return_exceptions=True)
+            return await cliente.gerar("c")
+
+        assert asyncio.run(cancelar_quem_espera())
+        assert cliente._vagas.livres == 1
+
+
+class TestDeduplicacao:
+    """Pedidos iguais simultaneos geram uma vez so; respostas persistem no banco."""
+
+    def test_single_flight(self):
+        provedor = ProvedorStub(atraso=0.05)
+        cliente = ClienteLLM(provedor)
+
+        async def iguais():
+            return await asyncio.gather(*(cliente.gerar("mesmo prompt", "fp") for _ in range(5)))
+
+        assert len(set(asyncio.run(iguais()))) == 1
+        assert provedor.chamadas == 1
+
+    def test_erro_compartilhado_com_quem_espera(self):
+        cliente = ClienteLLM(ProvedorStub(atraso=0.05, falhas_iniciais=5), tentativas=1)
+
+        async def iguais():
+            return await asyncio.gather(*(cliente.gerar("p", "fp") for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(r, ErroLLM) for r in asyncio.run(iguais()))
+        assert cliente.provedor.chamadas == 1
+
+    def test_cache_persistente(self, tmp_path):
+        caminho_original = db_handler.DB_PATH
+        db_handler.configurar_banco(str(tmp_path / "pipeline.db"))
+        try:
+            asyncio.run(ClienteLLM(ProvedorStub(), cache_persistente=True).gerar("p"))
+            provedor = ProvedorStub(script="outro")
+            assert asyncio.run(ClienteLLM(provedor, cache_persistente=True).gerar("p")) != "outro"
+            assert provedor.chamadas == 0
+        finally:
+            db_handler.fechar_conexao()
+            db_handler.configurar_banco(caminho_original)
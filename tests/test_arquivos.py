@@ -0,0 +1,27 @@
+"""
+Testes da gravacao de uploads com hash de conteudo em streaming.
+"""
+
+import hashlib
+import io
+
+from src import arquivos
+from src.arquivos import gravar_com_hash, hash_arquivo
+
+
+class TestGravarComHash:
+    """O hash calculado na gravacao bate com o do conteudo e nomeia o arquivo."""
+
+    def test_hash_da_gravacao_em_blocos(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(arquivos, "TAMANHO_BLOCO_HASH", 7)
+        conteudo = b"id;valor\n" + b"TXN-1;10,00\n" * 50
+        caminho, hash_conteudo = gravar_com_hash(io.BytesIO(conteudo), str(tmp_path))
+        assert hash_conteudo == hashlib.sha256(conteudo).hexdigest()
+        assert caminho == str(tmp_path / f"{hash_conteudo}.csv")
+        assert hash_arquivo(caminho) == hash_conteudo
+
+    def test_mesmo_conteudo_mesmo_arquivo(self, tmp_path):
+        primeiro, _ = gravar_com_hash(b"a,b\n1,2\n", str(tmp_path))
+        segundo, _ = gravar_com_hash(memoryview(b"a,b\n1,2\n"), str(tmp_path))
+        assert primeiro == segundo
+        assert [p.name for p in tmp_path.iterdir()] == [primeiro.rsplit("/", 1)[-1]]
@@ -0,0 +1,138 @@
+"""
+Testes da ingestao em lote (sem o pool de processos).
+"""
+
+import queue
+
+import pytest
+
+from src import batch, db_handler
+from src.batch import _escritor, listar_arquivos, processar_arquivo
+from src.dialeto import detectar_dialeto
+from src.normalizacao import normalizar_dataframe
+from src.template import carregar_template
+from src.validation import carregar_csv, dtypes_template
+
+
+@pytest.fixture(autouse=True)
+def banco(tmp_path):
+    caminho_original = db_handler.DB_PATH
+    db_handler.configurar_banco(str(tmp_path / "pipeline.db"))
+    yield db_handler
+    db_handler.fechar_conexao()
+    db_handler.configurar_banco(caminho_original)
+
+
+class TestBatch:
+    """Cada arquivo passa por leitura, validacao e normalizacao no worker."""
+
+    def test_listar_diretorio_e_glob(self, tmp_path):
+        (tmp_path / "a.csv").write_text("x\n1\n")
+        (tmp_path / "b.txt").write_text("x\n1\n")
+        assert listar_arquivos([str(tmp_path), str(tmp_path / "*.csv")]) == [str(tmp_path / "a.csv")]
+
+    def test_arquivo_corrigido_pelo_normalizador(self, tmp_path):
+        caminho = tmp_path / "br.csv"
+        caminho.write_text(
+            "id;data;valor;tipo;categoria;conta_origem;status\n"
+            "TXN-00000002;15/01/2024;R$ 1.500,00;C;food;CC-1234;pending\n",
+            encoding="utf-8",
+        )
+        item = processar_arquivo(str(caminho))
+        assert item["status"] == "normalizado"
+        assert item["df"]["valor"].tolist() == [1500.0]
+        assert {"leitura", "validacao", "normalizacao", "total_worker"} <= item["tempos"].keys()
+
+    def test_arquivo_ja_ingerido_nao_e_relido(self, tmp_path):
+        caminho = tmp_path / "ok.csv"
+        caminho.write_text(
+            "id_transacao,data_transacao,valor,tipo,categoria,descricao,conta_origem,conta_destino,status\n"
+            "TXN-00000001,2024-01-15,10.00,CREDITO,LAZER,,CC-1234,,CONFIRMADO\n",
+            encoding="utf-8",
+        )
+        fila, resumo = queue.Queue(), []
+        fila.put(processar_arquivo(str(caminho)))
+        fila.put(None)
+        _escritor(fila, resumo, carregar_template())
+        assert resumo[0]["registros"]["sucesso"] == 1
+
+        repetido = processar_arquivo(str(caminho))
+        assert repetido["status"] == "ja_ingerido"
+        assert repetido["log_id"] == resumo[0]["log_id"]
+        assert "leitura" not in repetido["tempos"]
+
+    def test_script_do_cache_recebe_frame_normalizado(self, tmp_path, banco):
+        caminho = tmp_path / "residuo.csv"
+        caminho.write_text(
+            "id;data;valor;tipo;categoria;conta_origem;status\n"
+            "TXN-00000003;15/01/2024;R$ 1.500,00;???;food;CC-1234;pending\n",
+            encoding="utf-8",
+        )
+        template = carregar_template()
+        dialeto = detectar_dialeto(str(caminho))
+        df = carregar_csv(str(caminho), dtype=dtypes_template(template), dialeto=dialeto)
+        df_normalizado, _ = normalizar_dataframe(df, template)
+        # O script so conhece os nomes canonicos: funciona apenas sobre o frame normalizado.
+        banco.salvar_script(
+            banco.calcular_fingerprint_estrutura(df_normalizado, template, dialeto),
+            "def transformar(df):\n    df['tipo'] = df['tipo'].replace('???', 'CREDITO')\n    return df\n",
+        )
+        item = processar_arquivo(str(caminho))
+        assert item["status"] == "script_cache"
+        assert item["df"][["valor", "tipo"]].values.tolist() == [[1500.0, "CREDITO"]]
+
+    def test_coluna_sem_alias_chega_ao_script(self, tmp_path, banco):
+        caminho = tmp_path / "renomear.csv"
+        caminho.write_text(
+            "id;dt_mov;valor;tipo;categoria;conta_origem;status\n"
+            "TXN-00000004;15/01/2024;10,00;C;food;CC-1234;pending\n",
+            encoding="utf-8",
+        )
+        template = carregar_template()
+        dialeto = detectar_dialeto(str(caminho))
+        df = carregar_csv(str(caminho), dtype=dtypes_template(template), dialeto=dialeto)
+        df_normalizado, correcoes = normalizar_dataframe(df, template)
+        assert correcoes["colunas_desconhecidas"] == ["dt_mov"]
+        banco.salvar_script(
+            banco.calcular_fingerprint_estrutura(df_normalizado, template, dialeto),
+            "import pandas as pd\n"
+            "def transformar(df):\n"
+            "    df = df.rename(columns={'dt_mov': 'data_transacao'})\n"
+            "    df['data_transacao'] = pd.to_datetime(df['data_transacao'], dayfirst=True).dt.strftime('%Y-%m-%d')\n"
+            "    return df\n",
+        )
+        item = processar_arquivo(str(caminho))
+        assert item["status"] == "script_cache"
+        assert item["df"]["data_transacao"].tolist() == ["2024-01-15"]
+
+    def test_arquivo_grande_valido_e_gravado_em_fatias(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(batch, "LIMITE_STREAMING_MB", 0)
+        caminho = tmp_path / "grande.csv"
+        caminho.write_text(
+            "id_transacao,data_transacao,valor,tipo,categoria,descricao,conta_origem,conta_destino,status\n"
+            "TXN-00000001,2024-01-15,10.00,CREDITO,LAZER,,CC-1234,,CONFIRMADO\n"
+            "TXN-00000002,2024-01-16,20.00,DEBITO,LAZER,,CC-1234,,CONFIRMADO\n",
+            encoding="utf-8",
+        )
+        item = processar_arquivo(str(caminho))
+        assert item["status"] == "valido_streaming" and item["df"] is None
+        assert "leitura" not in item["tempos"]
+
+        fila, resumo = queue.Queue(), []
+        fila.put(item)
+        fila.put(None)
+        _escritor(fila, resumo, carregar_template())
+        assert resumo[0]["registros"]["sucesso"] == 2
+        assert processar_arquivo(str(caminho))["status"] == "ja_ingerido"
+
+    def test_arquivo_grande_com_problemas_cai_no_caminho_em_memoria(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(batch, "LIMITE_STREAMING_MB", 0)
+        caminho = tmp_path / "br.csv"
+        caminho.write_text(
+            "id;data;valor;tipo;categoria;conta_origem;status\n"
+            "TXN-00000002;15/01/2024;R$ 1.500,00;C;food;CC-1234;pending\n",
+            encoding="utf-8",
+        )
+        item = processar_arquivo(str(caminho))
+        assert item["status"] == "normalizado"
+        assert "validacao_streaming" in item["tempos"]
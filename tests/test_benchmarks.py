@@ -0,0 +1,30 @@
+"""
+Testes dos geradores sinteticos usados pelos benchmarks.
+"""
+
+import pytest
+
+from benchmarks.geradores import CLASSES, gerar_csv
+from src.normalizacao import normalizar_dataframe
+from src.template import carregar_template
+from src.validation import carregar_csv, dtypes_template, validar_csv_completo
+
+
+class TestGeradores:
+    """Saida deterministica e cada classe reproduz o problema que representa."""
+
+    def test_mesma_seed_mesmo_arquivo(self, tmp_path):
+        gerar_csv(tmp_path / "a.csv", "misto", 500, seed=7, tamanho_bloco=128)
+        gerar_csv(tmp_path / "b.csv", "misto", 500, seed=7, tamanho_bloco=128)
+        assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+
+    @pytest.mark.parametrize("classe", sorted(CLASSES))
+    def test_classe_detectada_e_normalizavel(self, tmp_path, classe):
+        template = carregar_template()
+        caminho = tmp_path / f"{classe}.csv"
+        dialeto = gerar_csv(caminho, classe, 300)
+        df = carregar_csv(caminho, dtype=dtypes_template(template))
+        assert len(df) == 300
+        assert df.attrs["dialeto"].delimitador == dialeto["delimitador"]
+        assert validar_csv_completo(df, template)["valido"] == (classe in ("perfeito", "delimitador_pv", "encoding_latin1"))
+        assert validar_csv_completo(normalizar_dataframe(df, template)[0], template)["valido"]
@@ -0,0 +1,39 @@
+"""
+Testes do cache LRU limitado em bytes usado para as analises de upload.
+"""
+
+import pandas as pd
+
+from src.cache_memoria import CacheLimitadoPorBytes, tamanho_bytes
+
+
+def _analise(linhas):
+    return {"df_raw": pd.DataFrame({"x": range(linhas)}), "resultado": {"valido": True}}
+
+
+class TestCacheLimitadoPorBytes:
+    """Despeja as entradas mais antigas pelo tamanho dos frames e devolve o mesmo objeto."""
+
+    def test_devolve_o_mesmo_objeto(self):
+        cache = CacheLimitadoPorBytes(10_000)
+        analise = _analise(10)
+        cache.guardar("a", analise)
+        assert cache.obter("a") is analise
+        assert cache.obter("a")["df_raw"] is analise["df_raw"]
+
+    def test_despeja_por_bytes(self):
+        tamanho = tamanho_bytes(_analise(100))
+        cache = CacheLimitadoPorBytes(tamanho * 2)
+        for chave in "abc":
+            cache.guardar(chave, _analise(100))
+            cache.obter("a")
+        # "a" foi usado por ultimo a cada passo; "b" e o mais antigo e sai.
+        assert cache.obter("b") is None
+        assert cache.obter("a") is not None and cache.obter("c") is not None
+        assert cache.bytes_usados == tamanho * 2
+
+    def test_valor_maior_que_o_limite_nao_e_guardado(self):
+        cache = CacheLimitadoPorBytes(100)
+        cache.guardar("pequeno", {"resultado": {}})
+        cache.guardar("grande", _analise(1000))
+        assert cache.obter("grande") is None and len(cache) == 1
@@ -0,0 +1,41 @@
+"""
+Testes do contexto compacto enviado ao prompt de correcao.
+"""
+
+import json
+
+import pandas as pd
+
+from src.contexto_prompt import montar_contexto_prompt
+from src.dialeto import Dialeto
+from src.validation import validar_csv_completo
+
+TEMPLATE = {"colunas": {
+    "id_transacao": {"tipo": "STRING", "obrigatorio": True, "aliases": ["id"]},
+    "data_transacao": {"tipo": "DATE", "obrigatorio": True, "formatos_aceitos": ["YYYY-MM-DD"]},
+    "valor": {"tipo": "DECIMAL", "obrigatorio": True, "minimo": 0.01},
+}}
+
+
+class TestContextoPrompt:
+    """Uma linha por classe de erro e resumo em JSON compacto."""
+
+    def test_amostra_com_linha_por_erro(self):
+        df = pd.DataFrame({
+            "id": [f"T{i}" for i in range(100)],
+            "data_transacao": ["2024-01-01"] * 50 + ["15/01/2024"] + ["2024-01-01"] * 49,
+            "valor": ["10.0"] * 80 + ["R$ 1.500,00"] + ["10.0"] * 19,
+        })
+        resultado = validar_csv_completo(df, TEMPLATE)
+        erros, amostra = montar_contexto_prompt(df, TEMPLATE, resultado, Dialeto(delimitador=";"))
+        linhas = amostra.splitlines()
+        assert linhas[0] == "id;data_transacao;valor"
+        assert linhas[1:] == ["T0;2024-01-01;10.0", "T50;15/01/2024;10.0", "T80;2024-01-01;R$ 1.500,00"]
+        resumo = json.loads(erros)
+        assert resumo["renomear"] == {"id": "id_transacao"}
+        assert resumo["violacoes_linhas"]["data_transacao:data"] == 1
+
+    def test_arquivo_vazio(self):
+        df = pd.DataFrame({"id": [], "data_transacao": [], "valor": []})
+        erros, amostra = montar_contexto_prompt(df, TEMPLATE, validar_csv_completo(df, TEMPLATE))
+        assert amostra.strip() == "id,data_transacao,valor"
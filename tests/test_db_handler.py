@@ -0,0 +1,291 @@
+"""
+Testes da camada de persistencia (conexao gerenciada, cache de scripts e ingestao).
+"""
+
+import copy
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from src import db_handler
+from src.dialeto import Dialeto
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho_original = db_handler.DB_PATH
+    db_handler.configurar_banco(str(tmp_path / "pipeline.db"))
+    yield db_handler
+    db_handler.fechar_conexao()
+    db_handler.configurar_banco(caminho_original)
+
+
+class TestConexao:
+    """A conexao e reaproveitada e configurada com os pragmas."""
+
+    def test_conexao_reaproveitada_em_wal(self, banco):
+        conn = banco.conexao_banco()
+        assert banco.conexao_banco() is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_schema_aplicado_automaticamente(self, banco):
+        tabelas = {r[0] for r in banco.conexao_banco().execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert {"transacoes_financeiras", "scripts_transformacao", "log_ingestao"} <= tabelas
+
+    def test_transacao_faz_rollback(self, banco):
+        with pytest.raises(sqlite3.IntegrityError):
+            with banco.transacao() as conn:
+                conn.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('a', 'x')")
+                conn.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('a', 'y')")
+        assert banco.buscar_script_por_hash("a") is None
+
+    def test_transacao_aninhada_usa_savepoint(self, banco):
+        with banco.transacao() as conn:
+            conn.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('a', 'x')")
+            with pytest.raises(RuntimeError):
+                with banco.transacao() as interna:
+                    interna.execute("INSERT INTO scripts_transformacao (hash_estrutura, script_python) VALUES ('b', 'y')")
+                    raise RuntimeError
+        assert banco.buscar_script_por_hash("a") is not None
+        assert banco.buscar_script_por_hash("b") is None
+
+    def test_migra_colunas_em_banco_antigo(self, banco, tmp_path):
+        caminho = str(tmp_path / "antigo.db")
+        antigo = sqlite3.connect(caminho)
+        antigo.execute("CREATE TABLE log_ingestao (id INTEGER PRIMARY KEY, arquivo_nome TEXT, registros_total INTEGER, "
+                       "registros_sucesso INTEGER, registros_erro INTEGER, usou_ia BOOLEAN, script_id INTEGER, "
+                       "duracao_segundos REAL, created_at TIMESTAMP)")
+        antigo.close()
+        db_handler.configurar_banco(caminho)
+        db_handler.registrar_log("a.csv", 1, 1, 0, False, None, 0.1, 0.05, 80.0)
+        linha = db_handler.conexao_banco().execute("SELECT cpu_segundos, pico_memoria_mb FROM log_ingestao").fetchone()
+        assert tuple(linha) == (0.05, 80.0)
+
+
+class TestScriptsELog:
+    """Funcoes antigas continuam funcionando sobre a conexao gerenciada."""
+
+    def test_salvar_script_insere_e_atualiza(self, banco):
+        banco.salvar_script("hash", "v1")
+        banco.salvar_script("hash", "v2")
+        assert banco.buscar_script_por_hash("hash")["script_python"] == "v2"
+
+    def test_usos_gravados_em_lote(self, banco, monkeypatch):
+        monkeypatch.setattr(banco, "LIMITE_USOS_PENDENTES", 3)
+        monkeypatch.setattr(banco, "INTERVALO_GRAVACAO_USOS", 3600)
+        banco.descarregar_usos_scripts()
+        banco.salvar_script("hash", "v1")
+        script_id = banco.buscar_script_por_hash("hash")["id"]
+        usos = lambda: banco.conexao_banco().execute(
+            "SELECT vezes_utilizado FROM scripts_transformacao WHERE id = ?", (script_id,)
+        ).fetchone()[0]
+        banco.registrar_uso_script(script_id)
+        banco.registrar_uso_script(script_id)
+        assert usos() == 1
+        banco.registrar_uso_script(script_id)
+        assert usos() == 4
+
+    def test_metricas(self, banco):
+        banco.registrar_log("a.csv", 10, 9, 1, True, None, 0.5)
+        banco.registrar_log("b.csv", 5, 5, 0, False, None, 0.1)
+        assert banco.carregar_metricas() == (14, 2, 0, 1, 1)
+
+    def test_metricas_acompanham_scripts_e_exclusoes(self, banco):
+        banco.salvar_script("h1", "v1")
+        banco.salvar_script("h1", "v2")
+        banco.salvar_script("h2", "v1")
+        banco.registrar_log("a.csv", 10, 9, 1, True, None, 0.5)
+        banco.conexao_banco().execute("DELETE FROM log_ingestao")
+        assert banco.carregar_metricas() == (0, 0, 2, 0, 0)
+
+    def test_metricas_preenchidas_em_banco_antigo(self, banco, tmp_path):
+        caminho = str(tmp_path / "antigo.db")
+        antigo = sqlite3.connect(caminho)
+        with open(banco.SCHEMA_PATH, encoding="utf-8") as f:
+            antigo.executescript(f.read().split("CREATE TABLE IF NOT EXISTS metricas_pipeline")[0])
+        antigo.execute("INSERT INTO log_ingestao (arquivo_nome, registros_sucesso, usou_ia) VALUES ('a.csv', 7, 0)")
+        antigo.commit()
+        antigo.close()
+        banco.configurar_banco(caminho)
+        assert banco.carregar_metricas() == (7, 1, 0, 0, 1)
+
+
+class TestFingerprint:
+    """Fingerprint leva em conta dialeto e formato das colunas, e buscas repetidas vem do LRU."""
+
+    TEMPLATE = {"colunas": {
+        "data_transacao": {"tipo": "DATE", "aliases": ["data"]},
+        "valor": {"tipo": "DECIMAL"},
+    }}
+
+    def test_formato_de_data_muda_fingerprint(self):
+        iso = pd.DataFrame({"data_transacao": ["2024-01-15"], "valor": ["1.5"]})
+        br = pd.DataFrame({"data_transacao": ["15/01/2024"], "valor": ["1.5"]})
+        assert db_handler.calcular_fingerprint_estrutura(iso, self.TEMPLATE) != \
+            db_handler.calcular_fingerprint_estrutura(br, self.TEMPLATE)
+
+    def test_dialeto_muda_fingerprint(self):
+        df = pd.DataFrame({"data": ["2024-01-15"], "valor": ["1,5"]})
+        virgula = db_handler.calcular_fingerprint_estrutura(df, self.TEMPLATE, Dialeto(delimitador=","))
+        ponto_virgula = db_handler.calcular_fingerprint_estrutura(df, self.TEMPLATE, Dialeto(delimitador=";"))
+        assert virgula != ponto_virgula
+        assert virgula == db_handler.calcular_fingerprint_estrutura(df, self.TEMPLATE, Dialeto(delimitador=","))
+
+    def test_variantes_do_chardet_tem_o_mesmo_fingerprint(self):
+        df = pd.DataFrame({"data": ["2024-01-15"], "valor": ["1,5"]})
+        fingerprints = {
+            encoding: db_handler.calcular_fingerprint_estrutura(df, self.TEMPLATE, Dialeto(encoding=encoding))
+            for encoding in ("ascii", "utf-8", "ISO-8859-1", "Windows-1252")
+        }
+        assert fingerprints["ascii"] == fingerprints["utf-8"]
+        assert fingerprints["ISO-8859-1"] == fingerprints["Windows-1252"]
+        assert fingerprints["utf-8"] != fingerprints["ISO-8859-1"]
+
+    def test_busca_repetida_vem_do_cache(self, banco, monkeypatch):
+        banco.salvar_script("fp", "v1")
+        assert banco.buscar_script_por_hash("fp")["script_python"] == "v1"
+        monkeypatch.setattr(banco, "conexao_banco", lambda: pytest.fail("cache nao usado"))
+        assert banco.buscar_script_por_hash("fp")["script_python"] == "v1"
+
+    def test_script_com_chave_legada_continua_acessivel(self, banco):
+        df = pd.DataFrame({"date": ["15/01/2024"], "amount": ["1,50"]})
+        banco.salvar_script(banco.calcular_hash_legado(df), "legado")
+        assert banco.buscar_script_por_hash("fp-novo") is None
+        assert banco.buscar_script_por_hash("fp-novo", banco.calcular_hash_legado(df))["script_python"] == "legado"
+        banco.salvar_script("fp-novo", "novo")
+        assert banco.buscar_script_por_hash("fp-novo", banco.calcular_hash_legado(df))["script_python"] == "novo"
+
+    def test_salvar_script_invalida_cache(self, banco):
+        banco.salvar_script("fp", "v1")
+        banco.buscar_script_por_hash("fp")
+        banco.salvar_script("fp", "v2")
+        assert banco.buscar_script_por_hash("fp")["script_python"] == "v2"
+
+
+def _transacoes(ids, valor=10.0):
+    return pd.DataFrame({
+        "id_transacao": ids,
+        "data_transacao": ["2024-01-15"] * len(ids),
+        "valor": [valor] * len(ids),
+        "tipo": ["CREDITO"] * len(ids),
+        "categoria": ["LAZER"] * len(ids),
+        "conta_origem": ["CC-1234"] * len(ids),
+        "status": ["CONFIRMADO"] * len(ids),
+    })
+
+
+class TestInsercaoEmLote:
+    """executemany em lotes com controle de conflito no id_transacao."""
+
+    def test_modo_ignorar_conta_conflitos(self, banco):
+        banco.inserir_transacoes_em_lote(_transacoes(["A", "B"]))
+        resumo = banco.inserir_transacoes_em_lote(_transacoes(["B", "C", "C", "D"]), tamanho_lote=2)
+        assert (resumo["inseridos"], resumo["conflitos"], resumo["ignorados"]) == (2, 2, 2)
+
+    def test_modo_atualizar(self, banco):
+        banco.inserir_transacoes_em_lote(_transacoes(["A"]))
+        resumo = banco.inserir_transacoes_em_lote(_transacoes(["A", "B"], valor=99.0), modo="atualizar")
+        assert (resumo["inseridos"], resumo["atualizados"]) == (1, 1)
+        valores = banco.conexao_banco().execute("SELECT valor FROM transacoes_financeiras").fetchall()
+        assert [v[0] for v in valores] == [99.0, 99.0]
+
+    def test_modo_atualizar_com_update_barrado(self, banco):
+        banco.inserir_transacoes_em_lote(_transacoes(["A"]))
+        df = pd.concat([_transacoes(["A"], valor=-1.0), _transacoes(["D"])], ignore_index=True)
+        resumo = banco.inserir_transacoes_em_lote(df, modo="atualizar")
+        assert (resumo["inseridos"], resumo["atualizados"], resumo["ignorados"]) == (1, 0, 1)
+        assert resumo["rejeitadas"] == [(0, "banco:check:valor > 0")]
+        valores = banco.conexao_banco().execute("SELECT id_transacao, valor FROM transacoes_financeiras ORDER BY 1")
+        assert [tuple(v) for v in valores] == [("A", 10.0), ("D", 10.0)]
+
+    def test_modo_abortar_desfaz_tudo(self, banco):
+        banco.inserir_transacoes_em_lote(_transacoes(["A"]))
+        with pytest.raises(sqlite3.IntegrityError):
+            banco.inserir_transacoes_em_lote(_transacoes(["B", "A"]), modo="abortar", tamanho_lote=1)
+        total = banco.conexao_banco().execute("SELECT COUNT(*) FROM transacoes_financeiras").fetchone()[0]
+        assert total == 1
+
+    def test_ingestar_transacoes_usa_lote(self, banco):
+        assert banco.ingestar_transacoes(_transacoes(["A", "B"])) == 2
+
+
+class TestQuarentena:
+    """Linhas ruins vao para a quarentena e as boas entram no banco."""
+
+    def test_ingestao_parcial(self, banco, template_schema):
+        df = _transacoes(["TXN-00000001", "TXN-00000002", "TXN-00000003"])
+        df.loc[1, "valor"] = -5.0
+        df.loc[2, "tipo"] = "X"
+        resumo = banco.ingestar_com_quarentena(df, template_schema, "parcial.csv")
+        assert (resumo["sucesso"], resumo["erro"], resumo["quarentena"]) == (1, 2, 2)
+
+        linhas = banco.conexao_banco().execute(
+            "SELECT linha, motivo FROM transacoes_quarentena WHERE arquivo_nome = 'parcial.csv' ORDER BY linha"
+        ).fetchall()
+        assert [tuple(r) for r in linhas] == [(1, "valor:faixa"), (2, "tipo:enum")]
+
+    def test_duplicados_contam_como_erro(self, banco, template_schema):
+        df = _transacoes(["TXN-00000001"])
+        banco.ingestar_com_quarentena(df, template_schema)
+        resumo = banco.ingestar_com_quarentena(df, template_schema)
+        assert (resumo["sucesso"], resumo["erro"], resumo["ignorados_banco"]) == (0, 1, 1)
+
+    def test_rejeitadas_pelo_banco_vao_para_quarentena(self, banco, template_schema):
+        banco.ingestar_com_quarentena(_transacoes(["TXN-00000001"]), template_schema)
+        # Template sem a faixa de valor: o CHECK (valor > 0) do schema e quem recusa a linha.
+        sem_faixa = copy.deepcopy(template_schema)
+        sem_faixa["colunas"]["valor"]["validacao"].pop("min")
+        df = _transacoes(["TXN-00000001", "TXN-00000002", "TXN-00000003", "TXN-00000003"])
+        df.loc[1, "valor"] = -5.0
+        resumo = banco.ingestar_com_quarentena(df, sem_faixa, "banco.csv")
+        assert (resumo["sucesso"], resumo["erro"], resumo["quarentena"]) == (1, 3, 3)
+        assert resumo["motivos"] == {"banco:duplicado": 2, "banco:check:valor > 0": 1}
+
+        linhas = banco.conexao_banco().execute(
+            "SELECT linha, motivo FROM transacoes_quarentena WHERE arquivo_nome = 'banco.csv' ORDER BY linha"
+        ).fetchall()
+        assert [tuple(r) for r in linhas] == [(0, "banco:duplicado"), (1, "banco:check:valor > 0"), (3, "banco:duplicado")]
+
+    def test_enum_em_minusculas_entra_canonico(self, banco, template_schema):
+        df = _transacoes(["TXN-00000001"])
+        df["tipo"] = ["credito"]
+        resumo = banco.ingestar_com_quarentena(df, template_schema)
+        assert resumo["sucesso"] == 1
+        assert banco.conexao_banco().execute("SELECT tipo FROM transacoes_financeiras").fetchone()[0] == "CREDITO"
+
+
+class TestArquivosIngeridos:
+    """O registro por hash de conteudo evita reingestao e permite retomar."""
+
+    def test_reenvio_devolve_resultado_anterior(self, banco, template_schema):
+        df = _transacoes(["TXN-00000001", "TXN-00000002"])
+        resumo = banco.ingestar_idempotente(df, template_schema, "h1", "a.csv")
+        log_id = banco.registrar_log("a.csv", resumo["total"], resumo["sucesso"], resumo["erro"], False, None, 0.1,
+                                     hash_conteudo="h1")
+
+        repetido = banco.ingestar_idempotente(df, template_schema, "h1", "a.csv")
+        assert repetido["ja_ingerido"] and repetido["log_id"] == log_id
+        assert (repetido["total"], repetido["sucesso"], repetido["erro"]) == (2, 2, 0)
+
+    def test_retoma_da_ultima_fatia(self, banco, template_schema, monkeypatch):
+        df = _transacoes([f"TXN-0000000{i}" for i in range(5)])
+        original = banco.ingestar_com_quarentena
+        chamadas = []
+
+        def falha_na_segunda(chunk, *args, **kwargs):
+            chamadas.append(len(chunk))
+            if len(chamadas) == 2:
+                raise sqlite3.OperationalError("disco cheio")
+            return original(chunk, *args, **kwargs)
+
+        monkeypatch.setattr(banco, "ingestar_com_quarentena", falha_na_segunda)
+        with pytest.raises(sqlite3.OperationalError):
+            banco.ingestar_idempotente(df, template_schema, "h2", tamanho_chunk=2)
+        assert banco.buscar_arquivo_ingerido("h2")["linhas_concluidas"] == 2
+
+        resumo = banco.ingestar_idempotente(df, template_schema, "h2", tamanho_chunk=2)
+        assert resumo["retomado_de"] == 2
+        assert (resumo["sucesso"], resumo["erro"], resumo["ignorados_banco"]) == (5, 0, 0)
+        total = banco.conexao_banco().execute("SELECT COUNT(*) FROM transacoes_financeiras").fetchone()[0]
+        assert total == 5
@@ -0,0 +1,53 @@
+"""
+Testes do executor de scripts de transformacao.
+"""
+
+import pytest
+
+from src import executor
+
+SCRIPT = '''
+import pandas as pd
+
+def processar_csv(input_path, output_path):
+    df = pd.read_csv(input_path)
+    df["x"] = df["x"] * 2
+    df.to_csv(output_path, index=False)
+'''
+
+SCRIPT_DF = '''
+def transformar(df):
+    df["x"] = df["x"].astype(int) * 2
+    return df
+'''
+
+
+class TestScriptCompilado:
+    """Scripts repetidos reaproveitam a funcao ja compilada."""
+
+    def test_mesmo_script_nao_recompila(self):
+        executor.descartar_script_compilado()
+        assert executor.compilar_script(SCRIPT) is executor.compilar_script(SCRIPT)
+
+    def test_lru_limitado(self, monkeypatch):
+        executor.descartar_script_compilado()
+        monkeypatch.setattr(executor, "LIMITE_CACHE_FUNCOES", 2)
+        for i in range(3):
+            executor.compilar_script(SCRIPT + f"\n# {i}")
+        assert len(executor._cache_funcoes) == 2
+
+    def test_script_sem_funcao(self):
+        with pytest.raises(ValueError):
+            executor.compilar_script("x = 1")
+
+
+class TestContratos:
+    """transformar(df) e preferido; processar_csv continua aceito para scripts antigos."""
+
+    def test_contrato_detectado(self):
+        assert executor.compilar_script(SCRIPT_DF)[0] == "transformar"
+        assert executor.compilar_script(SCRIPT)[0] == "processar_csv"
+
+    def test_contrato_sem_executar(self):
+        assert executor.detectar_contrato("import os\nos._exit(1)\n") is None
+        assert executor.detectar_contrato(SCRIPT_DF) == "transformar"
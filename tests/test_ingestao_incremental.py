@@ -0,0 +1,137 @@
+"""
+Testes da ingestao em fatias com checkpoint por hash de conteudo.
+"""
+
+import sqlite3
+
+import pytest
+
+from benchmarks.geradores import gerar_csv
+from src import db_handler, ingestao_incremental
+from src.dialeto import Dialeto
+from src.ingestao_incremental import ingestar_arquivo, iterar_fatias
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho_original = db_handler.DB_PATH
+    db_handler.configurar_banco(str(tmp_path / "pipeline.db"))
+    yield db_handler
+    db_handler.fechar_conexao()
+    db_handler.configurar_banco(caminho_original)
+
+
+def _total_transacoes(banco):
+    return banco.conexao_banco().execute("SELECT COUNT(*) FROM transacoes_financeiras").fetchone()[0]
+
+
+class TestIterarFatias:
+    """As fatias respeitam registros com quebra de linha dentro de aspas."""
+
+    def test_quebra_de_linha_entre_aspas(self, tmp_path):
+        caminho = tmp_path / "aspas.csv"
+        caminho.write_bytes(b'id,descricao\n1,"linha\nquebrada"\n2,simples\n3,"a,b"\n')
+        fatias = list(iterar_fatias(str(caminho), Dialeto(), tamanho_chunk=1, dtype={"id": str}))
+        assert [df["id"].tolist() for df, _ in fatias] == [["1"], ["2"], ["3"]]
+        assert fatias[0][0]["descricao"].tolist() == ["linha\nquebrada"]
+        assert fatias[-1][1] == caminho.stat().st_size
+
+
+class TestIngestarArquivo:
+    """Cada fatia commita com o checkpoint; uma nova execucao retoma dele."""
+
+    def test_arquivo_sujo_em_fatias(self, banco, tmp_path):
+        caminho = tmp_path / "misto.csv"
+        gerar_csv(caminho, "misto", 10)
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=3)
+        assert (resumo["total"], resumo["sucesso"], resumo["erro"]) == (10, 10, 0)
+        assert _total_transacoes(banco) == 10
+
+        repetido = ingestar_arquivo(str(caminho), tamanho_chunk=3)
+        assert repetido["ja_ingerido"] and repetido["log_id"] == resumo["log_id"]
+
+    def test_retoma_do_byte_do_checkpoint(self, banco, tmp_path, monkeypatch):
+        caminho = tmp_path / "perfeito.csv"
+        gerar_csv(caminho, "perfeito", 10)
+        original = ingestao_incremental.gravar_chunk_com_checkpoint
+        chamadas = []
+
+        def falha_na_segunda(*args):
+            chamadas.append(args[3])
+            if len(chamadas) == 2:
+                raise sqlite3.OperationalError("processo morto")
+            return original(*args)
+
+        monkeypatch.setattr(ingestao_incremental, "gravar_chunk_com_checkpoint", falha_na_segunda)
+        with pytest.raises(sqlite3.OperationalError):
+            ingestar_arquivo(str(caminho), tamanho_chunk=4)
+        registros = banco.conexao_banco().execute("SELECT * FROM arquivos_ingeridos").fetchall()
+        assert [(r["linhas_concluidas"], r["status"]) for r in registros] == [(4, "parcial")]
+        assert registros[0]["offset_bytes"] > 0
+
+        monkeypatch.setattr(ingestao_incremental, "gravar_chunk_com_checkpoint", original)
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=4)
+        assert resumo["retomado_de"] == 4
+        assert (resumo["total"], resumo["sucesso"], resumo["ignorados_banco"]) == (10, 10, 0)
+        assert _total_transacoes(banco) == 10
+
+    def test_retoma_checkpoint_da_ingestao_em_memoria(self, banco, tmp_path, template_schema):
+        caminho = tmp_path / "perfeito.csv"
+        gerar_csv(caminho, "perfeito", 6)
+        hash_conteudo = ingestao_incremental.hash_arquivo(str(caminho))
+        banco.iniciar_arquivo_ingerido(hash_conteudo)
+        with banco.transacao() as conn:
+            conn.execute("UPDATE arquivos_ingeridos SET linhas_concluidas = 2")
+
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=4)
+        assert (resumo["total"], resumo["sucesso"]) == (6, 4)
+        linhas = banco.conexao_banco().execute("SELECT id_transacao FROM transacoes_financeiras ORDER BY 1").fetchall()
+        assert [r[0] for r in linhas] == [f"TXN-{i:08d}" for i in range(2, 6)]
+
+
+class TestPipeline:
+    """Leitura, transformacao e escrita sobrepostas, com fila limitada e metricas."""
+
+    def test_pipeline_com_threads(self, banco, tmp_path):
+        caminho = tmp_path / "misto.csv"
+        gerar_csv(caminho, "misto", 50)
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=4, workers=3, profundidade_fila=2, usar_processos=False)
+        assert (resumo["total"], resumo["sucesso"], resumo["erro"]) == (50, 50, 0)
+        assert _total_transacoes(banco) == 50
+
+        pipeline = resumo["pipeline"]
+        assert pipeline["fila"]["capacidade"] == 2
+        assert 1 <= pipeline["fila"]["profundidade_max"] <= 2
+        assert {nome: e["itens"] for nome, e in pipeline["estagios"].items()} == {
+            "leitura": 13, "transformacao": 13, "escrita": 13
+        }
+        assert all(0 < e["utilizacao"] <= 1 for e in pipeline["estagios"].values())
+
+    def test_pipeline_com_processos(self, banco, tmp_path):
+        caminho = tmp_path / "perfeito.csv"
+        gerar_csv(caminho, "perfeito", 20)
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=5, workers=2)
+        assert (resumo["total"], resumo["sucesso"]) == (20, 20)
+        assert resumo["pipeline"]["estagios"]["transformacao"]["paralelismo"] == 2
+
+    def test_falha_na_escrita_para_o_pipeline_e_retoma(self, banco, tmp_path, monkeypatch):
+        caminho = tmp_path / "perfeito.csv"
+        gerar_csv(caminho, "perfeito", 30)
+        original = ingestao_incremental.gravar_chunk_com_checkpoint
+        chamadas = []
+
+        def falha_na_terceira(*args):
+            chamadas.append(args[3])
+            if len(chamadas) == 3:
+                raise sqlite3.OperationalError("disco cheio")
+            return original(*args)
+
+        monkeypatch.setattr(ingestao_incremental, "gravar_chunk_com_checkpoint", falha_na_terceira)
+        with pytest.raises(sqlite3.OperationalError):
+            ingestar_arquivo(str(caminho), tamanho_chunk=3, workers=2, usar_processos=False)
+        assert banco.buscar_arquivo_ingerido(ingestao_incremental.hash_arquivo(str(caminho)))["linhas_concluidas"] == 6
+
+        monkeypatch.setattr(ingestao_incremental, "gravar_chunk_com_checkpoint", original)
+        resumo = ingestar_arquivo(str(caminho), tamanho_chunk=3, workers=2, usar_processos=False)
+        assert resumo["retomado_de"] == 6
+        assert (resumo["total"], resumo["sucesso"], resumo["ignorados_banco"]) == (30, 30, 0)
@@ -0,0 +1,86 @@
+"""
+Testes da camada de leitura com multiplos backends.
+"""
+
+import pandas as pd
+import pytest
+
+from src.dialeto import Dialeto, detectar_dialeto
+from src import leitura
+from src.leitura import backends_disponiveis, ler_csv
+from src.validation import carregar_csv
+
+CSV = (
+    "id_transacao;data_transacao;valor;conta_destino\n"
+    "0001-ABCD;2024-01-15;1500.00;\n"
+    "0002-ABCD;2024-01-16;45.90;CC-9999\n"
+)
+
+
+@pytest.fixture
+def csv_pv(tmp_path):
+    caminho = tmp_path / "pv.csv"
+    caminho.write_text(CSV, encoding="utf-8")
+    return caminho
+
+
+class TestBackendsLeitura:
+    """Todos os backends devem produzir o mesmo DataFrame."""
+
+    @pytest.mark.parametrize("backend", backends_disponiveis())
+    def test_backends_equivalentes(self, csv_pv, backend):
+        esperado, _ = ler_csv(csv_pv, Dialeto(delimitador=";"), dtype={"id_transacao": str}, backends=("python",))
+        df, usado = ler_csv(csv_pv, Dialeto(delimitador=";"), dtype={"id_transacao": str}, backends=(backend,))
+        assert usado == backend
+        pd.testing.assert_frame_equal(df, esperado)
+
+    def test_fallback_para_latin1(self, tmp_path):
+        caminho = tmp_path / "latin1.csv"
+        caminho.write_bytes("descricao\nPão de açúcar\n".encode("latin-1"))
+        df, _ = ler_csv(caminho, Dialeto(encoding="utf-8"))
+        assert df["descricao"].tolist() == ["Pão de açúcar"]
+
+    def test_erro_de_estrutura_nao_troca_encoding(self, csv_pv, monkeypatch):
+        tentativas = []
+
+        def falhar(filepath, dialeto, dtype, engine="pyarrow"):
+            tentativas.append((engine, dialeto.encoding))
+            raise ValueError(f"malformado ({engine})")
+
+        monkeypatch.setattr(leitura, "_ler_pyarrow", falhar)
+        monkeypatch.setattr(leitura, "_ler_pandas", falhar)
+        with pytest.raises(ValueError, match=rf"malformado \({backends_disponiveis()[0]}\)"):
+            ler_csv(csv_pv, Dialeto(encoding="utf-8", delimitador=";"))
+        assert tentativas == [(backend, "utf-8") for backend in backends_disponiveis()]
+
+    def test_carregar_csv_informa_backend(self, csv_pv):
+        df = carregar_csv(csv_pv)
+        assert df.attrs["backend_leitura"] in backends_disponiveis()
+
+
+class TestDialeto:
+    """O sniffer le o arquivo uma vez e devolve encoding e delimitador juntos."""
+
+    def test_delimitador_ponto_virgula(self, csv_pv):
+        dialeto = detectar_dialeto(csv_pv)
+        assert (dialeto.delimitador, dialeto.cabecalho) == (";", True)
+        assert dialeto.confianca > 0.9
+
+    def test_virgulas_entre_aspas_nao_enganam(self, tmp_path):
+        caminho = tmp_path / "aspas.csv"
+        linhas = ['id|descricao|valor\n'] + [f'{i}|"a, b, c, d"|1,50\n' for i in range(10)]
+        caminho.write_text("".join(linhas), encoding="utf-8")
+        assert detectar_dialeto(caminho).delimitador == "|"
+
+    def test_encoding_latin1(self, tmp_path):
+        caminho = tmp_path / "latin1.csv"
+        linhas = ["id,descricao\n"] + [f"{i},Pagamento de serviço à vista nº {i}\n" for i in range(200)]
+        caminho.write_bytes("".join(linhas).encode("latin-1"))
+        dialeto = detectar_dialeto(caminho)
+        assert dialeto.encoding.lower().replace("-", "") not in ["utf8", "ascii"]
+
+    def test_carregar_csv_reaproveita_dialeto(self, csv_pv, monkeypatch):
+        dialeto = detectar_dialeto(csv_pv)
+        monkeypatch.setattr("src.validation.detectar_dialeto", None)
+        df = carregar_csv(csv_pv, dialeto=dialeto)
+        assert df.attrs["dialeto"] is dialeto
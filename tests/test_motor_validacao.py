@@ -0,0 +1,110 @@
+"""
+Testes do motor de validacao em passagem unica.
+
+Usam arquivos gerados em diretorio temporario para nao depender de sample_data.
+"""
+
+import pandas as pd
+import pytest
+
+from src import validation
+from src.validacao_streaming import AcumuladorData, validar_csv_streaming
+from src.validation import (
+    carregar_csv,
+    gerar_relatorio_divergencias,
+    validar_csv_completo,
+    validar_dataframe,
+)
+
+
+CSV_VALIDO = (
+    "id_transacao,data_transacao,valor,tipo,categoria,descricao,conta_origem,conta_destino,status\n"
+    "TXN-00000001,2024-01-15,1500.00,CREDITO,SALARIO,Salario,CC-1234,,CONFIRMADO\n"
+    "TXN-00000002,2024-01-16,45.90,DEBITO,ALIMENTACAO,Mercado,CC-1234,,PENDENTE\n"
+)
+
+CSV_PROBLEMAS = (
+    "id_transacao;data_transacao;valor;tipo;categoria;origem;status\n"
+    "TXN-00000001;15/01/2024;R$ 1.500,00;C;SALARIO;CC-1234;confirmed\n"
+    "TXN-00000002;16/01/2024;R$ 45,90;D;ALIMENTACAO;CC-1234;pending\n"
+)
+
+
+@pytest.fixture
+def csv_valido(tmp_path):
+    caminho = tmp_path / "valido.csv"
+    caminho.write_text(CSV_VALIDO, encoding="utf-8")
+    return caminho
+
+
+@pytest.fixture
+def csv_problemas(tmp_path):
+    caminho = tmp_path / "problemas.csv"
+    caminho.write_text(CSV_PROBLEMAS, encoding="utf-8")
+    return caminho
+
+
+class TestMotorValidacao:
+    """O motor valida um DataFrame ja carregado sem reler o arquivo."""
+
+    def test_dataframe_e_caminho_geram_mesmo_resultado(self, csv_problemas, template_schema):
+        df = carregar_csv(csv_problemas)
+        assert validar_csv_completo(df, template_schema) == \
+            validar_csv_completo(csv_problemas, template_schema)
+
+    def test_arquivo_valido(self, csv_valido, template_schema):
+        resultado = validar_dataframe(carregar_csv(csv_valido), template_schema)
+        assert resultado == {"valido": True, "total_erros": 0, "detalhes": []}
+
+    def test_detecta_formatos_de_data_e_valor(self, csv_problemas, template_schema):
+        resultado = validar_dataframe(carregar_csv(csv_problemas), template_schema)
+        tipos = {d["tipo"] for d in resultado["detalhes"]}
+        assert {"nomes_colunas", "formato_data", "formato_valor", "valor_invalido"} <= tipos
+
+    def test_relatorio_reaproveita_resultado(self, csv_problemas, template_schema, monkeypatch):
+        resultado = validar_csv_completo(csv_problemas, template_schema)
+
+        def falhar(*args, **kwargs):
+            raise AssertionError("o relatorio nao deve reler o arquivo")
+
+        monkeypatch.setattr(validation, "carregar_csv", falhar)
+        relatorio = gerar_relatorio_divergencias(resultado)
+        assert "Colunas com nome errado" in relatorio
+
+    def test_regras_customizadas(self, template_schema):
+        def regra_vazio(df, template):
+            return [{"tipo": "arquivo_vazio"}] if df.empty else []
+
+        resultado = validar_dataframe(pd.DataFrame(), template_schema, regras=[regra_vazio])
+        assert resultado["detalhes"] == [{"tipo": "arquivo_vazio"}]
+
+
+class TestValidacaoStreaming:
+    """A validacao em chunks deve produzir o mesmo resultado da validacao completa."""
+
+    @pytest.mark.parametrize("tamanho_chunk", [1, 2, 1000])
+    def test_mesmo_resultado_que_validacao_completa(self, csv_problemas, template_schema, tamanho_chunk):
+        esperado = validar_csv_completo(csv_problemas, template_schema)
+        assert validar_csv_streaming(csv_problemas, template_schema, tamanho_chunk) == esperado
+
+    def test_arquivo_valido(self, csv_valido, template_schema):
+        assert validar_csv_streaming(csv_valido, template_schema, tamanho_chunk=1)["valido"]
+
+    def test_byte_latin1_depois_da_amostra(self, tmp_path, template_schema):
+        # O sniffer ve so ascii; o byte latin-1 aparece bem depois da janela de amostragem.
+        linha = "TXN-00000002,2024-01-16,45.90,DEBITO,ALIMENTACAO,Mercado,CC-1234,,PENDENTE\n"
+        caminho = tmp_path / "tardio.csv"
+        caminho.write_bytes(
+            (CSV_VALIDO + linha * 2000).encode("ascii")
+            + "TXN-00000003,2024-01-17,9.90,DEBITO,ALIMENTACAO,Padaria São João,CC-1234,,PENDENTE\n".encode("latin-1")
+        )
+        assert len(carregar_csv(caminho)) == 2003
+        assert validar_csv_streaming(caminho, template_schema, tamanho_chunk=500) == \
+            validar_csv_completo(caminho, template_schema)
+
+    def test_acumuladores_mesclam_offsets(self):
+        a, b = AcumuladorData(), AcumuladorData()
+        a.atualizar(pd.Series(["2024-01-01", "01/01/2024"], index=[0, 1]))
+        b.atualizar(pd.Series(["xx", "2024-01-02"], index=[2, 3]))
+        total = a.mesclar(b)
+        assert (total.total, total.matches_iso, total.linhas_invalidas) == (4, 2, [1, 2])
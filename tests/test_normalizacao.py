@@ -0,0 +1,67 @@
+"""
+Testes do normalizador deterministico guiado pelo template.
+"""
+
+import pandas as pd
+
+from src.normalizacao import normalizar_dataframe
+from src.validation import validar_dataframe
+
+
+def _df_sujo():
+    return pd.DataFrame({
+        "id": ["TXN-00000001", "TXN-00000002", "TXN-00000003"],
+        "date": ["15/01/2024", "31/12/2024", "2024-01-02"],
+        "amount": ["R$ 1.234,56", "45,9", "1,234.50"],
+        "type": ["C", "debit", "credito"],
+        "category": ["food", "LAZER", "salary"],
+        "conta_origem": ["CC-1234", "CC-1234", "CC-1234"],
+        "status": ["pending", None, "C"],
+        "coluna_extra": [1, 2, 3],
+    })
+
+
+class TestNormalizador:
+    """Problemas descritos no template sao corrigidos sem IA."""
+
+    def test_corrige_problemas_conhecidos(self, template_schema):
+        df, correcoes = normalizar_dataframe(_df_sujo(), template_schema)
+        assert validar_dataframe(df, template_schema)["valido"]
+        assert df["data_transacao"].tolist() == ["2024-01-15", "2024-12-31", "2024-01-02"]
+        assert df["valor"].tolist() == [1234.56, 45.9, 1234.5]
+        assert df["tipo"].tolist() == ["CREDITO", "DEBITO", "CREDITO"]
+        assert df["status"].tolist() == ["PENDENTE", "CONFIRMADO", "CONFIRMADO"]
+        assert correcoes["colunas_desconhecidas"] == ["coluna_extra"]
+        assert df["coluna_extra"].tolist() == [1, 2, 3]
+        assert correcoes["defaults_aplicados"] == {"status": 1}
+
+    def test_residuos_ficam_para_a_ia(self, template_schema):
+        sujo = _df_sujo()
+        sujo.loc[0, "type"] = "???"
+        df, _ = normalizar_dataframe(sujo, template_schema)
+        detalhes = validar_dataframe(df, template_schema)["detalhes"]
+        assert detalhes == [{"tipo": "valor_invalido", "coluna": "tipo", "valores": ["???"]}]
+
+    def test_um_formato_de_data_por_coluna(self, template_schema):
+        sujo = _df_sujo()
+        sujo["date"] = ["03/04/2024", "04/13/2024", "05/06/2024"]
+        df, _ = normalizar_dataframe(sujo, template_schema)
+        # So MM/DD converte as tres: a coluna inteira usa MM/DD, inclusive as linhas ambiguas.
+        assert df["data_transacao"].tolist() == ["2024-03-04", "2024-04-13", "2024-05-06"]
+
+        sujo["date"] = ["03/04/2024", "13/04/2024", "04/13/2024"]
+        df, _ = normalizar_dataframe(sujo, template_schema)
+        # Empate fica com DD/MM (ordem do template); a linha que so vale como MM/DD nao e convertida.
+        assert df["data_transacao"].tolist() == ["2024-04-03", "2024-04-13", "04/13/2024"]
+
+    def test_pontos_como_separador_de_milhar(self, template_schema):
+        sujo = _df_sujo()
+        sujo["amount"] = ["R$ 1.500", "1.234.567", "12.5"]
+        df, _ = normalizar_dataframe(sujo, template_schema)
+        assert df["valor"].tolist() == [1500.0, 1234567.0, 12.5]
+
+    def test_alias_sem_caixa_nem_acento(self, template_schema):
+        sujo = _df_sujo().rename(columns={"date": "Date", "amount": "AMOUNT", "type": "Typé"})
+        df, correcoes = normalizar_dataframe(sujo, template_schema)
+        assert {"Date": "data_transacao", "AMOUNT": "valor", "Typé": "tipo"}.items() <= correcoes["colunas_renomeadas"].items()
+        assert validar_dataframe(df, template_schema)["valido"]
@@ -0,0 +1,77 @@
+"""
+Testes dos spans por etapa e da persistencia em log_etapas.
+"""
+
+import pandas as pd
+import pytest
+
+from src import db_handler, rastreamento
+from src.rastreamento import etapa, rastrear
+from src.validation import validar_dataframe
+
+TEMPLATE = {"colunas": {"valor": {"tipo": "DECIMAL", "obrigatorio": True}}}
+
+
+class TestRastreamento:
+    """Etapas aninhadas com tempo, linhas e memoria; sem rastreamento ativo nada e medido."""
+
+    def test_sem_rastreamento_e_noop(self):
+        with etapa("solta") as span:
+            pass
+        assert span == {}
+
+    def test_etapas_aninhadas(self):
+        df = pd.DataFrame({"valor": ["1.5", "2"]})
+        with rastrear() as rastreador:
+            with etapa("validacao", linhas=len(df)):
+                validar_dataframe(df, TEMPLATE)
+        nomes = [e["etapa"] for e in rastreador.etapas]
+        assert nomes[0] == "validacao" and "validacao:regra_formatos_colunas" in nomes
+        assert all(e["pai"] == 0 for e in rastreador.etapas[1:])
+        assert rastreador.etapas[0]["linhas"] == 2
+        assert rastreador.etapas[0]["duracao_segundos"] >= max(e["duracao_segundos"] for e in rastreador.etapas[1:])
+        assert rastreador.etapas[0]["rss_amostrado_mb"] > 0
+
+    def test_etapas_nao_resetam_o_pico_do_processo(self, monkeypatch):
+        monkeypatch.setattr(rastreamento, "resetar_pico_memoria", lambda: pytest.fail("reset do VmHWM"))
+        amostras = iter([100.0, 300.0, 150.0, 120.0])
+        monkeypatch.setattr(rastreamento, "memoria_residente_mb", lambda: next(amostras))
+        with rastrear() as rastreador:
+            with etapa("pai"):
+                with etapa("filha"):
+                    pass
+        assert [e["rss_amostrado_mb"] for e in rastreador.etapas] == [300.0, 300.0]
+
+    def test_anexar_renumera(self):
+        with rastrear() as origem:
+            with etapa("a"):
+                with etapa("b"):
+                    pass
+        with rastrear() as destino:
+            with etapa("x"):
+                pass
+            destino.anexar(origem.etapas)
+        assert [(e["ordem"], e["pai"]) for e in destino.etapas] == [(0, None), (1, None), (2, 1)]
+
+    def test_dump_de_perfil(self, tmp_path):
+        with rastrear("lento.csv", pasta_perfil=str(tmp_path), limiar_perfil=0):
+            sum(range(1000))
+        arquivos = sorted(p.name for p in tmp_path.iterdir())
+        assert any(a.endswith("lento.csv.prof") for a in arquivos)
+        assert any(a.endswith("_memoria.txt") for a in arquivos)
+
+    def test_etapas_gravadas_no_log(self, tmp_path):
+        caminho_original = db_handler.DB_PATH
+        db_handler.configurar_banco(str(tmp_path / "pipeline.db"))
+        try:
+            with rastrear() as rastreador:
+                with etapa("leitura", linhas=10):
+                    pass
+            log_id = db_handler.registrar_log("a.csv", 10, 10, 0, False, None, 0.1, etapas=rastreador.etapas)
+            linhas = db_handler.conexao_banco().execute(
+                "SELECT etapa, linhas, rss_amostrado_mb IS NOT NULL FROM log_etapas WHERE log_id = ?", (log_id,)
+            ).fetchall()
+            assert [tuple(l) for l in linhas] == [("leitura", 10, 1)]
+        finally:
+            db_handler.fechar_conexao()
+            db_handler.configurar_banco(caminho_original)
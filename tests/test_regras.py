@@ -0,0 +1,66 @@
+"""
+Testes do motor vetorizado de restricoes por linha.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.regras import avaliar_restricoes, motivos_violacao, regra_restricoes_linhas
+from src.validation import gerar_relatorio_divergencias, validar_dataframe, validar_enum
+
+
+@pytest.fixture
+def df_transacoes():
+    return pd.DataFrame({
+        "id_transacao": ["TXN-00000001", "curto", "TXN-00000003", "TXN-00000004"],
+        "data_transacao": ["2024-01-15", "2024-01-16", "2024-02-30", "2024-01-18"],
+        "valor": [1500.00, 45.90, 10.0, -3.0],
+        "tipo": ["CREDITO", "DEBITO", "C", "DEBITO"],
+        "categoria": ["SALARIO", "ALIMENTACAO", "LAZER", "OUTROS"],
+        "descricao": ["ok", None, "x" * 300, "ok"],
+        "conta_origem": ["CC-1234", "CC-1234", "CC-1234", None],
+        "conta_destino": [None, None, "CC@9999", None],
+        "status": ["CONFIRMADO", "PENDENTE", "CONFIRMADO", "CANCELADO"],
+    })
+
+
+class TestRestricoesLinhas:
+    """Todas as restricoes do template viram mascaras booleanas."""
+
+    def test_linhas_validas(self, df_transacoes, template_schema):
+        resultado = avaliar_restricoes(df_transacoes, template_schema)
+        assert resultado["linhas_validas"].tolist() == [True, False, False, False]
+        assert resultado["bitmap"].dtype == np.uint64
+
+    def test_contagens_por_regra(self, df_transacoes, template_schema):
+        contagens = avaliar_restricoes(df_transacoes, template_schema)["contagens"]
+        assert contagens["id_transacao:pattern"] == 1
+        assert contagens["data_transacao:data"] == 1
+        assert contagens["valor:faixa"] == 1
+        assert contagens["tipo:enum"] == 1
+        assert contagens["descricao:tamanho"] == 1
+        assert contagens["conta_origem:nulo"] == 1
+        assert contagens["conta_destino:pattern"] == 1
+
+    def test_motivos(self, df_transacoes, template_schema):
+        motivos = motivos_violacao(avaliar_restricoes(df_transacoes, template_schema))
+        assert motivos[0] == ""
+        assert motivos[1] == "id_transacao:pattern;id_transacao:tamanho"
+        assert motivos[3] == "valor:faixa;conta_origem:nulo"
+
+    def test_regra_opcional_no_motor(self, df_transacoes, template_schema):
+        resultado = validar_dataframe(df_transacoes, template_schema, regras=[regra_restricoes_linhas])
+        assert resultado["detalhes"][0]["linhas"] == 3
+        assert "3 linhas violam" in gerar_relatorio_divergencias(resultado)
+
+    def test_casas_decimais_em_valores_grandes(self, template_schema):
+        df = pd.DataFrame({"valor": [1234.567, 99999.999, 12345678.91, 0.1 + 0.2]})
+        resultado = avaliar_restricoes(df, template_schema)
+        assert resultado["linhas_validas"].tolist() == [False, False, True, True]
+
+    def test_enum_ignora_caixa_como_validar_enum(self, df_transacoes, template_schema):
+        df_transacoes.loc[0, "tipo"] = "credito"
+        resultado = avaliar_restricoes(df_transacoes, template_schema)
+        assert resultado["linhas_validas"][0]
+        assert validar_enum(df_transacoes.iloc[[0]], "tipo", template_schema)["valido"]
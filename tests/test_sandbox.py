@@ -0,0 +1,95 @@
+"""
+Testes da execucao isolada de scripts (processos pre-aquecidos com limites).
+"""
+
+import warnings
+
+import pandas as pd
+import pytest
+
+from src import sandbox
+from src.dialeto import Dialeto
+from src.sandbox import PoolSandbox
+
+SCRIPT_DF = '''
+def transformar(df):
+    df["x"] = df["x"].astype(int) * 2
+    return df
+'''
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with PoolSandbox(workers=1, tempo_limite=20, limite_memoria=1024 ** 3) as pool:
+        yield pool
+
+
+class TestSandbox:
+    """Scripts rodam fora do processo principal e devolvem o DataFrame com metricas."""
+
+    def test_transformar_com_metricas(self, pool):
+        df = pd.DataFrame({"x": ["1", "2"], "y": ["a", None]})
+        saida, metricas = pool.executar(SCRIPT_DF, df)
+        assert saida["x"].tolist() == [2, 4]
+        assert pd.isna(saida["y"].iloc[1])
+        assert metricas["cpu_segundos"] >= 0 and metricas["pico_memoria_mb"] > 0
+
+    def test_attrs_do_frame_nao_geram_aviso(self, pool):
+        df = pd.DataFrame({"x": ["1"]})
+        df.attrs["dialeto"] = Dialeto()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert pool.executar(SCRIPT_DF, df)[0]["x"].tolist() == [2]
+        assert df.attrs["dialeto"] == Dialeto()
+
+    def test_processar_csv_pelo_caminho(self, pool, tmp_path):
+        caminho = tmp_path / "entrada.csv"
+        caminho.write_text("x\n3\n")
+        script = (
+            "import pandas as pd\n"
+            "def processar_csv(entrada, saida):\n"
+            "    pd.read_csv(entrada).to_csv(saida, index=False)\n"
+        )
+        assert pool.executar(script, input_path=caminho)[0]["x"].tolist() == [3]
+
+    def test_erro_do_script_propaga_tipo(self, pool):
+        with pytest.raises(KeyError):
+            pool.executar("def transformar(df):\n    return df['nao_existe']\n", pd.DataFrame({"x": [1]}))
+
+    def test_tempo_limite_recicla_worker(self, pool):
+        with pytest.raises(TimeoutError):
+            pool.executar("def transformar(df):\n    while True:\n        pass\n", pd.DataFrame({"x": [1]}), tempo_limite=1)
+        assert pool.executar(SCRIPT_DF, pd.DataFrame({"x": ["5"]}))[0]["x"].tolist() == [10]
+
+    def test_limite_de_memoria(self, pool):
+        with pytest.raises(MemoryError):
+            pool.executar("def transformar(df):\n    b = bytearray(4 * 1024 ** 3)\n    return df\n", pd.DataFrame({"x": [1]}))
+
+    def test_script_sem_contrato_nem_executa(self, pool):
+        with pytest.raises(ValueError):
+            pool.executar("import os\nos._exit(1)\n", pd.DataFrame({"x": [1]}))
+
+    def test_transformar_precisa_retornar_dataframe(self, pool):
+        with pytest.raises(ValueError):
+            pool.executar("def transformar(df):\n    pass\n", pd.DataFrame({"x": [1]}))
+
+    def test_entrada_nao_e_alterada(self, pool):
+        df = pd.DataFrame({"x": ["1", "2"]})
+        pool.executar(SCRIPT_DF, df)
+        assert df["x"].tolist() == ["1", "2"]
+
+
+class TestPoolPadrao:
+    """O pool padrao le limites do ambiente."""
+
+    def test_memoria_pelo_ambiente(self, monkeypatch):
+        monkeypatch.setattr(sandbox, "_pool_padrao", None)
+        monkeypatch.setattr(sandbox, "PoolSandbox", lambda **kw: kw)
+        monkeypatch.setenv("PIPELINE_SANDBOX_MEMORIA_MB", "512")
+        assert sandbox.pool_padrao()["limite_memoria"] == 512 * 1024 ** 2
+
+    def test_zero_desliga_o_teto(self, monkeypatch):
+        monkeypatch.setattr(sandbox, "_pool_padrao", None)
+        monkeypatch.setattr(sandbox, "PoolSandbox", lambda **kw: kw)
+        monkeypatch.setenv("PIPELINE_SANDBOX_MEMORIA_MB", "0")
+        assert sandbox.pool_padrao()["limite_memoria"] is None
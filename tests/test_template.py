@@ -0,0 +1,51 @@
+"""
+Testes do template compilado.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+from src.template import CompiledTemplate, carregar_template, como_compilado, compilar_template
+from src.validation import validar_enum, validar_nomes_colunas
+
+
+class TestTemplateCompilado:
+    """O template e compilado uma vez e reaproveitado pelos validadores."""
+
+    def test_indice_de_aliases(self, template_schema):
+        tpl = compilar_template(template_schema)
+        assert tpl.alias_para_canonico["amount"] == "valor"
+        assert tpl.canonico("valor") == "valor"
+        assert tpl.canonico("coluna_qualquer") is None
+
+    def test_regex_e_enum_pre_compilados(self, template_schema):
+        tpl = compilar_template(template_schema)
+        assert tpl.colunas["id_transacao"].pattern.fullmatch("TXN-00000001")
+        assert tpl.colunas["tipo"].valores_permitidos == frozenset({"CREDITO", "DEBITO"})
+        assert tpl.colunas["tipo"].mapeamento["credit"] == "CREDITO"
+
+    def test_dict_compilado_uma_vez(self, template_schema):
+        assert como_compilado(template_schema) is como_compilado(template_schema)
+
+    def test_validadores_aceitam_dict_e_compilado(self, template_schema):
+        df = pd.DataFrame({"amount": [1.0], "tipo": ["credit"]})
+        tpl = compilar_template(template_schema)
+        assert validar_nomes_colunas(df, tpl) == validar_nomes_colunas(df, template_schema)
+        resultado = validar_enum(df, "tipo", tpl)
+        assert resultado["mapeamento_sugerido"] == {"credit": "CREDITO"}
+
+    def test_cache_por_mtime(self, tmp_path, template_schema):
+        caminho = tmp_path / "template.json"
+        caminho.write_text(json.dumps(template_schema), encoding="utf-8")
+        primeiro = carregar_template(caminho)
+        assert isinstance(primeiro, CompiledTemplate)
+        assert carregar_template(caminho) is primeiro
+
+        template_schema["colunas"].pop("descricao")
+        caminho.write_text(json.dumps(template_schema), encoding="utf-8")
+        os.utime(caminho, ns=(1, os.stat(caminho).st_mtime_ns + 1_000_000))
+        segundo = carregar_template(caminho)
+        assert segundo is not primeiro
+        assert "descricao" not in segundo.colunas